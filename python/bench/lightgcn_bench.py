@@ -0,0 +1,275 @@
+# bench/lightgcn_bench.py
+"""
+LightGCN 벤치마크: 합성 user-item 평점 그래프(Firestore 없이)에서 측정.
+
+train: 에폭/초
+  - loop      : 기존 방식(엣지마다 파이썬 루프로 loss 누적) — 느려서 --loop-max 엣지 이하에서만
+  - vectorized: gather + mse_loss (full-batch)
+  - minibatch : vectorized + --batch 크기 미니배치
+adj: 정규화 인접행렬 생성 시간 / 최대 메모리(tracemalloc) / 행렬 크기 / 전파(spmm fwd+bwd) 시간
+  - loop: 기존 파이썬 리스트 방식(COO), coo / csr: 배열 연산
+recall: 그룹 구조가 있는 그래프를 80/20 분할해 pointwise vs BPR 의 에폭당 시간과 recall@10/20
+
+    python -m bench.lightgcn_bench
+    python -m bench.lightgcn_bench --what adj --edges 100000,1000000,5000000
+    python -m bench.lightgcn_bench --what recall --edges 50000 --bpr-epochs 10 --threads 2
+    python -m bench.lightgcn_bench --edges 10000,100000,1000000 --epochs 3 --json out.json
+"""
+import sys
+import math
+import json
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from services.lightgcn_model import (
+    LightGCN,
+    build_norm_adj,
+    edge_arrays,
+    edge_tensors,
+    edge_weights,
+    norm_adj_from_arrays,
+    rating_range,
+    recall_at_k,
+    scale_ratings,
+    split_edges,
+    thread_budget,
+    train_bpr,
+    train_pointwise,
+)
+
+
+# ---------- 합성 그래프 ----------
+def make_edges(n_edges, seed=0, users_per_edge=0.05, items_per_edge=0.02, communities=0, in_community=0.8):
+    """
+    인기도가 멱법칙인 (uid, item, rating) 엣지. user/item 수는 엣지 수에 비례.
+    communities > 0 이면 user/item을 그룹으로 나누고 in_community 비율은 자기 그룹 item을 고른다 (recall 평가용 구조)
+    """
+    rng = np.random.default_rng(seed)
+    n_users = max(10, int(n_edges * users_per_edge))
+    n_items = max(10, int(n_edges * items_per_edge))
+    pop = 1.0 / np.arange(1, n_items + 1) ** 0.8
+    pop /= pop.sum()
+    users = rng.integers(0, n_users, n_edges)
+    items = rng.choice(n_items, n_edges, p=pop)
+    if communities:
+        # item k의 그룹 = k % communities, user u의 그룹 = u % communities
+        same = rng.random(n_edges) < in_community
+        per = n_items // communities
+        slot = np.minimum(rng.choice(n_items, n_edges, p=pop) // communities, per - 1)
+        items = np.where(same, slot * communities + users % communities, items)
+    ratings = np.round(rng.uniform(0.5, 5.0, n_edges) * 2) / 2
+    edges = [(f"u{u}", f"i{i}", float(r)) for u, i, r in zip(users.tolist(), items.tolist(), ratings.tolist())]
+    uid2idx = {u: k for k, u in enumerate(sorted({e[0] for e in edges}))}
+    item2idx = {it: k for k, it in enumerate(sorted({e[1] for e in edges}))}
+    return edges, uid2idx, item2idx
+
+
+# ---------- 기존 루프 방식 (비교 기준) ----------
+def _loop_epoch(model, opt, A_hat, edges, uid2idx, item2idx, rmin, rmax):
+    users, items = model(A_hat)
+    loss = 0.0
+    for uid_raw, item_raw, r in edges:
+        score = (users[uid2idx[uid_raw]] * items[item2idx[item_raw]]).sum()
+        target = torch.tensor((r - rmin) / (rmax - rmin) if rmax > rmin else 0.5, dtype=torch.float32)
+        loss = loss + F.mse_loss(score, target)
+    loss = loss / len(edges)
+    opt.zero_grad()
+    loss.backward()
+    opt.step()
+    return float(loss.detach())
+
+
+def bench_train(n_edges, epochs, batch_size, loop_max, seed=0):
+    edges, uid2idx, item2idx = make_edges(n_edges, seed=seed)
+    A_hat, num_u, num_i = build_norm_adj(edges, uid2idx, item2idx)
+    rmin, rmax = rating_range(edges)
+    u_idx, i_idx, ratings = edge_tensors(edges, uid2idx, item2idx)
+    target = scale_ratings(ratings, rmin, rmax)
+    rows = []
+
+    def _row(mode, seconds, n_epochs, loss):
+        rows.append({"edges": n_edges, "users": num_u, "items": num_i, "mode": mode, "epochs": n_epochs,
+                     "epochs_per_sec": round(n_epochs / seconds, 3) if seconds > 0 else None,
+                     "sec_per_epoch": round(seconds / max(1, n_epochs), 4), "loss": round(loss, 6)})
+        print(_fmt_row(rows[-1]), flush=True)
+
+    if n_edges <= loop_max:
+        torch.manual_seed(seed)
+        model = LightGCN(num_u, num_i)
+        opt = torch.optim.Adam(model.parameters(), lr=1e-2)
+        t0 = time.perf_counter()
+        for _ in range(epochs):
+            loss = _loop_epoch(model, opt, A_hat, edges, uid2idx, item2idx, rmin, rmax)
+        _row("loop", time.perf_counter() - t0, epochs, loss)
+
+    for mode, bs in (("vectorized", 0), (f"minibatch{batch_size}", batch_size)):
+        if mode != "vectorized" and not bs:
+            continue
+        torch.manual_seed(seed)
+        model = LightGCN(num_u, num_i)
+        t0 = time.perf_counter()
+        model, hist = train_pointwise(model, A_hat, u_idx, i_idx, target, epochs=epochs, batch_size=bs)
+        _row(mode, time.perf_counter() - t0, hist["epochs"], hist["train_loss"])
+    return rows
+
+
+# ---------- 인접행렬 ----------
+def _loop_norm_adj(edges, uid2idx, item2idx):
+    """기존 구현 (파이썬 리스트 + 원소별 정규화) — 비교 기준"""
+    num_u, num_i = len(uid2idx), len(item2idx)
+    N = num_u + num_i
+    rmin, rmax = rating_range(edges)
+    rows, cols, vals = [], [], []
+    deg = np.zeros(N, dtype=np.float32)
+    for u_raw, it_raw, r in edges:
+        u = uid2idx[u_raw]
+        i = item2idx[it_raw] + num_u
+        w = 0.5 + 0.5 * (r - rmin) / (rmax - rmin) if rmax > rmin else 1.0
+        rows += [u, i]
+        cols += [i, u]
+        vals += [w, w]
+        deg[u] += w
+        deg[i] += w
+    deg[deg == 0] = 1.0
+    norm_vals = [v / math.sqrt(deg[r] * deg[c]) for r, c, v in zip(rows, cols, vals)]
+    A_hat = torch.sparse_coo_tensor(torch.tensor([rows, cols], dtype=torch.long),
+                                    torch.tensor(norm_vals, dtype=torch.float32), size=(N, N))
+    return A_hat.coalesce()
+
+
+def _matrix_bytes(A):
+    if A.layout == torch.sparse_csr:
+        parts = (A.crow_indices(), A.col_indices(), A.values())
+    else:
+        parts = (A.indices(), A.values())
+    return sum(t.numel() * t.element_size() for t in parts)
+
+
+def _spmm_ms(A, dim=32, reps=5):
+    x = torch.randn(A.shape[0], dim, requires_grad=True)
+    torch.sparse.mm(A, x).sum().backward()
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        torch.sparse.mm(A, x).sum().backward()
+    return (time.perf_counter() - t0) / reps * 1000.0
+
+
+def bench_adj(n_edges, loop_max, seed=0):
+    edges, uid2idx, item2idx = make_edges(n_edges, seed=seed)
+    num_u, num_i = len(uid2idx), len(item2idx)
+    builders = {
+        "loop": lambda: _loop_norm_adj(edges, uid2idx, item2idx),
+        "coo": lambda: build_norm_adj(edges, uid2idx, item2idx, layout="coo")[0],
+        "csr": lambda: build_norm_adj(edges, uid2idx, item2idx, layout="csr")[0],
+    }
+    # 엣지 → 인덱스 배열 변환(dict 조회)과 순수 배열 연산 구간을 따로 보여 준다
+    u, i, r = edge_arrays(edges, uid2idx, item2idx)
+    builders["csr(arrays)"] = lambda: norm_adj_from_arrays(u, i, edge_weights(r), num_u, num_i)
+
+    rows = []
+    for mode, fn in builders.items():
+        if mode == "loop" and n_edges > loop_max:
+            continue
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        A = fn()
+        build_s = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rows.append({"edges": n_edges, "mode": mode, "nnz": int(A._nnz()), "build_s": round(build_s, 3),
+                     "peak_mb": round(peak / 2**20, 1), "matrix_mb": round(_matrix_bytes(A) / 2**20, 1),
+                     "spmm_ms": round(_spmm_ms(A), 1)})
+        r_ = rows[-1]
+        print(f"{r_['edges']:>9} {r_['mode']:<12} {r_['nnz']:>10} {r_['build_s']:>9.3f} {r_['peak_mb']:>9.1f} "
+              f"{r_['matrix_mb']:>9.1f} {r_['spmm_ms']:>9.1f}", flush=True)
+        del A
+    return rows
+
+
+# ---------- recall ----------
+def bench_recall(n_edges, pw_epochs, bpr_epochs, bpr_batch, dim, layers, seed=0):
+    edges, uid2idx, item2idx = make_edges(n_edges, seed=seed, communities=20)
+    num_u, num_i = len(uid2idx), len(item2idx)
+    u, i, r = edge_arrays(edges, uid2idx, item2idx)
+    tr, te = split_edges(len(edges), 0.2, seed=seed)
+    A_hat = norm_adj_from_arrays(u[tr], i[tr], edge_weights(r[tr]), num_u, num_i)
+    rmin, rmax = float(r[tr].min()), float(r[tr].max())
+
+    def _eval(model):
+        with torch.no_grad():
+            users, items = model(A_hat)
+        return recall_at_k(users.numpy(), items.numpy(), u[tr], i[tr], u[te], i[te])
+
+    rows = []
+    torch.manual_seed(seed)
+    target = scale_ratings(torch.from_numpy(r[tr].astype(np.float32)), rmin, rmax)
+    model, hist = train_pointwise(LightGCN(num_u, num_i, dim, layers), A_hat, torch.from_numpy(u[tr]),
+                                  torch.from_numpy(i[tr]), target, epochs=pw_epochs)
+    rows.append({"mode": "pointwise", "epochs": hist["epochs"], "sec_per_epoch": hist["seconds"] / max(1, hist["epochs"]), **_eval(model)})
+
+    torch.manual_seed(seed)
+    model, hist = train_bpr(LightGCN(num_u, num_i, dim, layers), A_hat, u[tr], i[tr], epochs=bpr_epochs,
+                            batch_size=bpr_batch, seed=seed)
+    rows.append({"mode": f"bpr{bpr_batch}", "epochs": hist["epochs"], "sec_per_epoch": hist["sec_per_epoch"], **_eval(model)})
+
+    for row in rows:
+        row.update({"edges": n_edges, "users": num_u, "items": num_i})
+        print(f"{n_edges:>9} {row['mode']:<14} {row['epochs']:>6} {row['sec_per_epoch']:>10.4f} "
+              f"{row['recall@10']:>10.4f} {row['recall@20']:>10.4f}", flush=True)
+    return rows
+
+
+def _fmt_row(row):
+    return (f"{row['edges']:>9} {row['users']:>7} {row['items']:>7} {row['mode']:<16} {row['epochs']:>6} "
+            f"{row['epochs_per_sec'] or 0:>10.3f} {row['sec_per_epoch']:>10.4f} {row['loss']:>10.6f}")
+
+
+def _ints(s):
+    return [int(x) for x in s.split(",") if x.strip()]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="LightGCN training benchmark (synthetic graphs)")
+    ap.add_argument("--what", default="train", help="train,adj 중 측정할 항목 (콤마)")
+    ap.add_argument("--edges", default="10000,100000,1000000")
+    ap.add_argument("--epochs", type=int, default=5)
+    ap.add_argument("--batch", type=int, default=0, help="미니배치 크기 (0이면 생략)")
+    ap.add_argument("--loop-max", type=int, default=10000, help="루프 방식은 이 엣지 수 이하에서만")
+    ap.add_argument("--bpr-epochs", type=int, default=10)
+    ap.add_argument("--bpr-batch", type=int, default=2048)
+    ap.add_argument("--pw-epochs", type=int, default=50, help="recall 비교용 pointwise 에폭")
+    ap.add_argument("--dim", type=int, default=32)
+    ap.add_argument("--layers", type=int, default=2)
+    ap.add_argument("--threads", type=int, default=0, help="torch 스레드 수 (0이면 기본값)")
+    ap.add_argument("--json", default=None, help="결과를 JSON 파일로 저장")
+    args = ap.parse_args(argv)
+
+    what = {w.strip() for w in args.what.split(",") if w.strip()}
+    results = []
+    if "adj" in what:
+        print(f"{'edges':>9} {'mode':<12} {'nnz':>10} {'build s':>9} {'peak MB':>9} {'matrix MB':>9} {'spmm ms':>9}")
+        for n in _ints(args.edges):
+            results += bench_adj(n, args.loop_max)
+    with thread_budget(args.threads):
+        if "train" in what:
+            print(f"{'edges':>9} {'users':>7} {'items':>7} {'mode':<16} {'epochs':>6} {'epochs/s':>10} {'s/epoch':>10} {'loss':>10}")
+            for n in _ints(args.edges):
+                results += bench_train(n, args.epochs, args.batch, args.loop_max)
+        if "recall" in what:
+            print(f"{'edges':>9} {'mode':<14} {'epochs':>6} {'s/epoch':>10} {'recall@10':>10} {'recall@20':>10}")
+            for n in _ints(args.edges):
+                results += bench_recall(n, args.pw_epochs, args.bpr_epochs, args.bpr_batch, args.dim, args.layers)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
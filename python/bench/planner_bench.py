@@ -0,0 +1,236 @@
+# bench/planner_bench.py
+"""
+planner 벤치마크: Firestore/Google API 없이 메모리 장소 소스로 엔진별 지연·탐색량·메모리·점수 측정.
+
+시나리오
+  - recorded : AI/travel_logs.json 의 기록된 날짜(planner 슬롯은 비움) + AI/all_places_embedding.json 장소
+  - synthetic: bench.synthetic 으로 만든 1~10일 / 50~1000개 장소 trip
+
+    python -m bench.planner_bench
+    python -m bench.planner_bench --days 1,3 --places 50,200 --engines dqn,greedy --runs 5 --json out.json
+"""
+import io
+import sys
+import json
+import math
+import time
+import argparse
+import statistics
+import contextlib
+import tracemalloc
+
+from services import making_table, value_model
+from services.planner_stats import PlannerStats
+from services.dqn_table_making import (
+    make_planner_context,
+    dqn_fill_schedule,
+    dqn_fill_schedule_anytime,
+    schedule_score,
+)
+from services.parallel_planner import dqn_fill_schedule_parallel
+from services.global_planner import dqn_fill_schedule_global
+from bench.synthetic import make_places, make_tables
+
+PARAMS = {"w_dist": 0.5, "w_cluster": 0.4, "w_trust": 0.4, "w_nonhope": 0.3}
+PROTECTED_TYPES = ("start", "end", "accommodation")
+
+# ---------- 엔진 ----------
+ENGINES = {}
+
+
+def engine(name):
+    def _reg(fn):
+        ENGINES[name] = fn
+        return fn
+    return _reg
+
+
+@engine("dqn")
+def _dqn(ctx, tables):
+    return dqn_fill_schedule(ctx.user_id, ctx.title, tables, ctx.base_mode, ctx=ctx)
+
+
+@engine("greedy")
+def _greedy(ctx, tables):
+    return dqn_fill_schedule_anytime(ctx.user_id, ctx.title, tables, ctx.base_mode, time_budget_ms=0, ctx=ctx)[0]
+
+
+@engine("anytime_200ms")
+def _anytime(ctx, tables):
+    return dqn_fill_schedule_anytime(ctx.user_id, ctx.title, tables, ctx.base_mode, time_budget_ms=200, ctx=ctx)[0]
+
+
+@engine("parallel")
+def _parallel(ctx, tables):
+    return dqn_fill_schedule_parallel(ctx.user_id, ctx.title, tables, ctx.base_mode, ctx=ctx)
+
+
+@engine("global")
+def _global(ctx, tables):
+    return dqn_fill_schedule_global(ctx.user_id, ctx.title, tables, ctx.base_mode, ctx=ctx)[0]
+
+
+@engine("learned")
+def _learned(ctx, tables):
+    return dqn_fill_schedule(ctx.user_id, ctx.title, tables, ctx.base_mode, ctx=ctx, future_mode="learned")
+
+
+# ---------- 시나리오 ----------
+class Scenario:
+    """한 번의 측정 입력: 장소 목록 + 매 실행마다 새로 만드는 tables"""
+
+    def __init__(self, name, places, tables_factory, days, base_mode="명소 중심"):
+        self.name = name
+        self.places = places
+        self.tables_factory = tables_factory
+        self.days = days
+        self.base_mode = base_mode
+
+
+def recorded_scenarios(logs_path="AI/travel_logs.json", places_path="AI/all_places_embedding.json"):
+    out = []
+    for uid, title, places, days in value_model.load_local_histories(logs_path, places_path):
+        def _factory(run, days=days):
+            tables = {}
+            for date_str, rows in sorted(days.items()):
+                schedule = value_model.log_day_to_schedule(rows)
+                for s in schedule:
+                    if s.place_type not in PROTECTED_TYPES:
+                        s.title = s.place_type = s.location_info = None
+                tables[date_str] = {"weekday": "", "start_location": None, "end_location": None,
+                                    "schedule": schedule}
+            return tables
+        out.append(Scenario(f"recorded:{uid}/{title}", places, _factory, len(days)))
+    return out
+
+
+def synthetic_scenarios(days_list, places_list):
+    out = []
+    for n_days in days_list:
+        for n_places in places_list:
+            places = make_places(n_places, seed=n_places)
+            out.append(Scenario(f"synthetic:{n_days}d/{n_places}p", places,
+                                lambda run, n_days=n_days: make_tables(n_days, seed=run), n_days))
+    return out
+
+
+# ---------- 측정 ----------
+def _run(scenario, engine_fn, run):
+    tables = scenario.tables_factory(run)
+    with contextlib.redirect_stdout(io.StringIO()):
+        ctx = make_planner_context("bench", scenario.name, tables, [dict(p) for p in scenario.places],
+                                   dict(PARAMS), scenario.base_mode)
+        # 노드 수는 PlannerStats 집계 (parallel 엔진은 워커별 집계를 합친 값)
+        stats = PlannerStats().attach(ctx)
+        t0 = time.perf_counter()
+        tables = engine_fn(ctx, tables)
+        elapsed = time.perf_counter() - t0
+        PlannerStats.detach(ctx)
+    score = sum(schedule_score(info["schedule"], ctx.by_name, ctx.params, ctx.dist_cache) for info in tables.values())
+    filled = sum(1 for info in tables.values() for s in info["schedule"] if s.title and s.place_type not in PROTECTED_TYPES)
+    return elapsed, stats.totals()["nodes"], score, filled
+
+
+def _alloc(scenario, engine_fn):
+    """tracemalloc 아래에서 한 번 더 실행해 최대 메모리/남은 블록 수 측정 (지연 측정과 분리)"""
+    tables = scenario.tables_factory(0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        ctx = make_planner_context("bench", scenario.name, tables, [dict(p) for p in scenario.places],
+                                   dict(PARAMS), scenario.base_mode)
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        engine_fn(ctx, tables)
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    return peak / 1024.0, blocks
+
+
+def _pct(values, q):
+    vals = sorted(values)
+    return vals[max(0, min(len(vals) - 1, math.ceil(q * len(vals)) - 1))]
+
+
+def run_bench(scenarios, engine_names, runs=3, measure_alloc=True):
+    results = []
+    for sc in scenarios:
+        for name in engine_names:
+            fn = ENGINES[name]
+            lat, nodes, scores, filled = [], [], [], []
+            for run in range(runs):
+                el, nd, score, nf = _run(sc, fn, run)
+                lat.append(el * 1000.0)
+                nodes.append(nd)
+                scores.append(score)
+                filled.append(nf)
+            row = {
+                "scenario": sc.name,
+                "engine": name,
+                "days": sc.days,
+                "places": len(sc.places),
+                "runs": runs,
+                "p50_ms": round(_pct(lat, 0.50), 1),
+                "p95_ms": round(_pct(lat, 0.95), 1),
+                "nodes": int(statistics.mean(nodes)),
+                "score": round(statistics.mean(scores), 3),
+                "filled": round(statistics.mean(filled), 1),
+            }
+            if measure_alloc:
+                peak_kb, blocks = _alloc(sc, fn)
+                row["alloc_peak_kb"] = round(peak_kb, 1)
+                row["alloc_blocks"] = blocks
+            results.append(row)
+            print(_fmt_row(row), flush=True)
+    return results
+
+
+def _fmt_row(row):
+    alloc = f"{row.get('alloc_peak_kb', 0):>10.1f} {row.get('alloc_blocks', 0):>8}" if "alloc_peak_kb" in row else ""
+    return (f"{row['scenario']:<34} {row['engine']:<14} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} "
+            f"{row['nodes']:>9} {row['score']:>9.3f} {row['filled']:>6} {alloc}")
+
+
+def _ints(s):
+    return [int(x) for x in s.split(",") if x.strip()]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="planner benchmark (offline, in-memory places)")
+    ap.add_argument("--days", default="1,3,5,10")
+    ap.add_argument("--places", default="50,200,500,1000")
+    ap.add_argument("--engines", default="dqn,greedy,anytime_200ms,parallel,global,learned")
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--no-recorded", action="store_true")
+    ap.add_argument("--no-synthetic", action="store_true")
+    ap.add_argument("--no-alloc", action="store_true")
+    ap.add_argument("--json", default=None, help="결과를 JSON 파일로 저장")
+    args = ap.parse_args(argv)
+
+    making_table.DEBUG = False
+    engines = [e.strip() for e in args.engines.split(",") if e.strip()]
+    unknown = [e for e in engines if e not in ENGINES]
+    if unknown:
+        ap.error(f"unknown engines: {unknown} (available: {sorted(ENGINES)})")
+    if "learned" in engines and value_model.get_value_model() is None:
+        print(f"[bench] value model not found ({value_model.VALUE_MODEL_PATH}); skipping 'learned'")
+        engines.remove("learned")
+
+    scenarios = []
+    if not args.no_recorded:
+        scenarios += recorded_scenarios()
+    if not args.no_synthetic:
+        scenarios += synthetic_scenarios(_ints(args.days), _ints(args.places))
+
+    print(f"{'scenario':<34} {'engine':<14} {'p50 ms':>9} {'p95 ms':>9} {'nodes':>9} {'score':>9} {'filled':>6}"
+          + ("" if args.no_alloc else f" {'peak KB':>10} {'blocks':>8}"))
+    results = run_bench(scenarios, engines, runs=args.runs, measure_alloc=not args.no_alloc)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
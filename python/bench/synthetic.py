@@ -0,0 +1,59 @@
+# bench/synthetic.py
+"""planner 벤치마크/학습용 합성 장소·일정 생성기 (Firestore 없이 메모리에서만 사용)"""
+import random
+from datetime import date, timedelta, time as dtime
+
+from services.making_table import ScheduleItem, split_empty_range
+
+TYPES = ('tourist_attraction', 'cafe', 'restaurant', 'bakery', 'bar', 'shopping_mall')
+WEEKDAYS_KR = ["월요일", "화요일", "수요일", "목요일", "금요일", "토요일", "일요일"]
+CENTER = (37.5665, 126.9780)  # 서울시청
+
+
+def make_places(n, seed=0, center=CENTER, spread=0.08):
+    """get_places_from_json()과 같은 모양의 장소 n개"""
+    rng = random.Random(seed)
+    places = []
+    for i in range(n):
+        weekday_text = []
+        if rng.random() < 0.6:
+            open_h, close_h = rng.randint(7, 11), rng.randint(17, 23)
+            weekday_text = [f"{d}: 오전 {open_h}:00 ~ 오후 {close_h - 12}:00" for d in WEEKDAYS_KR]
+            if rng.random() < 0.2:
+                weekday_text[rng.randrange(7)] = f"{WEEKDAYS_KR[rng.randrange(7)]}: 휴무일"
+        hope = rng.random()
+        places.append({
+            "name": f"장소{i:04d}",
+            "lat": center[0] + rng.uniform(-spread, spread),
+            "lng": center[1] + rng.uniform(-spread, spread),
+            "type": rng.choice(TYPES),
+            "business_status": "OPERATIONAL" if rng.random() > 0.03 else "CLOSED_TEMPORARILY",
+            "weekday_text": weekday_text,
+            "trust_score": round(rng.uniform(2.0, 5.0), 4),
+            "hope_score": hope,
+            "nonhope_score": rng.random(),
+            "cluster_scores": hope,
+        })
+    return places
+
+
+def make_tables(days, seed=0, start_date="2025-08-01", center=CENTER, day_start=dtime(9, 0), day_end=dtime(23, 0)):
+    """create_empty_daily_tables + insert_initial_schedule_items_dynamic 결과와 같은 모양 (Google API 호출 없음)"""
+    rng = random.Random(seed)
+    d0 = date.fromisoformat(start_date)
+    lodging = {"name": "숙소", "lat": center[0] + rng.uniform(-0.02, 0.02), "lng": center[1] + rng.uniform(-0.02, 0.02)}
+    tables = {}
+    for i in range(days):
+        d = d0 + timedelta(days=i)
+        slots = split_empty_range(day_start, day_end)
+        first_type = "start" if i == 0 else "accommodation"
+        last_type = "end" if i == days - 1 else "accommodation"
+        slots.insert(0, ScheduleItem(lodging["name"], dtime(day_start.hour - 1, 0), day_start, first_type, dict(lodging)))
+        slots.append(ScheduleItem(lodging["name"], day_end, dtime(23, 59), last_type, dict(lodging)))
+        tables[d.isoformat()] = {
+            "weekday": d.strftime("%A"),
+            "start_location": lodging["name"],
+            "end_location": lodging["name"],
+            "schedule": slots,
+        }
+    return tables
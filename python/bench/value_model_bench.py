@@ -0,0 +1,69 @@
+# bench/value_model_bench.py
+"""
+planner 미래 보상 추정 비교: lookahead(depth-3 탐색) vs learned(value_model)
+
+    python -m bench.value_model_bench --days 3 --places 300 --runs 5
+    python -m bench.value_model_bench --train     # 로컬 AI/*.json 기록으로 먼저 학습
+"""
+import io
+import sys
+import json
+import time
+import argparse
+import statistics
+import contextlib
+
+from services import making_table, value_model
+from services.dqn_table_making import make_planner_context, _fill_day, schedule_score
+from bench.synthetic import make_places, make_tables
+
+PARAMS = {"w_dist": 0.5, "w_cluster": 0.4, "w_trust": 0.4, "w_nonhope": 0.3}
+
+
+def _run_once(places, tables, base_mode, future_mode):
+    with contextlib.redirect_stdout(io.StringIO()):
+        ctx = make_planner_context("bench", "bench", tables, [dict(p) for p in places], dict(PARAMS), base_mode)
+        t0 = time.perf_counter()
+        for date_str, info in tables.items():
+            _fill_day(ctx, date_str, info["schedule"], depth=3, future_mode=future_mode)
+    elapsed = time.perf_counter() - t0
+    score = sum(schedule_score(info["schedule"], ctx.by_name, ctx.params, ctx.dist_cache) for info in tables.values())
+    return elapsed, score
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--days", type=int, default=3)
+    ap.add_argument("--places", type=int, default=300)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--train", action="store_true")
+    args = ap.parse_args(argv)
+
+    making_table.DEBUG = False
+    if args.train:
+        _, report = value_model.train(value_model.load_local_histories())
+        print("[train]", json.dumps(report, ensure_ascii=False))
+    if value_model.get_value_model() is None:
+        print(f"value model not found at {value_model.VALUE_MODEL_PATH} (use --train)")
+        return 1
+
+    rows = []
+    for base_mode in value_model.MODES:
+        stats = {"lookahead": ([], []), "learned": ([], [])}
+        for run in range(args.runs):
+            places = make_places(args.places, seed=run)
+            for mode in stats:
+                el, sc = _run_once(places, make_tables(args.days, seed=run), base_mode, mode)
+                stats[mode][0].append(el)
+                stats[mode][1].append(sc)
+        for mode, (els, scs) in stats.items():
+            rows.append((base_mode, mode, statistics.median(els) * 1000, statistics.mean(scs)))
+
+    print(f"{'base_mode':<12} {'future':<10} {'p50 ms':>9} {'score':>9}")
+    for base_mode, mode, ms, sc in rows:
+        print(f"{base_mode:<12} {mode:<10} {ms:>9.1f} {sc:>9.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
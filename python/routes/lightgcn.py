@@ -1,56 +1,61 @@
 # routes/lightgcn.py
 from fastapi import APIRouter, HTTPException
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 import numpy as np
-import math, time, io, json, asyncio
+import os, time, io, json, asyncio, socket, threading, uuid
 import firebase_admin
 from firebase_admin import firestore, storage
 
-import torch
-import torch.nn as nn
-import torch.nn.functional as F
+from services.lightgcn_artifacts import ArtifactCache, build_extras, prune_remote_builds, score_pairs, upload_build
+from services.lightgcn_recommend import FoldInCache, Recommender, RecommendStats, fold_in
+from services.lightgcn_edges import EdgeStore, edges_to_index, latest_update_ts, user_scan
+from services.lightgcn_model import (
+    LightGCN,
+    build_norm_adj,
+    edge_tensors,
+    rating_range,
+    scale_ratings,
+    thread_budget,
+    train_bpr,
+    train_pointwise,
+)
 
 db = firestore.client()
 router = APIRouter(prefix="/api/lightgcn", tags=["lightgcn"])
 
-# ====== 간단한 LightGCN 구현 (미니버전) ======
-class LightGCN(nn.Module):
-    def __init__(self, num_users:int, num_items:int, embedding_dim:int=32, n_layers:int=2):
-        super().__init__()
-        self.num_users = num_users
-        self.num_items = num_items
-        self.embedding_dim = embedding_dim
-        self.n_layers = n_layers
-
-        self.user_emb = nn.Embedding(num_users, embedding_dim)
-        self.item_emb = nn.Embedding(num_items, embedding_dim)
-        nn.init.xavier_uniform_(self.user_emb.weight)
-        nn.init.xavier_uniform_(self.item_emb.weight)
-
-    def forward(self, A_hat: torch.sparse.FloatTensor):
-        # concat user/item 임베딩
-        x0 = torch.cat([self.user_emb.weight, self.item_emb.weight], dim=0)  # (U+I, D)
-        all_layers = [x0]
-        x = x0
-        for _ in range(self.n_layers):
-            x = torch.sparse.mm(A_hat, x)  # message passing
-            all_layers.append(x)
-        x = torch.stack(all_layers, dim=0).mean(dim=0)  # layer-mean
-        users, items = torch.split(x, [self.num_users, self.num_items], dim=0)
-        return users, items
+# ---------- 학습 설정 (env) ----------
+LGN_EPOCHS = int(os.getenv("LIGHTGCN_EPOCHS", "50"))
+LGN_LR = float(os.getenv("LIGHTGCN_LR", "0.01"))
+LGN_BATCH_SIZE = int(os.getenv("LIGHTGCN_BATCH_SIZE", "0"))      # 0: 에폭당 full-batch
+LGN_VAL_FRAC = float(os.getenv("LIGHTGCN_VAL_FRAC", "0"))        # >0: 검증 분할 + early stopping
+LGN_PATIENCE = int(os.getenv("LIGHTGCN_PATIENCE", "5"))
+LGN_ADJ_LAYOUT = os.getenv("LIGHTGCN_ADJ_LAYOUT", "csr")         # "csr" | "coo"
+LGN_TRAINER = os.getenv("LIGHTGCN_TRAINER", "pointwise")         # "pointwise" | "bpr"
+LGN_DIM = int(os.getenv("LIGHTGCN_DIM", "32"))
+LGN_LAYERS = int(os.getenv("LIGHTGCN_LAYERS", "2"))
+LGN_THREADS = int(os.getenv("LIGHTGCN_THREADS", "0"))            # 학습 중 torch 스레드 상한 (0: 기본값)
+LGN_BPR_EPOCHS = int(os.getenv("LIGHTGCN_BPR_EPOCHS", "20"))
+LGN_BPR_BATCH = int(os.getenv("LIGHTGCN_BPR_BATCH", "8192"))
+LGN_BPR_REG = float(os.getenv("LIGHTGCN_BPR_REG", "1e-4"))
+LGN_LOCK_TTL_S = int(os.getenv("LIGHTGCN_LOCK_TTL_S", "1800"))   # 빌드 락 만료 (빌드 중 죽은 레플리카 대비, 빌드 중엔 갱신)
+LGN_MAX_ARTIFACT_AGE_S = int(os.getenv("LIGHTGCN_MAX_ARTIFACT_AGE_S", str(24 * 3600)))  # updatedAt 신호가 없을 때 기준
+LGN_FOLDIN_MAX_PER_CALL = int(os.getenv("LIGHTGCN_FOLDIN_MAX_PER_CALL", "16"))  # 요청 하나에서 새로 계산할 fold-in 유저 수
+LGN_WARM_REBUILD = os.getenv("LIGHTGCN_WARM_REBUILD", "0") == "1"  # 1: 신선도와 무관하게 기동 시 재학습
+_LOCK_HOLDER = f"{socket.gethostname()}:{os.getpid()}"
+
+# 로컬 mmap 번들 (Storage meta 버전이 바뀌면 교체)
+_artifacts = ArtifactCache(lambda: storage.bucket())
 
 # ====== (1) Firestore → 엣지/인덱스 ======
-def _fetch_edges_from_trips() -> Tuple[List[Tuple[str,str,float]], Dict[str,int], Dict[str,int]]:
+_edge_store = EdgeStore()
+
+def _fetch_edges_from_trips(full: bool = False) -> Tuple[List[Tuple[str,str,float]], Dict[str,int], Dict[str,int]]:
     """
-    모든 users의 trips_log/{title}/days/{date} 문서를 collection_group('days')로 한 번에 순회해서
-    (uid, item_name, rating) 엣지를 수집한다.
+    trips_log/{title}/days/{date} 문서의 (uid, item_name, rating) 엣지.
+    로컬 엣지 저장소(services.lightgcn_edges)에 high-water mark 이후 바뀐 문서만 반영하고,
+    저장소가 비었거나 full=True 이면 collection_group('days') 전체 스캔.
     """
-    edges: List[Tuple[str, str, float]] = []
-    user_ids: set[str] = set()
-    item_names: set[str] = set()
-
     # 디버그: 현재 프로젝트/DB/에뮬레이터 확인
-    import os
     try:
         client = firestore.client()
         proj = getattr(client, "project", None)
@@ -59,228 +64,267 @@ def _fetch_edges_from_trips() -> Tuple[List[Tuple[str,str,float]], Dict[str,int]
     except Exception as e:
         print(f"[LGN-DEBUG] client introspection failed: {e}", flush=True)
 
-    days_iter = db.collection_group("days").stream()
-    day_count = 0
-    sched_total = 0
-    sched_with_rating = 0
-
-    for day_doc in days_iter:
-        day_count += 1
-        data = day_doc.to_dict() or {}
-        sched = data.get("schedule", [])
-        if not isinstance(sched, list):
-            continue
-        sched_total += len(sched)
-
-        # 경로: user_trips/{uid}/trips_log/{title}/days/{date}
-        # day_doc.reference.parent == Collection('days')
-        # parent.parent == Document('trips_log/{title}')
-        # parent.parent.parent == Collection('trips_log')
-        # parent.parent.parent.parent == Document('user_trips/{uid}')
-        try:
-            uid = day_doc.reference.parent.parent.parent.parent.id
-        except Exception:
-            # 혹시 구조가 다르면 스킵
-            continue
-
-        for s in sched:
-            if "user_rating" in s:
-                sched_with_rating += 1
-            r = s.get("user_rating")
-            name = (s.get("title") or "").strip()
-            if r is None or not name:
-                continue
-            try:
-                rr = float(r)
-            except Exception:
-                print(f"[LGN-DEBUG] non-float user_rating: uid={uid} title={name} raw={r}", flush=True)
-                continue
-
-            edges.append((uid, name, rr))
-            user_ids.add(uid)
-            item_names.add(name)
+    edges, report = _edge_store.sync(db, force_full=full)
+    print(f"[LGN-DEBUG] edge sync: {report}", flush=True)
 
-    print(
-        f"[LGN-DEBUG] days={day_count} sched_total={sched_total} sched_with_rating={sched_with_rating} "
-        f"edges={len(edges)} unique_users={len(user_ids)} unique_items={len(item_names)}",
-        flush=True
-    )
-
-    uid2idx = {u: i for i, u in enumerate(sorted(user_ids))}
-    item2idx = {it: i for i, it in enumerate(sorted(item_names))}
+    uid2idx, item2idx = edges_to_index(edges)
     print(f"[LGN] edges={len(edges)} users={len(uid2idx)} items={len(item2idx)}", flush=True)
     return edges, uid2idx, item2idx
 
 
 
-# ====== (2) 그래프 정규화 인접행렬 ======
-def _build_norm_adj(edges, uid2idx, item2idx):
+# ====== (4) 아티팩트 저장 (인덱스 + 임베딩) ======
+def _save_artifacts_to_storage(users_emb: np.ndarray, items_emb: np.ndarray,
+                               uid2idx: Dict[str,int], item2idx: Dict[str,int],
+                               source: Dict[str, Any] = None, extras: Dict[str, np.ndarray] = None):
     """
-    U-I 이분그래프 A 구성 후 A_hat = D^{-1/2} A D^{-1/2} 스파스 텐서 반환
-    rating은 가중치로 쓰되, 0.5~5.0 범위 → 간단히 min-max 정규화(0~1) 후 (기본 1.0) 섞음.
+    Firebase Storage에 다음 업로드:
+      - lightgcn/builds/{build_id}/user_index.json, item_index.json
+      - lightgcn/builds/{build_id}/users_emb.npy, items_emb.npy
+      - lightgcn/builds/{build_id}/{item_coords, rated_indptr, rated_items, item_degree}.npy (extras, 추천용)
+      - lightgcn/meta.json (마지막에, prefix 로 위 빌드를 가리킴)
     """
-    num_u = len(uid2idx)
-    num_i = len(item2idx)
-    N = num_u + num_i
-
-    # rating 정규화 (간단)
-    if edges:
-        all_r = [r for _,_,r in edges]
-        rmin, rmax = min(all_r), max(all_r)
-    else:
-        rmin, rmax = 0.5, 5.0
+    bucket = storage.bucket()  # 기본 버킷
+    ts = int(time.time())
+    prefix = upload_build(bucket, f"{ts}-{uuid.uuid4().hex[:8]}", users_emb, items_emb, uid2idx, item2idx, extras)
 
-    rows, cols, vals = [], [], []
-    deg = np.zeros(N, dtype=np.float32)
+    # 메타(버전)
+    meta = {"updated_at": ts, "version": str(ts), "dim": users_emb.shape[1] if users_emb.size else 0,
+            "num_users": users_emb.shape[0], "num_items": items_emb.shape[0],
+            "prefix": prefix, "extras": sorted(extras or {})}
+    # 학습에 쓴 데이터 시점 (num_edges, source_updated_at) → warm_start 신선도 판단
+    meta.update(source or {})
+    meta_blob = bucket.blob("lightgcn/meta.json")
+    meta_blob.upload_from_string(json.dumps(meta), content_type="application/json")
+    try:
+        prune_remote_builds(bucket, prefix)
+    except Exception as e:
+        print(f"[LGN] remote prune failed: {e}", flush=True)
 
-    for u_raw, it_raw, r in edges:
-        u = uid2idx[u_raw]
-        i = item2idx[it_raw] + num_u  # item index offset
-        if rmax > rmin:
-            w = (r - rmin) / (rmax - rmin)  # 0~1
-            w = 0.5 + 0.5 * w               # 0.5~1.0 (너무 과한 가중치 방지)
-        else:
-            w = 1.0
-
-        rows += [u, i]
-        cols += [i, u]
-        vals += [w, w]
-        deg[u] += w
-        deg[i] += w
-
-    # 정규화 계수
-    deg[deg == 0] = 1.0
-    norm_vals = []
-    for r,c,v in zip(rows, cols, vals):
-        norm_vals.append(v / math.sqrt(deg[r] * deg[c]))
-
-    i_idx = torch.tensor([rows, cols], dtype=torch.long)
-    v_val = torch.tensor(norm_vals, dtype=torch.float32)
-    A_hat = torch.sparse_coo_tensor(i_idx, v_val, size=(N, N))
-    return A_hat.coalesce(), num_u, num_i
-
-# ====== (3) 학습 ======
-def _train(lightgcn: LightGCN, A_hat, edges, uid2idx, item2idx, epochs:int=50, lr:float=1e-2):
-    """
-    매우 단순한 BPR 유사 학습(양성만 있는 상황이므로 pointwise 회귀로 대체 가능).
-    여기서는 pointwise 회귀(예측 점수 ~ rating)를 최소구성으로 사용.
-    """
-    opt = torch.optim.Adam(lightgcn.parameters(), lr=lr)
-    # rating을 0~1로 스케일하여 회귀 타겟
-    if edges:
-        all_r = [r for _,_,r in edges]
-        rmin, rmax = min(all_r), max(all_r)
-    else:
-        rmin, rmax = 0.5, 5.0
-
-    def scale(r):
-        if rmax > rmin:
-            return (r - rmin) / (rmax - rmin)
-        return 0.5
-
-    for ep in range(epochs):
-        users, items = lightgcn(A_hat)
-        loss = 0.0
-        cnt = 0
-        for uid_raw, item_raw, r in edges:
-            u = uid2idx[uid_raw]
-            i = item2idx[item_raw]
-            score = (users[u] * items[i]).sum()    # 내적
-            target = torch.tensor(scale(r), dtype=torch.float32)
-            loss = loss + F.mse_loss(score, target)
-            cnt += 1
-        if cnt > 0:
-            loss = loss / cnt
-        else:
-            loss = torch.tensor(0.0)
+    # 파이어스토어에도 버전 기록(선택)
+    db.collection("lightgcn").document("meta").set(meta, merge=True)
+
+    # 이 프로세스는 다시 내려받지 않고 바로 교체, 다른 워커/레플리카는 meta generation 변화를 보고 교체
+    try:
+        _artifacts.publish(f"{meta['version']}-{meta_blob.generation}", users_emb, items_emb, uid2idx, item2idx, meta,
+                           extras=extras)
+    except Exception as e:
+        print(f"[LGN] local artifact publish failed: {e}", flush=True)
+        _artifacts.invalidate()
 
-        opt.zero_grad()
-        loss.backward()
-        opt.step()
+# ====== (5) 신선도 확인 + 빌드 락 ======
+def _read_storage_meta():
+    blob = storage.bucket().blob("lightgcn/meta.json")
+    if not blob.exists():
+        return None
+    return json.loads(blob.download_as_text())
 
-    return lightgcn
 
-# ====== (4) 아티팩트 저장 (인덱스 + 임베딩) ======
-def _save_artifacts_to_storage(users_emb: np.ndarray, items_emb: np.ndarray,
-                               uid2idx: Dict[str,int], item2idx: Dict[str,int]):
+def _latest_source_ts():
+    try:
+        return latest_update_ts(db)
+    except Exception as e:
+        # collection_group updatedAt 색인이 없으면 실패
+        print(f"[LGN] latest updatedAt query failed: {e}", flush=True)
+        return None
+
+
+def _artifacts_fresh() -> Tuple[bool, str]:
     """
-    Firebase Storage에 다음 업로드:
-      - lightgcn/user_index.json
-      - lightgcn/item_index.json
-      - lightgcn/users_emb.npy
-      - lightgcn/items_emb.npy
+    저장된 아티팩트가 현재 평점 데이터로 학습된 것인지.
+    1) 가장 최근 days.updatedAt(쓰는 쪽에서 serverTimestamp 로 찍음) <= meta.source_updated_at
+    2) 그 신호를 못 쓰면(색인 없음 / 찍힌 문서 없음) 아티팩트 나이 < LIGHTGCN_MAX_ARTIFACT_AGE_S
+       → 기동 시 신선도 확인만을 위해 days 를 스캔하지 않는다
     """
-    bucket = storage.bucket()  # 기본 버킷
-    ts = int(time.time())
+    try:
+        meta = _read_storage_meta()
+    except Exception as e:
+        return False, f"meta unreadable: {e}"
+    if not meta:
+        return False, "no meta"
 
-    # 인덱스 (역인덱스 포함)
-    user_index = {"uid2idx": uid2idx}
-    item_index = {"item2idx": item2idx}
+    latest = _latest_source_ts()
+    if latest:
+        built = meta.get("source_updated_at")
+        if built is None:
+            return False, "meta has no source_updated_at"
+        return latest <= built, f"latest_update={latest:.0f} built_from={built:.0f}"
 
-    for name, obj in [("user_index.json", user_index), ("item_index.json", item_index)]:
-        blob = bucket.blob(f"lightgcn/{name}")
-        blob.upload_from_string(json.dumps(obj, ensure_ascii=False), content_type="application/json")
+    age = time.time() - float(meta.get("updated_at") or 0)
+    return age < LGN_MAX_ARTIFACT_AGE_S, f"no updatedAt signal; artifact age={age:.0f}s"
 
-    # numpy 배열
-    for name, arr in [("users_emb.npy", users_emb), ("items_emb.npy", items_emb)]:
-        buf = io.BytesIO()
-        np.save(buf, arr)
-        buf.seek(0)
-        blob = bucket.blob(f"lightgcn/{name}")
-        blob.upload_from_file(buf, content_type="application/octet-stream")
 
-    # 메타(버전)
-    meta = {"updated_at": ts, "dim": users_emb.shape[1] if users_emb.size else 0,
-            "num_users": users_emb.shape[0], "num_items": items_emb.shape[0]}
-    bucket.blob("lightgcn/meta.json").upload_from_string(json.dumps(meta), content_type="application/json")
+class _BuildLease:
+    """
+    lightgcn/build_lock 문서 임대(lease). 획득마다 새 token 을 쓰고, 갱신/해제는 token 이 같을 때만 (트랜잭션).
+    같은 프로세스의 두 번째 빌드도 막는다. 빌드가 TTL 보다 길면 TTL/3 마다 만료 시각을 연장
+    """
 
-    # 파이어스토어에도 버전 기록(선택)
-    db.collection("lightgcn").document("meta").set(meta, merge=True)
-    
-    try:
-        _load_artifacts_from_storage.cache_clear()
-    except Exception:
-        pass
+    def __init__(self, ttl: int = LGN_LOCK_TTL_S):
+        self.ttl = ttl
+        self.ref = db.collection("lightgcn").document("build_lock")
+        self.token = uuid.uuid4().hex
+        self.lost = False
+        self._stop = threading.Event()
+        self._renewer = None
+
+    def _txn(self, fn):
+        return firestore.transactional(fn)(db.transaction())
+
+    def acquire(self) -> bool:
+        """
+        True: 획득, False: 만료 전 임대를 다른 쪽이 들고 있음.
+        트랜잭션 자체가 실패(권한/네트워크 등)하면 예외를 그대로 올린다 → 경합(409)과 구분
+        """
+        def _take(tx):
+            snap = self.ref.get(transaction=tx)
+            cur = snap.to_dict() if snap.exists else None
+            now = time.time()
+            if cur and cur.get("expires_at", 0) > now:
+                return False
+            tx.set(self.ref, {"holder": _LOCK_HOLDER, "token": self.token,
+                              "acquired_at": now, "expires_at": now + self.ttl})
+            return True
+
+        ok = bool(self._txn(_take))
+        if ok:
+            self._renewer = threading.Thread(target=self._renew_loop, name="lgn-lease", daemon=True)
+            self._renewer.start()
+        return ok
+
+    def _renew_loop(self):
+        while not self._stop.wait(max(1.0, self.ttl / 3)):
+            def _extend(tx):
+                snap = self.ref.get(transaction=tx)
+                if not snap.exists or (snap.to_dict() or {}).get("token") != self.token:
+                    return False
+                tx.update(self.ref, {"expires_at": time.time() + self.ttl})
+                return True
+            try:
+                if not self._txn(_extend):
+                    self.lost = True
+                    print("[LGN] build lock lost (taken over after expiry)", flush=True)
+                    return
+            except Exception as e:
+                print(f"[LGN] build lock renew failed: {e}", flush=True)
+
+    def release(self):
+        self._stop.set()
+        if self._renewer is not None:
+            self._renewer.join(timeout=5)
+
+        def _drop(tx):
+            snap = self.ref.get(transaction=tx)
+            if snap.exists and (snap.to_dict() or {}).get("token") == self.token:
+                tx.delete(self.ref)
+
+        try:
+            self._txn(_drop)
+        except Exception as e:
+            print(f"[LGN] build lock release failed: {e}", flush=True)
 
 # ====== 엔드포인트 ======
 
 @router.post("/build_from_log")
-@router.post("/build_from_log")
-def build_from_log():
+def build_from_log(full: bool = False):
+    """full=True: 로컬 엣지 저장소를 버리고 Firestore 전체 스캔으로 다시 만든 뒤 학습"""
     print("[LGN] build_from_log called", flush=True)
-    edges, uid2idx, item2idx = _fetch_edges_from_trips()
+    lease = _BuildLease()
+    try:
+        acquired = lease.acquire()
+    except Exception as e:
+        print(f"[LGN] build lock check failed: {e}", flush=True)
+        raise HTTPException(503, f"빌드 락을 확인하지 못했습니다: {e}")
+    if not acquired:
+        raise HTTPException(409, "다른 인스턴스가 LightGCN을 학습 중입니다.")
+    try:
+        return _build(full, lease)
+    finally:
+        lease.release()
+
+
+def _build(full: bool = False, lease: "_BuildLease" = None):
+    # 스캔 전에 시점을 잡아야 학습 중 들어온 평점이 다음 신선도 확인에서 stale 로 잡힌다
+    source_ts = _latest_source_ts()
+    edges, uid2idx, item2idx = _fetch_edges_from_trips(full=full)
     print(f"[LGN] after fetch: edges={len(edges)} users={len(uid2idx)} items={len(item2idx)}", flush=True)
 
     if not edges:
         print("[LGN] no edges -> 400", flush=True)
         raise HTTPException(400, "엣지가 없습니다. (user_rating 없음)")
 
-    A_hat, num_u, num_i = _build_norm_adj(edges, uid2idx, item2idx)
+    A_hat, num_u, num_i = build_norm_adj(edges, uid2idx, item2idx, layout=LGN_ADJ_LAYOUT)
     print(f"[LGN] adj built: U={num_u} I={num_i} nnz={A_hat._nnz()}", flush=True)
 
-    model = LightGCN(num_u, num_i, embedding_dim=32, n_layers=2)
-    model = _train(model, A_hat, edges, uid2idx, item2idx, epochs=50, lr=1e-2)
-    print("[LGN] train finished", flush=True)
+    u_idx, i_idx, ratings = edge_tensors(edges, uid2idx, item2idx)
+    rmin, rmax = rating_range(edges)
+    target = scale_ratings(ratings, rmin, rmax)
+    model = LightGCN(num_u, num_i, embedding_dim=LGN_DIM, n_layers=LGN_LAYERS)
+    with thread_budget(LGN_THREADS):
+        if LGN_TRAINER == "bpr":
+            model, hist = train_bpr(model, A_hat, u_idx, i_idx, epochs=LGN_BPR_EPOCHS, lr=LGN_LR,
+                                    batch_size=LGN_BPR_BATCH, reg=LGN_BPR_REG)
+        else:
+            model, hist = train_pointwise(model, A_hat, u_idx, i_idx, target, epochs=LGN_EPOCHS, lr=LGN_LR,
+                                          batch_size=LGN_BATCH_SIZE, val_frac=LGN_VAL_FRAC, patience=LGN_PATIENCE)
+        users, items = model(A_hat)
+    print(f"[LGN] train finished ({LGN_TRAINER}): {hist}", flush=True)
 
-    users, items = model(A_hat)
     users_np = users.detach().cpu().numpy()
     items_np = items.detach().cpu().numpy()
     print(f"[LGN] emb shapes: users={users_np.shape} items={items_np.shape}", flush=True)
 
-    _save_artifacts_to_storage(users_np, items_np, uid2idx, item2idx)
+    if lease is not None and lease.lost:
+        # 락이 만료돼 다른 레플리카가 빌드 중 → 그쪽 결과를 덮어쓰지 않음
+        raise HTTPException(409, "빌드 락을 잃어 결과를 저장하지 않았습니다.")
+    _save_artifacts_to_storage(users_np, items_np, uid2idx, item2idx,
+                               source={"num_edges": len(edges), "source_updated_at": source_ts,
+                                       "rating_min": rmin, "rating_max": rmax},
+                               extras=build_extras(edges, uid2idx, item2idx, _edge_store.item_coords()))
     print("[LGN] artifacts saved to storage", flush=True)
 
     return {"ok": True, "users": int(users_np.shape[0]), "items": int(items_np.shape[0]), "dim": int(users_np.shape[1])}
 
 @router.post("/warm_start")  # 서버 기동시 백그라운드 호출용
 def warm_start():
+    """
+    아티팩트가 최신이면 로드만, 아니면 빌드 락을 잡은 레플리카 하나만 재학습.
+    락을 못 잡은 레플리카는 기존 아티팩트로 서비스 (새 버전은 meta 갱신 후 반영)
+    """
+    if not LGN_WARM_REBUILD:
+        fresh, why = _artifacts_fresh()
+        print(f"[LGN] warm_start freshness: fresh={fresh} ({why})", flush=True)
+        if fresh:
+            _prime_artifacts()
+            return {"ok": True, "skipped": "fresh", "reason": why}
+
+    lease = _BuildLease()
+    try:
+        acquired = lease.acquire()
+    except Exception as e:
+        # 락 상태를 모름 (권한/네트워크 등) → 경합이 아니라 실패로 보고, 있는 아티팩트로 서비스
+        print(f"[LGN] build lock check failed: {e}", flush=True)
+        _prime_artifacts()
+        return {"ok": False, "reason": f"build lock unavailable: {e}"}
+    if not acquired:
+        _prime_artifacts()
+        return {"ok": True, "skipped": "locked", "reason": "another replica is rebuilding"}
     try:
-        return build_from_log()
+        return _build(lease=lease)
     except HTTPException as e:
         # 학습할 엣지가 없으면 조용히 통과
         if e.status_code == 400:
             return {"ok": False, "reason": e.detail}
         raise
+    finally:
+        lease.release()
+
+
+def _prime_artifacts():
+    try:
+        _artifacts.get()
+    except Exception as e:
+        print(f"[LGN] artifacts not loaded: {e}", flush=True)
 
 @router.get("/status")
 def status():
@@ -290,32 +334,67 @@ def status():
         return {"ok": True, "meta": snap.to_dict()}
     return {"ok": False, "meta": None}
 
-from functools import lru_cache
 from pydantic import BaseModel
 
-@lru_cache(maxsize=1)
-def _load_artifacts_from_storage():
-    """Firebase Storage에서 인덱스/임베딩을 읽어 메모리에 캐시."""
-    b = storage.bucket()
-    uidx_blob = b.blob("lightgcn/user_index.json")
-    iidx_blob = b.blob("lightgcn/item_index.json")
-    uemb_blob = b.blob("lightgcn/users_emb.npy")
-    iemb_blob = b.blob("lightgcn/items_emb.npy")
-    if not (uidx_blob.exists() and iidx_blob.exists() and uemb_blob.exists() and iemb_blob.exists()):
-        raise RuntimeError("artifacts not found in storage")
-    uid2idx = json.loads(uidx_blob.download_as_text())["uid2idx"]
-    item2idx = json.loads(iidx_blob.download_as_text())["item2idx"]
-    u_bytes = io.BytesIO(uemb_blob.download_as_bytes())
-    i_bytes = io.BytesIO(iemb_blob.download_as_bytes())
-    users_emb = np.load(u_bytes)
-    items_emb = np.load(i_bytes)
-    return uid2idx, item2idx, users_emb, items_emb
+# ====== 신규 유저 fold-in ======
+_fold_in_cache = FoldInCache()
+
+
+def _fold_in_user(art, uid):
+    """모델에 없는 유저: Firestore 의 평가 기록으로 임베딩 계산 (TTL 캐시) → (vec|None, 평가 아이템 행 번호)"""
+    hit = _fold_in_cache.get(uid, art.version)
+    if hit is not None:
+        return hit
+    records, _ = user_scan(db, uid)
+    names, ratings = [], []
+    for _, items in records.values():
+        for name, r, *_ in items:
+            names.append(name)
+            ratings.append(r)
+    idx = art.item_indices(names)
+    rated = [(int(i), r) for i, r in zip(idx.tolist(), ratings) if i >= 0]
+    vec, items = fold_in(art, rated)
+    print(f"[LGN] fold-in uid={uid} rated={len(names)} matched={len(rated)}", flush=True)
+    _fold_in_cache.put(uid, art.version, vec, items)
+    return vec, items
+
+
+def _fold_in_vecs(art, uids, deferred=None):
+    """
+    모델에 없는 uid 들의 fold-in 벡터 (평가 기록이 없거나 조회 실패면 빠짐).
+    캐시에 없는 유저는 요청 순서대로 LGN_FOLDIN_MAX_PER_CALL 명까지만 user_scan, 나머지는 deferred 에 담음
+    """
+    out = {}
+    scans = 0
+    for uid in dict.fromkeys(uids):
+        if uid in art.uid2idx:
+            continue
+        if _fold_in_cache.get(uid, art.version) is None:
+            if scans >= LGN_FOLDIN_MAX_PER_CALL:
+                if deferred is not None:
+                    deferred.add(uid)
+                continue
+            scans += 1
+        try:
+            vec, _ = _fold_in_user(art, uid)
+        except Exception as e:
+            print(f"[LGN] fold-in failed uid={uid}: {e}", flush=True)
+            continue
+        if vec is not None:
+            out[uid] = vec
+    return out
+
 
 class ScoreReq(BaseModel):
     uid: str
 
     items: list[str]   # 장소 이름 리스트 (trips/{uid}/trips/{title}/places 의 name 기준)
-    
+
+
+class ScoreBatchReq(BaseModel):
+    requests: list[ScoreReq]
+
+
 @router.post("/score")
 def score_items(payload: ScoreReq):
     """
@@ -323,30 +402,117 @@ def score_items(payload: ScoreReq):
     매칭되는 아이템이 없으면 score=None.
     """
     try:
-        uid2idx, item2idx, users_emb, items_emb = _load_artifacts_from_storage()
+        art = _artifacts.get()
     except Exception as e:
         return {"ok": False, "reason": f"artifacts not ready: {e}", "scores": []}
 
-    if payload.uid not in uid2idx:
-        # 학습셋에 없는 유저
+    vecs = _fold_in_vecs(art, [payload.uid])
+    scores = score_pairs(art, [(payload.uid, payload.items)], vecs)[0]
+    if scores is None:
+        # 학습셋에 없고 평가 기록도 없는 유저
         return {"ok": True, "scores": [], "reason": "user not in model"}
+    out = {"ok": True, "scores": [{"name": n, "score": s} for n, s in zip(payload.items, scores)]}
+    if payload.uid in vecs:
+        out["fold_in"] = True
+    return out
 
-    # (선택) 이름 정규화 키 – 공백 trim/소문자
-    norm = lambda s: (s or "").strip().lower()
-    item2idx_norm = {norm(k): v for k, v in item2idx.items()}
-
-    uvec = users_emb[uid2idx[payload.uid]]
-    out = []
-    for name in payload.items:
-        idx = item2idx.get(name)
-        if idx is None:
-            # 정규화 매칭 시도
-            idx = item2idx_norm.get(norm(name))
-        if idx is None:
-            out.append({"name": name, "score": None})
-            continue
-        ivec = items_emb[idx]
-        score = float(np.dot(uvec, ivec))  # 필요시 cosine으로 변경 가능
-        out.append({"name": name, "score": score})
 
-    return {"ok": True, "scores": out}
\ No newline at end of file
+@router.post("/score_batch")
+def score_items_batch(payload: ScoreBatchReq):
+    """여러 (uid, items) 요청을 한 번에 채점. results 순서는 요청 순서와 같음"""
+    try:
+        art = _artifacts.get()
+    except Exception as e:
+        return {"ok": False, "reason": f"artifacts not ready: {e}", "results": []}
+
+    deferred = set()
+    vecs = _fold_in_vecs(art, [r.uid for r in payload.requests], deferred)
+    all_scores = score_pairs(art, [(r.uid, r.items) for r in payload.requests], vecs)
+    results = []
+    for r, scores in zip(payload.requests, all_scores):
+        if scores is None:
+            # 한도를 넘긴 신규 유저는 다음 호출(또는 /score)에서 다시 시도
+            reason = "fold-in limit per call exceeded" if r.uid in deferred else "user not in model"
+            results.append({"uid": r.uid, "scores": [], "reason": reason})
+        else:
+            res = {"uid": r.uid, "scores": [{"name": n, "score": s} for n, s in zip(r.items, scores)]}
+            if r.uid in vecs:
+                res["fold_in"] = True
+            results.append(res)
+    return {"ok": True, "version": art.version, "results": results}
+
+
+# ====== top-K 추천 ======
+_recommender = None
+_recommend_stats = RecommendStats()
+_recommender_lock = threading.Lock()
+
+
+def _get_recommender(art) -> Recommender:
+    global _recommender
+    with _recommender_lock:
+        if _recommender is None or _recommender.art.version != art.version:
+            _recommender = Recommender(art)
+        return _recommender
+
+
+class RecommendReq(BaseModel):
+    uid: str
+    k: int = 20
+    exclude_rated: bool = True
+    lat: Optional[float] = None
+    lng: Optional[float] = None
+    radius_km: float = 10.0
+    mode: str = "auto"              # "auto" | "exact" | "approx"
+
+
+@router.post("/recommend")
+def recommend(payload: RecommendReq):
+    """유저 임베딩과 내적이 큰 아이템 top-K (이미 평가한 아이템 제외, lat/lng 주면 반경 안에서만)"""
+    t0 = time.perf_counter()
+    try:
+        art = _artifacts.get()
+    except Exception as e:
+        return {"ok": False, "reason": f"artifacts not ready: {e}", "items": []}
+    if payload.mode not in ("auto", "exact", "approx"):
+        raise HTTPException(400, "mode 는 auto|exact|approx 중 하나입니다.")
+    if not 1 <= payload.k <= 1000:
+        raise HTTPException(400, "k 는 1~1000 입니다.")
+
+    u = art.uid2idx.get(payload.uid)
+    if u is not None:
+        uvec, rated = np.asarray(art.users_emb[u], dtype=np.float32), art.rated_items(u)
+    else:
+        uvec = _fold_in_vecs(art, [payload.uid]).get(payload.uid)
+        if uvec is None:
+            return {"ok": True, "items": [], "reason": "user not in model"}
+        rated = _fold_in_user(art, payload.uid)[1]
+
+    region = None
+    if payload.lat is not None and payload.lng is not None:
+        region = (payload.lat, payload.lng, payload.radius_km)
+    rec = _get_recommender(art)
+    try:
+        items, mode = rec.recommend(uvec, k=payload.k,
+                                    exclude=rated if payload.exclude_rated else None,
+                                    region=region, mode=payload.mode)
+    except ValueError as e:
+        return {"ok": False, "reason": str(e), "items": []}
+
+    ms = (time.perf_counter() - t0) * 1000.0
+    _recommend_stats.record(payload.k, mode, ms)
+    return {
+        "ok": True,
+        "version": art.version,
+        "mode": mode,
+        "latency_ms": round(ms, 3),
+        "fold_in": u is None,
+        "items": [{"name": n, "score": s, "lat": lat, "lng": lng} for n, s, lat, lng in items],
+    }
+
+
+@router.get("/recommend/stats")
+def recommend_stats():
+    """K·mode별 최근 추천 지연시간"""
+    return {"ok": True, "latency": _recommend_stats.summary()}
+
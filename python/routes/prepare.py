@@ -1,8 +1,8 @@
 # routes/prepare.py
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
-import os, traceback
+from typing import List, Optional, Dict, Any, Literal
+import os, re, json, glob, time, traceback
 from datetime import time as dtime, datetime
 
 from services.making_table import (
@@ -10,7 +10,31 @@ from services.making_table import (
     insert_initial_schedule_items_dynamic,
     ScheduleItem,  # ScheduleItem이 공개되어 있다고 가정
 )
-from services.dqn_table_making import dqn_fill_schedule
+from services.timeline import hhmm, parse_hhmm
+from services.slot_patch import DayPatch, apply_patches, minute_of, span_key
+from services.dqn_table_making import (
+    dqn_fill_schedule,
+    dqn_fill_schedule_anytime,
+    dqn_fill_schedule_alternatives,
+    fork_context,
+    load_planner_context,
+    empty_slots,
+    replan_changed_slots,
+    copy_tables,
+)
+from services.parallel_planner import dqn_fill_schedule_parallel, plan_variants, warm_distance_cache
+from services.global_planner import dqn_fill_schedule_global
+from services.route_optimizer import optimize_day_routes
+from services.planner_session import save_session, get_session
+from services import planner_cache, planner_results
+from services.planner_stats import PlannerStats
+
+# trace="chrome" 일 때 Trace Event JSON을 저장할 디렉터리
+PLANNER_TRACE_DIR = os.getenv("PLANNER_TRACE_DIR", "planner_traces")
+# 디렉터리에 남겨 둘 최대 trace 파일 수 (넘으면 오래된 것부터 삭제)
+PLANNER_TRACE_KEEP = int(os.getenv("PLANNER_TRACE_KEEP", "200"))
+# /routes/prepare_dqn_batch 한 번에 받을 최대 변형 수
+PLANNER_BATCH_MAX = int(os.getenv("PLANNER_BATCH_MAX", "8"))
 
 router = APIRouter()
 
@@ -82,10 +106,47 @@ class PreparePayload(BaseModel):
     # 프런트( Journey.js > toTables )가 보내는 현재 화면 테이블
     client_tables: Optional[Dict[str, Any]] = None
 
+    # anytime 모드: 지정 시 greedy 결과를 먼저 만들고 이 시간(ms) 안에서만 개선
+    time_budget_ms: Optional[int] = Field(default=None, ge=0)
+
+    # 날짜별로 장소 풀을 나눠 프로세스 풀에서 동시에 planning (여러 날 일정용)
+    parallel_days: bool = False
+
+    # 미래 보상 추정: depth-3 탐색 | 학습된 가치 모델 (모델 파일 없으면 lookahead)
+    future_mode: Literal["lookahead", "learned"] = "lookahead"
+
+    # 전 일정 동시 배정(타입별 최적 배정 + 교환 국소 탐색). time_budget_ms는 국소 탐색 상한으로 사용
+    global_assign: bool = False
+
+    # 후처리: 하루 안에서 planner가 채운 슬롯의 방문 순서를 바꿔 이동 거리 단축 (요청당 시간 상한 ms)
+    optimize_route: bool = False
+    route_time_budget_ms: int = Field(default=50, ge=0, le=2000)
+
+    # 대안 일정 수: 2 이상이면 한 번의 탐색(공유 캐시)으로 서로 다른 일정을 함께 돌려줌
+    alternatives: int = Field(default=1, ge=1, le=5)
+    # 대안끼리 허용하는 planner 선택 장소 겹침 비율 (Jaccard)
+    max_overlap: float = Field(default=0.5, ge=0.0, le=1.0)
+
+    # 탐색 계측: "stats"면 슬롯별 카운터를 응답에 포함, "chrome"이면 chrome://tracing 파일도 저장
+    # (parallel_days 는 워커별 계측을 합쳐 날짜마다 다른 tid 로 표시, /prepare_dqn_batch 는 무시)
+    trace: Optional[Literal["stats", "chrome"]] = None
+
 def _log(*args):
     print("[/routes/prepare]", *args, flush=True)
 
 # ---------- 공통 유틸 ----------
+def _trace_path(uid: str) -> str:
+    """uid 는 파일 이름에 쓸 수 있는 문자만 남기고, 디렉터리는 PLANNER_TRACE_KEEP 개까지만 유지"""
+    os.makedirs(PLANNER_TRACE_DIR, exist_ok=True)
+    old = sorted(glob.glob(os.path.join(PLANNER_TRACE_DIR, "prepare_dqn-*.json")), key=os.path.getmtime)
+    for f in old[:max(0, len(old) - PLANNER_TRACE_KEEP + 1)]:
+        try:
+            os.remove(f)
+        except OSError:
+            pass
+    safe_uid = re.sub(r"[^\w-]", "_", uid, flags=re.ASCII)[:64] or "_"
+    return os.path.join(PLANNER_TRACE_DIR, f"prepare_dqn-{safe_uid}-{int(time.time() * 1000)}.json")
+
 def _hhmm(s: str) -> dtime:
     h, m = s.split(":")
     return dtime(int(h), int(m))
@@ -111,8 +172,8 @@ def _serialize_tables(tables: dict) -> dict:
             loc = getattr(it, "location_info", None) or {}
             out[d]["schedule"].append({
                 "title": it.title,
-                "start": it.start.strftime("%H:%M"),
-                "end": it.end.strftime("%H:%M"),
+                "start": hhmm(it.start_min),
+                "end": hhmm(it.end_min),
                 "place_type": it.place_type,
                 "lat": loc.get("lat"),
                 "lng": loc.get("lng"),
@@ -158,261 +219,57 @@ def _build_base_tables(req: PreparePayload):
         raise ValueError("생성된 일정 테이블이 비어 있습니다. 날짜/시간을 확인하세요.")
     return tables
 
-# ---------- 삭제 반영 ----------
-def _time_to_hhmm(t) -> str:
-    if t is None:
-        return ""
-    if isinstance(t, str):
-        return t
-    return f"{t.hour:02d}:{t.minute:02d}"
-
-def _clear_slots_by_deletions(tables: dict, deletions: Optional[List[DeletionItem]]):
-    if not deletions:
-        return
-
-    by_date = {}
-    for d in deletions:
-        by_date.setdefault(d.date, set()).add((d.start, d.end))
-
-    cleared = 0
-    for date_str, info in tables.items():
-        targets = by_date.get(date_str)
-        if not targets:
-            continue
-        schedule = info.get("schedule", [])
-        for slot in schedule:
-            s = _time_to_hhmm(getattr(slot, "start", None))
-            e = _time_to_hhmm(getattr(slot, "end", None))
-            if (s, e) in targets:
-                if getattr(slot, "place_type", None) in ("start", "end", "accommodation"):
-                    continue
-                slot.title = None
-                slot.place_type = None
-                slot.location_info = None
-                cleared += 1
-    _log(f"dqn deletions applied. cleared_slots={cleared}")
-
-# ---------- 분할/병합 공통 ----------
-MIN_SLOT_MINUTES = 30
-ROUND_TO_MINUTES = 15
-PROTECTED_TYPES = {"start", "end", "accommodation"}
-
-def _parse_hhmm(s: str) -> dtime:
-    h, m = s.split(":")
-    return dtime(int(h), int(m))
-
-def _to_minutes(t: dtime) -> int:
-    return t.hour * 60 + t.minute
-
-def _to_time(mins: int) -> dtime:
-    mins = max(0, min(24 * 60 - 1, mins))
-    return dtime(mins // 60, mins % 60)
-
-def _round_to(mins: int, base: int) -> int:
-    return round(mins / base) * base
-
-# ---------- 병합 -----------------------------
-
-def _find_slot_index_by_se(schedule, start_hhmm: str, end_hhmm: str):
-    for i, slot in enumerate(schedule):
-        s = _time_to_hhmm(getattr(slot, "start", None))
-        e = _time_to_hhmm(getattr(slot, "end", None))
-        if s == start_hhmm and e == end_hhmm:
-            return i
-    return None
-
-def _apply_merges(tables: dict, merges: Optional[List["MergeItem"]]):
-    """프런트에서 선택한 두 인접 슬롯을 하나로 합친다.
-    - 첫 클릭(=winner)의 콘텐츠/타입을 유지
-    - 시간은 두 슬롯의 min(start) ~ max(end)로 확장
-    - 보호 슬롯(start/end/accommodation) 포함 시 skip
+# ---------- diff 반영 (삭제/분할/병합/오버레이/고정) ----------
+def _apply_diff(tables: dict, deletions: Optional[List[DeletionItem]] = None,
+                splits: Optional[List[SplitItem]] = None, merges: Optional[List[MergeItem]] = None,
+                client_timeline: Optional[List[ClientDay]] = None,
+                fixed_slots: Optional[List[FixedSlot]] = None):
     """
-    if not merges:
-        return
-    applied = 0
-    for m in merges:
-        info = tables.get(m.date)
-        if not info:
-            continue
-        schedule = info.get("schedule", [])
-        wi = _find_slot_index_by_se(schedule, m.winner["start"], m.winner["end"])
-        li = _find_slot_index_by_se(schedule, m.loser["start"],  m.loser["end"])
-        if wi is None or li is None:
-            continue
-        i, j = sorted([wi, li])
-        a = schedule[i]
-        b = schedule[j]
-        # 보호 슬롯 방어
-        if (getattr(a, "place_type", None) in PROTECTED_TYPES or
-            getattr(b, "place_type", None) in PROTECTED_TYPES):
-            continue
-
-        # 시간 병합 범위
-        a_s = _parse_hhmm(_time_to_hhmm(a.start))
-        a_e = _parse_hhmm(_time_to_hhmm(a.end))
-        b_s = _parse_hhmm(_time_to_hhmm(b.start))
-        b_e = _parse_hhmm(_time_to_hhmm(b.end))
-        new_start = min(a_s, b_s)
-        new_end   = max(a_e, b_e)
-
-        # 승자(winner) 정보 유지
-        winner_is_a = (wi == i)
-        winner_slot = a if winner_is_a else b
-
-        # slot 타입은 같은 클래스 인스턴스로 생성
-        NewCls = type(a)
-        merged = NewCls(
-            title = getattr(winner_slot, "title", None),
-            start = new_start,
-            end   = new_end,
-            place_type = getattr(winner_slot, "place_type", None),
-            location_info = getattr(winner_slot, "location_info", None),
-        )
-
-        # 두 칸을 하나로 치환
-        schedule.pop(j)
-        schedule.pop(i)
-        schedule.insert(i, merged)
-        applied += 1
-    _log(f"merges applied: {applied}")
-
-
-# ---------- 클라이언트 타임라인 오버레이 ----------
-
-def _overlay_client_timeline(tables: dict, client_days: Optional[List[ClientDay]]):
-    if not client_days:
-        return
-    by_date = {d.date: d for d in client_days}
-    applied_fill = applied_clear = 0
-    for date_str, info in tables.items():
-        day = by_date.get(date_str)
-        if not day:
-            continue
-        ev_by_time = {(ev.start, ev.end): ev for ev in (day.events or [])}
-        schedule = info.get("schedule", [])
-        for slot in schedule:
-            s = _time_to_hhmm(getattr(slot, "start", None))
-            e = _time_to_hhmm(getattr(slot, "end", None))
-            ev = ev_by_time.get((s, e))
-            if not ev:
-                continue
-            # 보호 슬롯은 건너뜀
-            if getattr(slot, "place_type", None) in ("start", "end", "accommodation"):
-                continue
-            if ev.title:
-                slot.title = ev.title
-                slot.place_type = ev.type or slot.place_type
-                if ev.lat is not None and ev.lng is not None:
-                    slot.location_info = {"name": ev.title, "lat": ev.lat, "lng": ev.lng}
-                applied_fill += 1
-            else:
-                # 프런트가 빈칸으로 표시한 슬롯은 명시적으로 비움
-                slot.title = None
-                slot.place_type = None
-                slot.location_info = None
-                applied_clear += 1
-    _log(f"overlay client timeline: filled={applied_fill}, cleared={applied_clear}")
-
-# ---------- 고정 슬롯 적용 (pins) ----------
-
-def _apply_fixed_slots(tables: dict, fixed_slots: Optional[List[FixedSlot]]):
-    if not fixed_slots:
-        return
-    applied = 0
-    for fs in fixed_slots:
-        info = tables.get(fs.date)
-        if not info:
-            continue
-        for slot in info.get("schedule", []):
-            s = _time_to_hhmm(getattr(slot, "start", None))
-            e = _time_to_hhmm(getattr(slot, "end", None))
-            if s == fs.start and e == fs.end:
-                if getattr(slot, "place_type", None) in ("start", "end", "accommodation"):
-                    break
-                p = fs.place
-                slot.title = p.name
-                slot.place_type = p.type or "etc"
-                if p.lat is not None and p.lng is not None:
-                    slot.location_info = {"name": p.name, "lat": p.lat, "lng": p.lng}
-                else:
-                    slot.location_info = {"name": p.name}
-                applied += 1
-                break
-    _log(f"fixed_slots applied: {applied}")
-
-# ---------- 분할 적용 ----------
-
-def _apply_splits(tables: dict, splits: Optional[List[SplitItem]]):
-    if not splits:
+    프런트 diff를 날짜별 패치로 모아 한 번에 적용 (services.slot_patch).
+    순서: 삭제 → 분할 → 병합 → 클라이언트 타임라인 오버레이 → 고정 슬롯
+    - 분할: 빈 슬롯만, 양쪽 최소 30분, 15분 단위로 반올림
+    - 병합: 첫 클릭(winner)의 내용 유지, 시간은 min(start)~max(end)
+    - 보호 슬롯(start/end/accommodation)은 건드리지 않음
+    """
+    patches = {}
+
+    def _day(date_str):
+        patch = patches.get(date_str)
+        if patch is None:
+            patch = patches[date_str] = DayPatch()
+        return patch
+
+    for d in deletions or ():
+        key = span_key(d.start, d.end)
+        if key:
+            _day(d.date).deletions.add(key)
+    for sp in splits or ():
+        key = span_key(sp.start, sp.end)
+        mid = minute_of(sp.mid) if sp.mid else None
+        if key and (mid is not None or not sp.mid):
+            _day(sp.date).splits.append((key, mid))
+    for m in merges or ():
+        wkey = span_key(m.winner.get("start"), m.winner.get("end"))
+        lkey = span_key(m.loser.get("start"), m.loser.get("end"))
+        if wkey and lkey:
+            _day(m.date).merges.append((wkey, lkey))
+    for day in client_timeline or ():
+        overlay = {}
+        for ev in day.events or ():
+            key = span_key(ev.start, ev.end)
+            if key:
+                overlay[key] = ev
+        if overlay:
+            _day(day.date).overlay = overlay
+    for fs in fixed_slots or ():
+        key = span_key(fs.start, fs.end)
+        if key:
+            _day(fs.date).fixed.append((key, fs.place))
+
+    if not patches:
         return
-    applied = 0
-
-    by_date = {}
-    for s in splits:
-        by_date.setdefault(s.date, []).append(s)
-
-    for date_str, info in tables.items():
-        reqs = by_date.get(date_str)
-        if not reqs:
-            continue
-        schedule = info.get("schedule", [])
-
-        for sp in reqs:
-            target_start, target_end = sp.start, sp.end
-
-            hit_idx = None
-            for i, slot in enumerate(schedule):
-                s = slot.start.strftime("%H:%M") if not isinstance(slot.start, str) else slot.start
-                e = slot.end.strftime("%H:%M")   if not isinstance(slot.end, str)   else slot.end
-                if s == target_start and e == target_end:
-                    hit_idx = i
-                    break
-            if hit_idx is None:
-                continue
-
-            slot = schedule[hit_idx]
-            if getattr(slot, "place_type", None) in ("start", "end", "accommodation"):
-                continue
-            if slot.title not in (None, ""):
-                # 이미 채워진 슬롯은 프런트에서 삭제 후 분할하도록 유도
-                continue
-
-            st = _parse_hhmm(target_start)
-            en = _parse_hhmm(target_end)
-            st_m, en_m = _to_minutes(st), _to_minutes(en)
-            if en_m - st_m < MIN_SLOT_MINUTES * 2:
-                continue
-
-            if sp.mid:
-                mid_m = _to_minutes(_parse_hhmm(sp.mid))
-            else:
-                mid_m = (st_m + en_m) // 2
-
-            mid_m = _round_to(mid_m, ROUND_TO_MINUTES)
-            left_min  = st_m + MIN_SLOT_MINUTES
-            right_min = en_m - MIN_SLOT_MINUTES
-            mid_m = max(left_min, min(right_min, mid_m))
-            if not (st_m < mid_m < en_m):
-                continue
-
-            def _new_empty_slot(start_m, end_m):
-                return type(slot)(
-                    title=None,
-                    start=_to_time(start_m),
-                    end=_to_time(end_m),
-                    place_type=None,
-                    location_info=None,
-                )
-
-            left  = _new_empty_slot(st_m, mid_m)
-            right = _new_empty_slot(mid_m, en_m)
-
-            schedule.pop(hit_idx)
-            schedule.insert(hit_idx, right)
-            schedule.insert(hit_idx, left)
-            applied += 1
-
-    _log(f"splits applied: {applied}")
+    counts = apply_patches(tables, patches)
+    _log("diff applied:", counts)
 
 # ---------- 프런트 client_tables → 내부 테이블 변환 ----------
 
@@ -423,8 +280,8 @@ def _client_event_to_item(ev: dict) -> "ScheduleItem":
     if not start_s or not end_s:
         raise ValueError("event start/end missing")
 
-    start_t = _parse_hhmm(start_s)
-    end_t   = _parse_hhmm(end_s)
+    start_t = parse_hhmm(start_s)
+    end_t   = parse_hhmm(end_s)
 
     title = ev.get("title")
     # Journey.toTables()는 'place_type'로 내려줌. 혹시 'type'만 있는 경우도 보정
@@ -465,7 +322,7 @@ def _tables_from_client_tables(client_tables: Dict[str, Any]) -> dict:
                 _log(f"skip bad event on {date}: {e}")
                 continue
         # 시작시간 기준 정렬
-        sched_items.sort(key=lambda it: (it.start.hour, it.start.minute))
+        sched_items.sort(key=lambda it: it.start_min)
         out[date] = {
             "weekday": info.get("weekday", ""),
             "start_location": info.get("start_location"),
@@ -491,49 +348,316 @@ def prepare_basic(req: PreparePayload):
         _log("ERROR(basic) phase:", phase, "error:", e); traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"[{phase}] {e}")
 
+def _build_request_tables(req: PreparePayload) -> dict:
+    """client_tables가 있으면 그대로, 없으면 베이스 테이블 생성 후 diff 반영"""
+    if req.client_tables:
+        # 프런트가 보낸 현재 화면 상태를 그대로 사용
+        _log("using client_tables as base")
+        return _tables_from_client_tables(req.client_tables)
+
+    # 기존 로직: 새로 베이스를 만들고 각종 diff를 반영
+    # (화면 전체 테이블이 아닌, 일부 diff만 온 경우에만 적용)
+    tables = _build_base_tables(req)
+    _apply_diff(tables, req.deletions, req.splits, req.merges, req.client_timeline, req.fixed_slots)
+    return tables
+
+def _owned_indices(tables: dict, owned) -> list:
+    return [(d, i) for d, info in tables.items() for i, s in enumerate(info["schedule"]) if s in owned]
+
+def _replay_cached(req: PreparePayload, entry) -> dict:
+    """결과 캐시 hit: 저장된 응답을 돌려주고, 재계획용 세션은 저장된 테이블 사본으로 새로 만든다"""
+    plan_ids = []
+    for base_mode, snapshot, owned_idx in entry.plans:
+        tables = copy_tables(snapshot)
+        ctx = load_planner_context(req.uid, req.title, tables, base_mode)
+        if ctx is None:
+            plan_ids.append(None)
+            continue
+        owned = {tables[d]["schedule"][i] for d, i in owned_idx}
+        plan_ids.append(save_session(ctx, tables, owned))
+
+    resp = dict(entry.resp, plan_id=plan_ids[0], cached=True)
+    if "alternatives" in resp:
+        resp["alternatives"] = [dict(a, plan_id=pid) for a, pid in zip(resp["alternatives"], plan_ids)]
+    return resp
+
 @router.post("/routes/prepare_dqn")
 def prepare_dqn(req: PreparePayload):
     phase = "start"
     try:
         _log("dqn payload:", req.model_dump())
-        used_client_tables = False
 
-        phase = "build"
-        if req.client_tables:
-            # 프런트가 보낸 현재 화면 상태를 그대로 사용
-            tables = _tables_from_client_tables(req.client_tables)
-            used_client_tables = True
-            _log("using client_tables as base")
-        else:
-            # 기존 로직: 새로 베이스를 만들고 각종 diff를 반영
-            tables = _build_base_tables(req)
+        # 같은 본문 + 같은 장소/가중치 버전이면 저장된 결과 재사용 (계측 요청은 항상 새로 실행)
+        # 버전이 다른 프로세스의 쓰기를 보려면 리스너가 필요 → planner_results.enabled()
+        cache_key = None
+        if req.trace is None and planner_results.enabled():
+            cache_key = planner_results.fingerprint(req.model_dump(exclude={"trace"}),
+                                                    *planner_cache.versions(req.uid, req.title))
+            hit = planner_results.get(cache_key)
+            if hit is not None:
+                _log("result cache hit")
+                return _replay_cached(req, hit)
 
-        if not used_client_tables:
-            # 화면 전체 테이블이 아닌, 일부 diff만 온 경우에만 적용
-            _clear_slots_by_deletions(tables, req.deletions)
-            _apply_splits(tables, req.splits)
-            _apply_merges(tables, req.merges)
-            _overlay_client_timeline(tables, req.client_timeline)
-            _apply_fixed_slots(tables, req.fixed_slots)
+        phase = "build"
+        tables = _build_request_tables(req)
 
         # 6) DQN
         phase = "dqn"
         base_mode = _focus_to_mode(req.focus_type)
-        tables = dqn_fill_schedule(req.uid, req.title, tables, base_mode=base_mode)
+        ctx = load_planner_context(req.uid, req.title, tables, base_mode)
+        empties = empty_slots(tables)
+        anytime = None
+        global_report = None
+        alts = None
+        stats = PlannerStats().attach(ctx) if (req.trace and ctx is not None) else None
+        if ctx is None:
+            _log("dqn skipped: no places for this trip")
+        elif req.global_assign:
+            budget = req.time_budget_ms if req.time_budget_ms is not None else 500
+            tables, global_report = dqn_fill_schedule_global(req.uid, req.title, tables, base_mode=base_mode,
+                                                             ctx=ctx, time_budget_ms=budget)
+        elif req.time_budget_ms is not None:
+            tables, anytime = dqn_fill_schedule_anytime(
+                req.uid, req.title, tables, base_mode=base_mode, time_budget_ms=req.time_budget_ms, ctx=ctx
+            )
+        elif req.alternatives > 1:
+            alts = dqn_fill_schedule_alternatives(req.uid, req.title, tables, base_mode=base_mode,
+                                                  k=req.alternatives, ctx=ctx, max_overlap=req.max_overlap,
+                                                  future_mode=req.future_mode)
+        elif req.parallel_days:
+            tables = dqn_fill_schedule_parallel(req.uid, req.title, tables, base_mode=base_mode, ctx=ctx,
+                                                future_mode=req.future_mode)
+        else:
+            tables = dqn_fill_schedule(req.uid, req.title, tables, base_mode=base_mode, ctx=ctx,
+                                       future_mode=req.future_mode)
+
+        trace_file = None
+        if stats is not None:
+            PlannerStats.detach(ctx)
+            if req.trace == "chrome":
+                trace_file = stats.write_chrome_trace(_trace_path(req.uid), name=f"prepare_dqn {req.title}")
+            _log("dqn stats:", stats.totals())
+
+        route_report = None
+        if ctx is not None and req.optimize_route:
+            phase = "route"
+            owned = {slot for slot in empties if slot.title is not None}
+            route_report = optimize_day_routes(ctx, tables, owned, time_budget_ms=req.route_time_budget_ms)
+            for alt in (alts or [])[1:]:
+                optimize_day_routes(ctx, alt["tables"], alt["owned"], time_budget_ms=req.route_time_budget_ms)
 
         # 병합 요청이 있었다면, DQN 이후에도 한 번 더 반영(선택):
-        _apply_merges(tables, req.merges)
+        _apply_diff(tables, merges=req.merges)
+        for alt in (alts or [])[1:]:
+            _apply_diff(alt["tables"], merges=req.merges)
+
+        # 재계획(/routes/replan_dqn)용으로 planner 상태 보관 (대안마다 독립 세션)
+        plan_id = None
+        plans = []
+        if ctx is not None:
+            owned = {slot for slot in empties if slot.title is not None}
+            plan_id = save_session(ctx, tables, owned)
+            plans.append((base_mode, copy_tables(tables), _owned_indices(tables, owned)))
+            for alt in (alts or [])[1:]:
+                alt["plan_id"] = save_session(fork_context(ctx), alt["tables"], alt["owned"])
+                plans.append((base_mode, copy_tables(alt["tables"]), _owned_indices(alt["tables"], alt["owned"])))
 
         # 7) 응답
         phase = "serialize"
         tables_json = _serialize_tables(tables)
         timeline = _to_timeline(tables_json)
         _log("dqn ok. timeline_days:", len(timeline))
-        return {"mode": "dqn", "base_mode": base_mode, "tables": tables_json, "timeline": timeline}
+        resp = {"mode": "dqn", "base_mode": base_mode, "plan_id": plan_id,
+                "tables": tables_json, "timeline": timeline}
+        if anytime is not None:
+            resp["anytime"] = anytime
+        if global_report is not None:
+            resp["global"] = global_report
+        if route_report is not None:
+            resp["route"] = route_report
+        if alts is not None:
+            # 클라이언트가 서버 재호출 없이 전환할 수 있도록 대안별 테이블/타임라인을 함께 보냄
+            resp["alternatives"] = []
+            for alt in alts:
+                alt_json = tables_json if alt["rank"] == 0 else _serialize_tables(alt["tables"])
+                resp["alternatives"].append({
+                    "rank": alt["rank"],
+                    "plan_id": plan_id if alt["rank"] == 0 else alt["plan_id"],
+                    "score": alt["score"],
+                    "overlap": alt["overlap"],
+                    "places": alt["places"],
+                    "tables": alt_json,
+                    "timeline": timeline if alt["rank"] == 0 else _to_timeline(alt_json),
+                })
+        if stats is not None:
+            resp["stats"] = stats.to_dict()
+        if trace_file is not None:
+            resp["trace_file"] = trace_file
+        if cache_key is not None and plans:
+            planner_results.put(cache_key, {k: v for k, v in resp.items() if k != "plan_id"}, plans)
+        return resp
     except Exception as e:
         _log("ERROR(dqn) phase:", phase, "error:", e); traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"[{phase}] {e}")
 
+# ---------- 여러 focus / trip 한 번에 ----------
+class BatchPreparePayload(BaseModel):
+    # 서로 다른 trip(또는 임의의 변형) 요청 목록
+    requests: List[PreparePayload] = Field(default_factory=list)
+    # 같은 trip을 여러 focus로 미리보기: base를 focus_type만 바꿔 펼친다
+    base: Optional[PreparePayload] = None
+    focus_types: List[str] = Field(default_factory=list)
+
+# 베이스 테이블 생성(Google API 엔드포인트 해석)에 영향을 주지 않는 필드
+_PLAN_ONLY_FIELDS = {"uid", "title", "focus_type", "time_budget_ms", "parallel_days", "future_mode",
+                     "global_assign", "optimize_route", "route_time_budget_ms", "alternatives", "max_overlap",
+                     "trace"}
+
+def _table_key(req: PreparePayload) -> str:
+    return json.dumps(req.model_dump(exclude=_PLAN_ONLY_FIELDS), sort_keys=True, ensure_ascii=False, default=str)
+
+@router.post("/routes/prepare_dqn_batch")
+def prepare_dqn_batch(req: BatchPreparePayload):
+    """
+    여러 base_mode / trip 변형을 한 요청으로 planning.
+      - 같은 입력의 베이스 테이블은 한 번만 만들고(시작/숙소/종료 위치 해석 공유) 변형마다 사본 사용
+      - 같은 trip의 장소/가중치는 planner_cache로, 앵커→장소 거리 캐시는 변형끼리 공유
+      - 변형들은 프로세스 풀에서 동시에 planning (변형별 옵션은 future_mode만 반영)
+    """
+    phase = "start"
+    try:
+        items = list(req.requests)
+        if req.base is not None:
+            items += [req.base.model_copy(update={"focus_type": f}) for f in (req.focus_types or [req.base.focus_type])]
+        if not items:
+            raise HTTPException(status_code=400, detail="requests 또는 base가 필요합니다.")
+        if len(items) > PLANNER_BATCH_MAX:
+            raise HTTPException(status_code=400, detail=f"한 번에 최대 {PLANNER_BATCH_MAX}개까지 가능합니다.")
+        _log(f"batch: {len(items)} variants")
+
+        phase = "build"
+        built = {}
+        variants = []
+        for item in items:
+            key = _table_key(item)
+            if key not in built:
+                built[key] = _build_request_tables(item)
+            variants.append(copy_tables(built[key]))
+        _log(f"batch: built {len(built)} base tables for {len(items)} variants")
+
+        phase = "dqn"
+        trip_dist = {}
+        jobs, ctxs, empties_list = [], [], []
+        for item, tables in zip(items, variants):
+            base_mode = _focus_to_mode(item.focus_type)
+            ctx = load_planner_context(item.uid, item.title, tables, base_mode)
+            ctxs.append(ctx)
+            empties_list.append([(d, i) for d, info in tables.items()
+                                 for i, s in enumerate(info["schedule"]) if s.title is None])
+            if ctx is None:
+                continue
+            trip = (item.uid, item.title)
+            if trip not in trip_dist:
+                trip_dist[trip] = warm_distance_cache(ctx, tables)
+            ctx.dist_cache = trip_dist[trip]
+            jobs.append((ctx, tables, item.future_mode))
+
+        planned = iter(plan_variants(jobs))
+        results = []
+        for item, ctx, tables, empties in zip(items, ctxs, variants, empties_list):
+            if ctx is not None:
+                tables = next(planned)
+            _apply_diff(tables, merges=item.merges)
+
+            plan_id = None
+            if ctx is not None:
+                owned = {tables[d]["schedule"][i] for d, i in empties if tables[d]["schedule"][i].title is not None}
+                plan_id = save_session(ctx, tables, owned)
+
+            tables_json = _serialize_tables(tables)
+            results.append({"uid": item.uid, "title": item.title, "focus_type": item.focus_type,
+                            "base_mode": _focus_to_mode(item.focus_type), "plan_id": plan_id,
+                            "tables": tables_json, "timeline": _to_timeline(tables_json)})
+
+        _log(f"batch ok. variants={len(results)}")
+        return {"mode": "dqn_batch", "results": results}
+    except HTTPException:
+        raise
+    except Exception as e:
+        _log("ERROR(batch) phase:", phase, "error:", e); traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"[{phase}] {e}")
+
+# ---------- 증분 재계획 ----------
+class ReplanPayload(BaseModel):
+    plan_id: str                        # /routes/prepare_dqn 응답의 plan_id
+    deletions: Optional[List[DeletionItem]] = None
+    splits: Optional[List[SplitItem]] = None
+    merges: Optional[List[MergeItem]] = None
+    fixed_slots: Optional[List[FixedSlot]] = None
+    radius: int = Field(default=1, ge=0)   # 바뀐 슬롯 앞뒤로 다시 고를 planner 슬롯 수
+
+def _changed_slot_indices(tables: dict, before: dict) -> dict:
+    """diff 적용 전 스냅샷(slot 객체 → title)과 비교해 새로 생기거나 내용이 바뀐 슬롯 인덱스"""
+    changed = {}
+    for date_str, info in tables.items():
+        prev = before.get(date_str, {})
+        idxs = {
+            i for i, slot in enumerate(info.get("schedule", []))
+            if slot not in prev or prev[slot] != slot.title
+        }
+        if idxs:
+            changed[date_str] = idxs
+    return changed
+
+@router.post("/routes/replan_dqn")
+def replan_dqn(req: ReplanPayload):
+    phase = "start"
+    try:
+        _log("replan payload:", req.model_dump())
+        session = get_session(req.plan_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="plan_id가 만료되었거나 없습니다. /routes/prepare_dqn을 다시 호출하세요.")
+
+        with session.lock:
+            tables = session.tables
+
+            phase = "diff"
+            before = {d: {slot: slot.title for slot in info.get("schedule", [])} for d, info in tables.items()}
+            _apply_diff(tables, req.deletions, req.splits, req.merges, fixed_slots=req.fixed_slots)
+            changed = _changed_slot_indices(tables, before)
+
+            # 고정(pin)된 슬롯은 더 이상 planner 소유가 아님
+            pinned = {}
+            for fs in (req.fixed_slots or []):
+                key = span_key(fs.start, fs.end)
+                if key:
+                    pinned.setdefault(fs.date, set()).add(key)
+            for date_str, keys in pinned.items():
+                for slot in tables.get(date_str, {}).get("schedule", []):
+                    if (slot.start_min, slot.end_min) in keys:
+                        session.owned.discard(slot)
+
+            phase = "dqn"
+            refilled = replan_changed_slots(session.ctx, tables, session.owned, changed, radius=req.radius)
+
+            phase = "serialize"
+            tables_json = _serialize_tables(tables)
+            timeline = _to_timeline(tables_json)
+
+        replanned = [
+            {"date": d, "start": tables_json[d]["schedule"][i]["start"], "end": tables_json[d]["schedule"][i]["end"],
+             "title": tables_json[d]["schedule"][i]["title"]}
+            for d, i in refilled
+        ]
+        _log(f"replan ok. changed_days={len(changed)} refilled={len(refilled)}")
+        return {"mode": "dqn", "base_mode": session.ctx.base_mode, "plan_id": session.plan_id,
+                "tables": tables_json, "timeline": timeline, "replanned": replanned}
+    except HTTPException:
+        raise
+    except Exception as e:
+        _log("ERROR(replan) phase:", phase, "error:", e); traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"[{phase}] {e}")
+
 # 호환용: 기존 /routes/prepare 는 DQN으로 연결
 @router.post("/routes/prepare")
 def prepare_compat(req: PreparePayload):
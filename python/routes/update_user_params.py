@@ -8,6 +8,7 @@ import numpy as np
 # Firebase Admin (어플리케이션 어딘가에서 이미 initialize_app 되었으면 생략)
 import firebase_admin
 from firebase_admin import firestore
+from services import planner_cache
 # from firebase_admin import credentials
 # cred = credentials.Certificate("service_account.json")
 # firebase_admin.initialize_app(cred)
@@ -247,6 +248,7 @@ def update_from_log(req: UpdateReq):
         },
         merge=True,
     )
+    planner_cache.invalidate_user(uid)
 
     return {
         "ok": True,
@@ -3,6 +3,7 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from core.firebase import db
 from services.User_Profile_init import init_user_profile
+from services import planner_cache
 
 router = APIRouter()
 
@@ -31,5 +32,6 @@ def init_user_params(req: InitReq):
         "user_id": uid,
         **weights,
     }, merge=True)
+    planner_cache.invalidate_user(uid)
 
     return {"ok": True, "weights": weights}
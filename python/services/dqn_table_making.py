@@ -1,10 +1,22 @@
+import os
 import re
 import time
+from functools import lru_cache
 from datetime import time as dtime, datetime
-from core.firebase import db
+from services import planner_cache, value_model
+from services.timeline import to_minutes, hhmm
+
+# ===== DEBUG 도우미 =====
+# PLANNER_DEBUG=1 이면 슬롯 확정 로그 출력 (요청당 수백 줄이라 기본은 끔)
+DEBUG = os.getenv("PLANNER_DEBUG", "0") == "1"
+def _dbg(*args):
+    if DEBUG:
+        print(*args, flush=True)
 
 # ---------- Firestore → 장소 로드 ----------
 def get_places_from_json(user_id, title, filename=None):
+    # Firestore는 실제 로드 시점에만 import (오프라인 학습/벤치에서 모듈만 쓰는 경우)
+    from core.firebase import db
     col = (
         db.collection("user_trips")
           .document(user_id)
@@ -32,11 +44,6 @@ def get_places_from_json(user_id, title, filename=None):
     return places
 
 # ---------- 유틸 ----------
-def time_diff_minutes(t1, t2):
-    dt1 = datetime.combine(datetime.today(), t1)
-    dt2 = datetime.combine(datetime.today(), t2)
-    return abs((dt1 - dt2).total_seconds() / 60)
-
 def get_constraints(base_mode="명소 중심"):
     constraints = {
         "must_visit_attraction_every_minutes": 240,
@@ -59,40 +66,115 @@ def get_constraints(base_mode="명소 중심"):
         constraints["attraction_required"] = False
     return constraints
 
-def get_elapsed_minutes_since_last_type(place_type, time_table, idx):
-    current_start = time_table[idx].start
-    for i in range(idx - 1, -1, -1):
-        if time_table[i].place_type == place_type:
-            last_end = time_table[i].end
-            return time_diff_minutes(last_end, current_start)
-    first_time = time_table[0].start
-    return time_diff_minutes(first_time, current_start)
+# ---------- 제약 상태 (증분 추적) ----------
+ALL_TYPES = ('tourist_attraction', 'cafe', 'restaurant', 'bakery', 'bar', 'shopping_mall')
+_CAFE_TYPES = ("cafe", "bakery")
+
+class ConstraintRules:
+    """get_constraints() 결과를 base_mode 별로 한 번만 컴파일해 둔 것 (허용 타입 튜플 미리 계산)"""
+    __slots__ = ("attraction_every", "meal_between", "dont_eat", "dept_interval",
+                 "attraction_required", "meal_required", "allow_multiple_cafes",
+                 "only_attraction", "only_restaurant", "only_shopping", "allowed_by_flags")
+
+    def __init__(self, base_mode):
+        c = get_constraints(base_mode)
+        self.attraction_required = c["attraction_required"]
+        self.attraction_every = c["must_visit_attraction_every_minutes"]
+        self.meal_required = c["require_meal_after_threshold"]
+        self.meal_between = c["min_minutes_between_meals"]
+        self.dont_eat = c["dont_eat_meal"]
+        self.dept_interval = c["department_store_required_interval"]
+        self.allow_multiple_cafes = c["allow_multiple_cafes"]
+
+        self.only_attraction = ('tourist_attraction',)
+        self.only_restaurant = ('restaurant',)
+        self.only_shopping = ('shopping_mall',)
+        # (식사 제외 여부, 카페 제외 여부) → 허용 타입
+        self.allowed_by_flags = {}
+        for no_meal in (False, True):
+            for no_cafe in (False, True):
+                types = [t for t in ALL_TYPES
+                         if not (no_meal and t == "restaurant") and not (no_cafe and t in _CAFE_TYPES)]
+                self.allowed_by_flags[(no_meal, no_cafe)] = tuple(types)
+
+_RULES_BY_MODE = {}
+
+def compile_constraints(base_mode="명소 중심"):
+    rules = _RULES_BY_MODE.get(base_mode)
+    if rules is None:
+        rules = _RULES_BY_MODE[base_mode] = ConstraintRules(base_mode)
+    return rules
+
+class ConstraintState:
+    """
+    하루 스케줄을 앞에서부터 채워 나가며 타입별 마지막 종료 시각(분)을 추적.
+    - push(slot): 커서 위치의 슬롯을 반영 (채워졌든 비었든)
+    - pop(): 마지막 push 되돌리기 (lookahead 백트래킹용)
+    - allowed_types(start_min): 커서 위치 슬롯의 허용 타입 (역방향 스캔 없이 O(1))
+    """
+    __slots__ = ("rules", "first_start", "last_end", "prev_type", "last_loc", "_undo")
+
+    def __init__(self, rules, first_start):
+        self.rules = rules
+        self.first_start = first_start
+        self.last_end = {}
+        self.prev_type = None
+        self.last_loc = None
+        self._undo = []
+
+    @classmethod
+    def for_schedule(cls, schedule, base_mode="명소 중심"):
+        first = schedule[0].start_min if schedule else 0
+        return cls(compile_constraints(base_mode), first)
+
+    def push(self, slot):
+        ptype = slot.place_type
+        self._undo.append((ptype, self.last_end.get(ptype), self.prev_type, self.last_loc))
+        if ptype is not None:
+            self.last_end[ptype] = slot.end_min
+        self.prev_type = ptype
+        if slot.location_info:
+            self.last_loc = slot.location_info
+
+    def pop(self):
+        ptype, old_end, self.prev_type, self.last_loc = self._undo.pop()
+        if ptype is not None:
+            if old_end is None:
+                del self.last_end[ptype]
+            else:
+                self.last_end[ptype] = old_end
 
-# ---------- 타입 선택 ----------
-def select_allowed_types(time_table, base_mode, idx):
-    allowed_types = ['tourist_attraction', 'cafe', 'restaurant', 'bakery', 'bar', 'shopping_mall']
-    constraints = get_constraints(base_mode)
+    def elapsed(self, place_type, start_min):
+        last = self.last_end.get(place_type)
+        return abs(start_min - (self.first_start if last is None else last))
 
-    if constraints["attraction_required"]:
-        if get_elapsed_minutes_since_last_type('tourist_attraction', time_table, idx) >= constraints["must_visit_attraction_every_minutes"]:
-            return ['tourist_attraction']
+    def allowed_types(self, start_min):
+        r = self.rules
+        if r.attraction_required:
+            if self.elapsed('tourist_attraction', start_min) >= r.attraction_every:
+                return r.only_attraction
 
-    if constraints["require_meal_after_threshold"]:
-        if get_elapsed_minutes_since_last_type('restaurant', time_table, idx) <= constraints["dont_eat_meal"]:
-            if "restaurant" in allowed_types:
-                allowed_types.remove("restaurant")
-        if get_elapsed_minutes_since_last_type('restaurant', time_table, idx) >= constraints["min_minutes_between_meals"]:
-            return ['restaurant']
+        no_meal = False
+        if r.meal_required:
+            since_meal = self.elapsed('restaurant', start_min)
+            if since_meal <= r.dont_eat:
+                no_meal = True
+            if since_meal >= r.meal_between:
+                return r.only_restaurant
 
-    if constraints["department_store_required_interval"] is not None:
-        if get_elapsed_minutes_since_last_type('shopping_mall', time_table, idx) >= constraints["department_store_required_interval"]:
-            return ['shopping_mall']
+        if r.dept_interval is not None:
+            if self.elapsed('shopping_mall', start_min) >= r.dept_interval:
+                return r.only_shopping
 
-    if not constraints["allow_multiple_cafes"] and idx > 0:
-        if time_table[idx-1].place_type in ("cafe", "bakery"):
-            allowed_types = [t for t in allowed_types if t not in ("cafe", "bakery")]
+        no_cafe = (not r.allow_multiple_cafes) and self.prev_type in _CAFE_TYPES
+        return r.allowed_by_flags[(no_meal, no_cafe)]
 
-    return allowed_types
+# ---------- 타입 선택 ----------
+def select_allowed_types(time_table, base_mode, idx):
+    state = ConstraintState.for_schedule(time_table, base_mode)
+    for slot in time_table[:idx]:
+        state.push(slot)
+    return list(state.allowed_types(time_table[idx].start_min))
 
 # ---------- 거리/시간 ----------
 def compute_distance(place1, place2):
@@ -118,32 +200,60 @@ def parse_korean_time(text: str):
     except:
         return None
 
-def is_place_open_during_slot(place, date_str, start_time, end_time):
+_WEEKDAY_KR = ("월요일", "화요일", "수요일", "목요일", "금요일", "토요일", "일요일")
+
+@lru_cache(maxsize=1024)
+def _weekday_of(date_str):
+    return datetime.strptime(date_str, "%Y-%m-%d").weekday()
+
+def _opening_minutes(place):
+    """
+    영업 정보를 분 단위로 한 번만 해석: True(항상 영업) / False(영업 안 함) /
+    요일별 (open, close) 구간 튜플 7개. 24시간은 (0, 1440), 자정 넘김은 23:59 마감으로 본다.
+    """
     if place.get("business_status") != "OPERATIONAL":
         return False
     weekday_text = place.get("weekday_text") or []
     if not weekday_text:
         return True
-    weekday = datetime.strptime(date_str, "%Y-%m-%d").weekday()
-    weekday_kr = ["월요일","화요일","수요일","목요일","금요일","토요일","일요일"]
-    target_day = weekday_kr[weekday]
-    for text in weekday_text:
-        line = str(text)
-        if not line.startswith(target_day):
-            continue
-        body = line.split(": ", 1)[-1].strip()
-        if "24시간" in body:
-            return True
-        parts = re.split(r"\s*~\s*", body)
-        if len(parts) != 2:
-            continue
-        open_time = parse_korean_time(parts[0])
-        close_time = parse_korean_time(parts[1])
-        if not open_time or not close_time:
-            continue
-        if close_time < open_time:
-            close_time = dtime(23, 59)
-        if open_time <= start_time and end_time <= close_time:
+    days = []
+    for target_day in _WEEKDAY_KR:
+        spans = []
+        for text in weekday_text:
+            line = str(text)
+            if not line.startswith(target_day):
+                continue
+            body = line.split(": ", 1)[-1].strip()
+            if "24시간" in body:
+                spans.append((0, 24 * 60))
+                continue
+            parts = re.split(r"\s*~\s*", body)
+            if len(parts) != 2:
+                continue
+            open_time = parse_korean_time(parts[0])
+            close_time = parse_korean_time(parts[1])
+            if not open_time or not close_time:
+                continue
+            if close_time < open_time:
+                close_time = dtime(23, 59)
+            spans.append((to_minutes(open_time), to_minutes(close_time)))
+        days.append(tuple(spans))
+    return tuple(days)
+
+def _precompute_opening_hours(all_places):
+    for p in all_places:
+        p["_hours"] = _opening_minutes(p)
+
+def is_place_open_during_slot(place, date_str, start_time, end_time):
+    """start/end: 분(int) 또는 datetime.time. 영업 정보는 place["_hours"]에 캐시"""
+    hours = place.get("_hours")
+    if hours is None:
+        hours = place["_hours"] = _opening_minutes(place)
+    if hours is True or hours is False:
+        return hours
+    start, end = to_minutes(start_time), to_minutes(end_time)
+    for open_min, close_min in hours[_weekday_of(date_str)]:
+        if open_min <= start and end <= close_min:
             return True
     return False
 
@@ -157,13 +267,14 @@ def get_valid_candidates(all_places, allowed_types, date_str, slot):
             continue
         if place.get('type') not in allowed_types:
             continue
-        if is_place_open_during_slot(place, date_str, slot.start, slot.end):
+        if is_place_open_during_slot(place, date_str, slot.start_min, slot.end_min):
             candidates.append(place)
     return candidates
 
 # ---------- 점수 ----------
 def get_user_params(user_id):
     try:
+        from core.firebase import db
         doc = db.collection("user_params").document(user_id).get()
         if doc.exists:
             return doc.to_dict()
@@ -220,7 +331,36 @@ def compute_total_score_fast(params, place, prev_location, dist_cache):
 
 # ==== 후보 캐시 키 ====
 def _candidates_key(date_str, slot, allowed_types):
-    return (date_str, slot.start, slot.end, tuple(sorted(allowed_types)))
+    # allowed_types는 ConstraintRules가 만든 고정 순서 튜플이므로 정렬 불필요
+    return (date_str, slot.start_min, slot.end_min, tuple(allowed_types))
+
+def _open_candidates(all_places, allowed_types, date_str, slot, cand_cache):
+    """슬롯 영업/타입 필터 결과는 캐시하고, 아직 사용되지 않은 장소만 돌려준다"""
+    key = _candidates_key(date_str, slot, allowed_types)
+    base_candidates = cand_cache.get(key)
+    if base_candidates is None:
+        base_candidates = get_valid_candidates(all_places, allowed_types, date_str, slot)
+        cand_cache[key] = base_candidates
+    return [p for p in base_candidates if not p.get("in_timetable")]
+
+def _rank_candidates(candidates, prev_loc, dist_cache, limit=5):
+    if prev_loc and prev_loc.get("lat") is not None and prev_loc.get("lng") is not None:
+        candidates.sort(key=lambda p: _distance_cached(prev_loc, p, dist_cache))
+    else:
+        candidates.sort(key=lambda p: -float(p.get("trust_score", 0.0)))
+    return candidates[:limit]
+
+def _assign(slot, place):
+    slot.title = place["name"]
+    slot.place_type = place["type"]
+    slot.location_info = {"name": place["name"], "lat": place["lat"], "lng": place["lng"]}
+    place["in_timetable"] = True
+
+def _unassign(slot, place):
+    slot.title = None
+    slot.place_type = None
+    slot.location_info = None
+    place["in_timetable"] = False
 
 # ==== 현재 테이블 기반 in_timetable 시딩 ====
 def _seed_in_timetable_from_tables(all_places, tables):
@@ -243,133 +383,544 @@ def _seed_in_timetable_from_tables(all_places, tables):
 
 # ---------- 미래 보상 (Depth=3, 후보 상한 5개) ----------
 def compute_future_reward(user_id, schedule, current_idx, all_places, date_str, ranges, depth, base_mode,
-                          params, dist_cache, cand_cache):
+                          params, dist_cache, cand_cache, state=None, stats=None):
+    """
+    state: current_idx 직전까지 push 된 ConstraintState (없으면 schedule에서 새로 구성)
+    stats: PlannerStats (있으면 노드 확장/평가 후보 수 집계)
+    """
     if depth == 0 or current_idx >= len(schedule):
         return 0.0
+    if stats is not None:
+        stats.count("nodes")
+
+    if state is None:
+        state = ConstraintState.for_schedule(schedule, base_mode)
+        for s in schedule[:current_idx]:
+            state.push(s)
 
     current_slot = schedule[current_idx]
+    prev_loc = state.last_loc
     if current_slot.title is not None:
         future_loc = current_slot.location_info
-        prev_loc = next((s.location_info for s in reversed(schedule[:current_idx]) if s.location_info), None)
         if prev_loc and future_loc:
             return compute_total_score_fast(params, future_loc, prev_loc, dist_cache)
         return 0.0
 
-    allowed_types = select_allowed_types(schedule, base_mode, current_idx)
-
-    key = _candidates_key(date_str, current_slot, allowed_types)
-    base_candidates = cand_cache.get(key)
-    if base_candidates is None:
-        base_candidates = get_valid_candidates(all_places, allowed_types, date_str, current_slot)
-        cand_cache[key] = base_candidates
-    candidates = [p for p in base_candidates if not p.get("in_timetable")]
-
+    allowed_types = state.allowed_types(current_slot.start_min)
+    candidates = _open_candidates(all_places, allowed_types, date_str, current_slot, cand_cache)
     if not candidates:
         return 0.0
 
-    prev_loc = next((s.location_info for s in reversed(schedule[:current_idx]) if s.location_info), None)
-
-    if prev_loc and prev_loc.get("lat") is not None and prev_loc.get("lng") is not None:
-        candidates.sort(key=lambda p: _distance_cached(prev_loc, p, dist_cache))
-    else:
-        candidates.sort(key=lambda p: -float(p.get("trust_score", 0.0)))
-
     # 🔧 후보 상한 = 5
-    top_candidates = candidates[:5]
+    top_candidates = _rank_candidates(candidates, prev_loc, dist_cache)
+    if stats is not None:
+        stats.count("evaluated", len(top_candidates))
 
     best_reward = -float("inf")
     for place in top_candidates:
-        current_slot.title = place["name"]
-        current_slot.place_type = place["type"]
-        current_slot.location_info = {"lat": place["lat"], "lng": place["lng"], "name": place["name"]}
-        place["in_timetable"] = True
+        _assign(current_slot, place)
+        state.push(current_slot)
 
         immediate = compute_total_score_fast(params, place, prev_loc, dist_cache)
         future = compute_future_reward(
             user_id, schedule, current_idx + 1, all_places, date_str, ranges, depth - 1, base_mode,
-            params, dist_cache, cand_cache
+            params, dist_cache, cand_cache, state, stats
         )
         total = immediate + future
         if total > best_reward:
             best_reward = total
 
-        current_slot.title = None
-        current_slot.place_type = None
-        current_slot.location_info = None
-        place["in_timetable"] = False
+        state.pop()
+        _unassign(current_slot, place)
 
     return best_reward if best_reward != -float("inf") else 0.0
 
 
-# ---------- 메인 ----------
-def dqn_fill_schedule(user_id, title, tables, base_mode="명소 중심"):
-    import time as _tmod
-    t0 = _tmod.time()
-
+# ---------- planner 입력/캐시 묶음 ----------
+class PlannerContext:
+    """한 trip에 대해 planning 동안 공유하는 장소/점수 범위/가중치와 후보·거리 캐시 (stats: 선택적 계측)"""
+    __slots__ = ("user_id", "title", "base_mode", "all_places", "ranges", "params",
+                 "by_name", "dist_cache", "cand_cache", "stats")
+
+    def __init__(self, user_id, title, base_mode, all_places, ranges, params):
+        self.user_id = user_id
+        self.title = title
+        self.base_mode = base_mode
+        self.all_places = all_places
+        self.ranges = ranges
+        self.params = params
+        self.by_name = {p["name"]: p for p in all_places if p.get("name")}
+        self.dist_cache = {}
+        self.cand_cache = {}
+        self.stats = None
+
+def _load_prepared_places(user_id, title):
+    """Firestore에서 장소/가중치를 읽고 정규화 점수까지 계산 (planner_cache 로더)"""
     all_places = get_places_from_json(user_id, title)
     if not all_places:
-        print("[DQN] 장소 데이터 없음")
-        return tables
-
-    # ✅ 현재 테이블에 이미 들어간 장소들은 미리 사용 처리
-    _seed_in_timetable_from_tables(all_places, tables)
-
+        return all_places, None, None
     ranges = get_score_ranges(all_places)
     _precompute_norm_scores(all_places, ranges)
-    params = get_user_params(user_id)
-    dist_cache = {}
-    cand_cache = {}
+    _precompute_opening_hours(all_places)
+    return all_places, ranges, get_user_params(user_id)
 
-    for date_str, info in tables.items():
-        schedule = info["schedule"]
-        for idx, slot in enumerate(schedule):
-            if slot.title is not None:
-                continue
+def load_planner_context(user_id, title, tables, base_mode="명소 중심", use_cache=True):
+    """(uid, title) 캐시된 입력으로 PlannerContext 구성 (장소가 없으면 None)"""
+    if use_cache:
+        all_places, ranges, params = planner_cache.get_or_load(user_id, title, _load_prepared_places)
+    else:
+        all_places, ranges, params = _load_prepared_places(user_id, title)
+    if not all_places:
+        return None
+    return make_planner_context(user_id, title, tables, all_places, params, base_mode, ranges)
 
-            allowed_types = select_allowed_types(schedule, base_mode, idx)
-            if not allowed_types:
-                continue
+def make_planner_context(user_id, title, tables, all_places, params, base_mode="명소 중심", ranges=None):
+    """메모리에 있는 장소로 PlannerContext 구성 (ranges가 없으면 정규화 점수부터 계산)"""
+    if ranges is None:
+        ranges = get_score_ranges(all_places)
+        _precompute_norm_scores(all_places, ranges)
+        _precompute_opening_hours(all_places)
 
-            key = _candidates_key(date_str, slot, allowed_types)
-            base_candidates = cand_cache.get(key)
-            if base_candidates is None:
-                base_candidates = get_valid_candidates(all_places, allowed_types, date_str, slot)
-                cand_cache[key] = base_candidates
-            candidates = [p for p in base_candidates if not p.get("in_timetable")]
-            if not candidates:
-                continue
+    # ✅ 현재 테이블에 이미 들어간 장소들은 미리 사용 처리
+    _seed_in_timetable_from_tables(all_places, tables)
+    return PlannerContext(user_id, title, base_mode, all_places, ranges, params)
 
-            prev_loc = next((s.location_info for s in reversed(schedule[:idx]) if s.location_info), None)
+def _reseed_in_timetable(ctx, tables):
+    """테이블이 바뀐 뒤 in_timetable 플래그를 테이블 기준으로 다시 맞춤"""
+    for p in ctx.all_places:
+        p["in_timetable"] = False
+    _seed_in_timetable_from_tables(ctx.all_places, tables)
 
-            if prev_loc and prev_loc.get("lat") is not None and prev_loc.get("lng") is not None:
-                candidates.sort(key=lambda p: _distance_cached(prev_loc, p, dist_cache))
-            else:
-                candidates.sort(key=lambda p: -float(p.get("trust_score", 0.0)))
 
-            # 현재 슬롯 후보 상한 = 5
-            top_candidates = candidates[:5]
+# ---------- 하루 채우기 ----------
+FUTURE_MODES = ("lookahead", "learned")
+
+def _learned_futures(ctx, schedule, idx, slot, state, top_candidates, model, depth):
+    """후보마다 slot에 둔 상태의 특징을 모아 가치 모델로 한 번에 미래 보상 추정"""
+    nxt = idx + 1
+    remaining = sum(1 for s in schedule[nxt:nxt + depth] if s.title is None)
+    next_start = schedule[nxt].start_min if nxt < len(schedule) else 24 * 60
+    rows = []
+    for place in top_candidates:
+        slot.place_type = place["type"]
+        slot.location_info = place
+        state.push(slot)
+        rows.append(value_model.state_features(state, next_start, remaining, place, ctx.params,
+                                               ctx.base_mode, depth))
+        state.pop()
+    slot.place_type = None
+    slot.location_info = None
+    return model.predict(rows)
+
+def _fill_day(ctx, date_str, schedule, depth=3, only=None, future_mode="lookahead", penalty=None):
+    """
+    빈 슬롯을 앞에서부터 채운다. depth=0 이면 lookahead 없는 greedy.
+    only: 채울 슬롯 인덱스 집합 (None이면 모든 빈 슬롯)
+    future_mode: "lookahead"(depth 탐색) | "learned"(value_model 추정, 모델 없으면 lookahead)
+    penalty: {장소 이름: 감점} (대안 일정용, 감점 없는 장소를 먼저 후보로 올림)
+    """
+    model = value_model.get_value_model() if future_mode == "learned" and depth > 0 else None
+    if future_mode == "learned" and depth > 0 and model is None:
+        print("[DQN] value model not found -> lookahead")
+
+    stats = ctx.stats
+    state = ConstraintState.for_schedule(schedule, ctx.base_mode)
+    for idx, slot in enumerate(schedule):
+        if slot.title is not None or (only is not None and idx not in only):
+            state.push(slot)
+            continue
+
+        if stats is not None:
+            stats.begin_slot(date_str, idx, slot)
+        allowed_types = state.allowed_types(slot.start_min)
+        candidates = _open_candidates(ctx.all_places, allowed_types, date_str, slot, ctx.cand_cache)
+        if not candidates:
+            if stats is not None:
+                stats.end_slot()
+            state.push(slot)
+            continue
 
-            best_score, best_place = -float("inf"), None
+        prev_loc = state.last_loc
+        # 현재 슬롯 후보 상한 = 5
+        if penalty:
+            fresh = [p for p in candidates if p["name"] not in penalty]
+            top_candidates = _rank_candidates(fresh, prev_loc, ctx.dist_cache)
+            if len(top_candidates) < 5:
+                used = [p for p in candidates if p["name"] in penalty]
+                top_candidates += _rank_candidates(used, prev_loc, ctx.dist_cache, 5 - len(top_candidates))
+        else:
+            top_candidates = _rank_candidates(candidates, prev_loc, ctx.dist_cache)
+        if stats is not None:
+            stats.count("candidates", len(candidates))
+            stats.count("evaluated", len(top_candidates))
+
+        best_score, best_place = -float("inf"), None
+        if model is not None:
+            futures = _learned_futures(ctx, schedule, idx, slot, state, top_candidates, model, depth)
+            for place, future in zip(top_candidates, futures):
+                total = compute_total_score_fast(ctx.params, place, prev_loc, ctx.dist_cache) + float(future)
+                if penalty:
+                    total -= penalty.get(place["name"], 0.0)
+                if total > best_score:
+                    best_score, best_place = total, place
+        else:
+            # lookahead는 현재 슬롯을 비운 상태로 다음 칸부터 본다 (기존 동작 유지)
+            state.push(slot)
             for place in top_candidates:
-                immediate = compute_total_score_fast(params, place, prev_loc, dist_cache)
+                immediate = compute_total_score_fast(ctx.params, place, prev_loc, ctx.dist_cache)
                 future = compute_future_reward(
-                    user_id, schedule, idx + 1, all_places, date_str, ranges, depth=3, base_mode=base_mode,
-                    params=params, dist_cache=dist_cache, cand_cache=cand_cache
+                    ctx.user_id, schedule, idx + 1, ctx.all_places, date_str, ctx.ranges, depth=depth,
+                    base_mode=ctx.base_mode, params=ctx.params, dist_cache=ctx.dist_cache,
+                    cand_cache=ctx.cand_cache, state=state, stats=stats
                 )
                 total = immediate + future
+                if penalty:
+                    total -= penalty.get(place["name"], 0.0)
                 if total > best_score:
                     best_score, best_place = total, place
+            state.pop()
+
+        if best_place:
+            _assign(slot, best_place)
+            _dbg(f"[확정] {date_str} {hhmm(slot.start_min)}-{hhmm(slot.end_min)} → {best_place['name']} ({best_place['type']})")
+        if stats is not None:
+            stats.end_slot(best_place["name"] if best_place else None)
+        state.push(slot)
+
+
+def empty_slots(tables):
+    """아직 비어 있는 슬롯 객체 집합 (planner가 채운 슬롯 추적용)"""
+    return {slot for info in tables.values() for slot in info["schedule"] if slot.title is None}
 
-            if best_place:
-                slot.title = best_place["name"]
-                slot.place_type = best_place["type"]
-                slot.location_info = {"name": best_place["name"], "lat": best_place["lat"], "lng": best_place["lng"]}
-                best_place["in_timetable"] = True
-                print(f"[확정] {date_str} {slot.start}-{slot.end} → {best_place['name']} ({best_place['type']})")
+
+# ---------- 메인 ----------
+def dqn_fill_schedule(user_id, title, tables, base_mode="명소 중심", ctx=None, future_mode="lookahead"):
+    import time as _tmod
+    t0 = _tmod.time()
+
+    if ctx is None:
+        ctx = load_planner_context(user_id, title, tables, base_mode)
+    if ctx is None:
+        print("[DQN] 장소 데이터 없음")
+        return tables
+
+    for date_str, info in tables.items():
+        _fill_day(ctx, date_str, info["schedule"], depth=3, future_mode=future_mode)
 
     print(f"[DQN 완료] 총 소요 시간: {_tmod.time() - t0:.2f}초")
     return tables
 
+
+# ---------- 대안 일정 (Top-K) ----------
+def copy_tables(tables):
+    """슬롯 객체까지 새로 만든 tables 사본 (location_info dict는 공유)"""
+    out = {}
+    for date_str, info in tables.items():
+        day = dict(info)
+        day["schedule"] = [
+            type(s)(s.title, s.start_min, s.end_min, s.place_type, s.location_info) for s in info["schedule"]
+        ]
+        out[date_str] = day
+    return out
+
+def fork_context(ctx):
+    """
+    같은 입력으로 독립된 PlannerContext 생성 (대안 일정별 세션용).
+    장소 dict는 in_timetable 플래그 때문에 복사하고, 후보 캐시는 그 dict를 담으므로 새로 시작.
+    거리 캐시는 좌표 키라 공유한다.
+    """
+    forked = PlannerContext(ctx.user_id, ctx.title, ctx.base_mode,
+                            [dict(p) for p in ctx.all_places], ctx.ranges, ctx.params)
+    forked.dist_cache = ctx.dist_cache
+    return forked
+
+def _jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+def dqn_fill_schedule_alternatives(user_id, title, tables, base_mode="명소 중심", k=3, ctx=None,
+                                   max_overlap=0.5, diversity=1.0, future_mode="lookahead", depth=3):
+    """
+    한 ctx(후보/거리 캐시)를 공유하며 서로 다른 일정 최대 k개를 만든다.
+      - 0번은 기존 dqn_fill_schedule 결과 (tables 자체를 채움)
+      - 이후 대안은 앞선 대안들이 쓴 장소마다 diversity × (사용 횟수)만큼 감점
+      - planner가 고른 장소 집합이 앞선 대안과 max_overlap(Jaccard)보다 많이 겹치면 버리고 감점을 키워 재시도
+    반환: [{"rank", "tables", "owned", "places", "score", "overlap"}] (ctx는 0번 일정 기준으로 되돌려 둠)
+    """
+    if ctx is None:
+        ctx = load_planner_context(user_id, title, tables, base_mode)
+    if ctx is None:
+        print("[DQN] 장소 데이터 없음")
+        return [{"rank": 0, "tables": tables, "owned": set(), "places": [], "score": 0.0, "overlap": 0.0}]
+
+    base = copy_tables(tables)
+    movable = {d: [i for i, s in enumerate(info["schedule"]) if s.title is None] for d, info in base.items()}
+
+    def _plan(target, penalty):
+        _reseed_in_timetable(ctx, target)
+        for date_str, info in target.items():
+            _fill_day(ctx, date_str, info["schedule"], depth=depth, future_mode=future_mode, penalty=penalty)
+        owned = {target[d]["schedule"][i] for d, idxs in movable.items() for i in idxs
+                 if target[d]["schedule"][i].title is not None}
+        score = sum(schedule_score(info["schedule"], ctx.by_name, ctx.params, ctx.dist_cache)
+                    for info in target.values())
+        return owned, score
+
+    results = []
+    use_count = {}
+    rejected = 0
+    max_attempts = 2 * k
+    attempt = 0
+    while len(results) < k and attempt < max_attempts:
+        target = tables if attempt == 0 else copy_tables(base)
+        weight = diversity * (1 + rejected)
+        penalty = {name: weight * n for name, n in use_count.items()}
+        owned, score = _plan(target, penalty)
+        attempt += 1
+
+        names = {s.title for s in owned}
+        overlap = max((_jaccard(names, set(r["places"])) for r in results), default=0.0)
+        if results and overlap > max_overlap:
+            rejected += 1
+            continue
+        for name in names:
+            use_count[name] = use_count.get(name, 0) + 1
+        results.append({"rank": len(results), "tables": target, "owned": owned, "places": sorted(names),
+                        "score": round(score, 4), "overlap": round(overlap, 3)})
+
+    _reseed_in_timetable(ctx, tables)
+    print(f"[DQN alternatives] k={k} made={len(results)} attempts={attempt} "
+          f"scores={[r['score'] for r in results]}")
+    return results
+
+
+# ---------- 증분 재계획 ----------
+def replan_changed_slots(ctx, tables, owned, changed, radius=1, depth=3):
+    """
+    diff가 반영된 tables에서 바뀐 슬롯 주변만 다시 채운다.
+      - changed: {date: {slot index, ...}} (diff로 새로 생기거나 내용이 바뀐 슬롯)
+      - owned: planner가 채운 슬롯 객체 집합 (사용자/고정 슬롯은 건드리지 않음)
+      - radius: 바뀐 슬롯 앞뒤로 함께 다시 고를 planner 슬롯 범위
+    ctx의 후보/거리 캐시는 그대로 재사용한다. 반환: 다시 채운 (date, index) 목록
+    """
+    # 1) 다시 고를 슬롯을 모든 날짜에서 먼저 비운다
+    day_targets = {}
+    for date_str, idxs in changed.items():
+        info = tables.get(date_str)
+        if not info or not idxs:
+            continue
+        schedule = info["schedule"]
+
+        targets = set()
+        for i in idxs:
+            for j in range(i - radius, i + radius + 1):
+                if 0 <= j < len(schedule):
+                    slot = schedule[j]
+                    if slot.title is None or slot in owned:
+                        targets.add(j)
+        for j in targets:
+            slot = schedule[j]
+            slot.title = None
+            slot.place_type = None
+            slot.location_info = None
+        day_targets[date_str] = targets
+
+    # 2) 사용 집합을 비운 뒤의 테이블 기준으로 다시 맞춤
+    #    (같은 장소가 고정/사용자 슬롯이나 다른 날에 남아 있으면 계속 사용 중으로 본다)
+    _reseed_in_timetable(ctx, tables)
+
+    # 3) 날짜별로 채움 (앞 날짜에서 고른 장소는 in_timetable 로 뒤 날짜에 반영)
+    refilled = []
+    for date_str, targets in day_targets.items():
+        schedule = tables[date_str]["schedule"]
+        _fill_day(ctx, date_str, schedule, depth=depth, only=targets)
+
+        for j in sorted(targets):
+            slot = schedule[j]
+            if slot.title is not None:
+                owned.add(slot)
+            else:
+                owned.discard(slot)
+            refilled.append((date_str, j))
+    return refilled
+
+
+# ---------- Anytime 모드 (시간 예산 내 개선) ----------
+def _has_coords(loc):
+    return bool(loc) and loc.get("lat") is not None and loc.get("lng") is not None
+
+def _slot_place(slot, by_name):
+    """슬롯에 들어간 장소의 점수용 dict (후보 목록에 없으면 location_info 그대로)"""
+    place = by_name.get(slot.title)
+    if place is not None:
+        return place
+    return slot.location_info if _has_coords(slot.location_info) else None
+
+def schedule_score(schedule, by_name, params, dist_cache):
+    """하루 전체 점수: 좌표 있는 연속 슬롯 쌍마다 compute_total_score_fast 합"""
+    total = 0.0
+    prev = None
+    for slot in schedule:
+        place = _slot_place(slot, by_name)
+        if place is None:
+            continue
+        if prev is not None:
+            total += compute_total_score_fast(params, place, prev, dist_cache)
+        prev = place
+    return total
+
+def _local_gain_terms(ctx, schedule, idx, place):
+    """idx 슬롯에 place를 둘 때 바뀌는 점수 항: (이전→place) + (place→다음)"""
+    by_name = ctx.by_name
+    prev = next((q for q in (_slot_place(s, by_name) for s in reversed(schedule[:idx])) if q is not None), None)
+    nxt = next((q for q in (_slot_place(s, by_name) for s in schedule[idx + 1:]) if q is not None), None)
+    score = compute_total_score_fast(ctx.params, place, prev, ctx.dist_cache) if prev is not None else 0.0
+    if nxt is not None:
+        score += compute_total_score_fast(ctx.params, nxt, place, ctx.dist_cache)
+    return score
+
+def _day_respects_rules(schedule, base_mode, movable, start_idx):
+    """start_idx 이후 planner가 채운 슬롯들이 여전히 허용 타입인지 확인"""
+    state = ConstraintState.for_schedule(schedule, base_mode)
+    for idx, slot in enumerate(schedule):
+        if idx > start_idx and idx in movable and slot.place_type is not None:
+            if slot.place_type not in state.allowed_types(slot.start_min):
+                return False
+        state.push(slot)
+    return True
+
+def _improve_slot(ctx, date_str, schedule, idx, movable):
+    """idx 슬롯을 다른 미사용 장소로 바꿔서 하루 점수가 오르면 교체. 반환: (이전 이름, 새 이름, 이득) 또는 None"""
+    slot = schedule[idx]
+    current = ctx.by_name.get(slot.title)
+    if current is None:
+        return None
+
+    stats = ctx.stats
+    if stats is not None:
+        stats.begin_slot(date_str, idx, slot, phase="improve")
+    res = _improve_slot_inner(ctx, date_str, schedule, idx, movable, slot, current)
+    if stats is not None:
+        stats.end_slot(res[1] if res else None)
+    return res
+
+def _improve_slot_inner(ctx, date_str, schedule, idx, movable, slot, current):
+    state = ConstraintState.for_schedule(schedule, ctx.base_mode)
+    for s in schedule[:idx]:
+        state.push(s)
+    allowed_types = state.allowed_types(slot.start_min)
+    candidates = _open_candidates(ctx.all_places, allowed_types, date_str, slot, ctx.cand_cache)
+    if not candidates:
+        return None
+    if ctx.stats is not None:
+        ctx.stats.count("candidates", len(candidates))
+        ctx.stats.count("evaluated", len(candidates))
+
+    base = _local_gain_terms(ctx, schedule, idx, current)
+    best_gain, best_place = 1e-9, None
+    for place in candidates:
+        gain = _local_gain_terms(ctx, schedule, idx, place) - base
+        if gain <= best_gain:
+            continue
+        if place["type"] != current["type"]:
+            # 타입이 바뀌면 뒤쪽 슬롯의 제약이 깨지지 않는지 확인
+            _unassign(slot, current)
+            _assign(slot, place)
+            ok = _day_respects_rules(schedule, ctx.base_mode, movable, idx)
+            _unassign(slot, place)
+            _assign(slot, current)
+            if not ok:
+                continue
+        best_gain, best_place = gain, place
+
+    if best_place is None:
+        return None
+    _unassign(slot, current)
+    _assign(slot, best_place)
+    return current["name"], best_place["name"], best_gain
+
+def dqn_fill_schedule_anytime(user_id, title, tables, base_mode="명소 중심", time_budget_ms=1000, ctx=None):
+    """
+    시간 예산이 있는 planner.
+      1) lookahead 없는 greedy로 즉시 실행 가능한 일정 확보
+      2) 마감 시각까지 planner가 채운 슬롯을 하나씩 더 나은 장소로 교체 (국소 탐색)
+    항상 지금까지 찾은 최선의 일정과 탐색 진행 리포트를 돌려준다.
+    """
+    t0 = time.perf_counter()
+    deadline = t0 + max(0, time_budget_ms) / 1000.0
+    report = {
+        "budget_ms": time_budget_ms,
+        "elapsed_ms": 0.0,
+        "passes": 0,
+        "slots_examined": 0,
+        "converged": False,
+        "greedy_score": 0.0,
+        "final_score": 0.0,
+        "improved_slots": [],
+    }
+
+    if ctx is None:
+        ctx = load_planner_context(user_id, title, tables, base_mode)
+    if ctx is None:
+        print("[DQN] 장소 데이터 없음")
+        return tables, report
+
+    # 1) greedy: 비어 있던 슬롯 위치를 기억해 두고 depth=0으로 채움
+    movable_by_date = {}
+    for date_str, info in tables.items():
+        schedule = info["schedule"]
+        movable_by_date[date_str] = {i for i, s in enumerate(schedule) if s.title is None}
+        _fill_day(ctx, date_str, schedule, depth=0)
+
+    def _total():
+        return sum(schedule_score(info["schedule"], ctx.by_name, ctx.params, ctx.dist_cache)
+                   for info in tables.values())
+
+    report["greedy_score"] = _total()
+
+    # 2) 국소 개선: 한 패스 동안 개선이 없으면 수렴
+    improved = {}
+    timed_out = False
+    while not timed_out:
+        changed = False
+        report["passes"] += 1
+        for date_str, info in tables.items():
+            schedule = info["schedule"]
+            movable = movable_by_date[date_str]
+            for idx in sorted(movable):
+                if time.perf_counter() >= deadline:
+                    timed_out = True
+                    break
+                report["slots_examined"] += 1
+                res = _improve_slot(ctx, date_str, schedule, idx, movable)
+                if res is None:
+                    continue
+                old_name, new_name, gain = res
+                changed = True
+                slot = schedule[idx]
+                entry = improved.setdefault((date_str, idx), {
+                    "date": date_str,
+                    "start": hhmm(slot.start_min),
+                    "end": hhmm(slot.end_min),
+                    "from": old_name,
+                    "gain": 0.0,
+                })
+                entry["to"] = new_name
+                entry["gain"] += gain
+            if timed_out:
+                break
+        if not changed and not timed_out:
+            report["converged"] = True
+            break
+
+    report["final_score"] = _total()
+    report["improved_slots"] = list(improved.values())
+    report["elapsed_ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+    print(f"[DQN anytime] passes={report['passes']} improved={len(improved)} "
+          f"score {report['greedy_score']:.3f} → {report['final_score']:.3f} ({report['elapsed_ms']}ms)")
+    return tables, report
+
 def clear_deleted_slots(tables, deletions):
     for d in deletions:
         date = d["date"]
@@ -378,9 +929,7 @@ def clear_deleted_slots(tables, deletions):
         if date not in tables:
             continue
         for slot in tables[date]["schedule"]:
-            s = slot.start.strftime("%H:%M") if not isinstance(slot.start, str) else slot.start
-            e = slot.end.strftime("%H:%M") if not isinstance(slot.end, str) else slot.end
-            if s == start and e == end:
+            if hhmm(slot.start_min) == start and hhmm(slot.end_min) == end:
                 if slot.place_type not in ["start", "end", "accommodation"]:
                     slot.title = None
                     slot.place_type = None
@@ -0,0 +1,258 @@
+# services/global_planner.py
+"""
+모든 날짜의 빈 슬롯을 한꺼번에 배정하는 planner.
+슬롯별 greedy / dqn 은 1일차부터 가까운 좋은 장소를 가져가서 뒤 날짜는 남은 장소로 채워진다.
+  1) 타입 패턴: lookahead 없는 greedy로 제약(식사 간격 등)을 만족하는 슬롯별 타입을 정함
+  2) 타입별 배정: 그 타입 슬롯 전체(모든 날짜) × 장소 점수 행렬에 linear_sum_assignment
+     점수 = 장소 고정 항 + 거리 항 (앞/뒤 이웃은 greedy 결과로 근사)
+  3) 국소 탐색: 교체(미사용 장소, 타입이 바뀌면 제약 재확인) / 같은 타입 두 슬롯 교환(날짜 무관)을
+     실제 점수 변화로 평가
+"""
+import time
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from services.dqn_table_making import (
+    _assign,
+    _fill_day,
+    _improve_slot,
+    _local_gain_terms,
+    _reseed_in_timetable,
+    _slot_place,
+    _unassign,
+    compute_total_score_fast,
+    get_valid_candidates,
+    is_place_open_during_slot,
+    load_planner_context,
+    schedule_score,
+)
+
+_INVALID = -1e9
+
+
+def _neighbors(ctx, schedule, idx):
+    by_name = ctx.by_name
+    prev = next((q for q in (_slot_place(s, by_name) for s in reversed(schedule[:idx])) if q is not None), None)
+    nxt = next((q for q in (_slot_place(s, by_name) for s in schedule[idx + 1:]) if q is not None), None)
+    return prev, nxt
+
+
+def _edge_score(params, p, prev, nxt, dist_cache):
+    """p를 prev/nxt 사이에 넣었을 때의 점수 (배정 행렬 항목)"""
+    s = compute_total_score_fast(params, p, prev, dist_cache) if prev is not None else 0.0
+    if nxt is not None:
+        s += compute_total_score_fast(params, nxt, p, dist_cache)
+    return s
+
+
+def _assign_by_type(ctx, tables, keys):
+    """
+    greedy가 채운 슬롯(keys)을 비운 뒤 타입별로 전체 날짜에 걸쳐 최대 점수 배정.
+    배정 결과가 유효 후보가 아닌 행(또는 열보다 행이 많아 빠진 행)은 greedy 장소를 되돌려 두고,
+    그 장소를 다른 슬롯이 가져갔으면 남은 후보 중 점수가 가장 높은 것으로 채운다 (슬롯을 비우지 않음).
+    반환: {(date, idx): 그 슬롯 타입의 영업 중인 미사용 후보 목록} (국소 탐색에서 재사용)
+    """
+    params, dist_cache = ctx.params, ctx.dist_cache
+    slot_type, context, greedy = {}, {}, {}
+    for d, i in keys:
+        schedule = tables[d]["schedule"]
+        slot_type[(d, i)] = schedule[i].place_type
+        context[(d, i)] = _neighbors(ctx, schedule, i)
+        greedy[(d, i)] = ctx.by_name.get(schedule[i].title)
+    for d, i in keys:
+        slot = tables[d]["schedule"][i]
+        _unassign(slot, ctx.by_name.get(slot.title) or {})
+
+    by_type = {}
+    for key in keys:
+        by_type.setdefault(slot_type[key], []).append(key)
+
+    pools, left = {}, []
+    for ptype, type_keys in by_type.items():
+        cols = {}
+        for d, i in type_keys:
+            pools[(d, i)] = get_valid_candidates(ctx.all_places, (ptype,), d, tables[d]["schedule"][i])
+            for p in pools[(d, i)]:
+                cols.setdefault(p["name"], p)
+        names = list(cols)
+        if not names:
+            left.extend(type_keys)
+            continue
+        col_idx = {n: j for j, n in enumerate(names)}
+
+        score = np.full((len(type_keys), len(names)), _INVALID)
+        for r, key in enumerate(type_keys):
+            prev, nxt = context[key]
+            for p in pools[key]:
+                score[r, col_idx[p["name"]]] = _edge_score(params, p, prev, nxt, dist_cache)
+
+        rows, cols_ = linear_sum_assignment(score, maximize=True)
+        done = set()
+        for r, c in zip(rows, cols_):
+            if score[r, c] <= _INVALID / 2:
+                continue
+            d, i = type_keys[r]
+            _assign(tables[d]["schedule"][i], cols[names[c]])
+            done.add(r)
+        left.extend(key for r, key in enumerate(type_keys) if r not in done)
+
+    # 배정되지 못한 슬롯: greedy 장소 → 남은 후보 중 최고 점수 순으로 채움
+    for key in left:
+        d, i = key
+        slot = tables[d]["schedule"][i]
+        place = greedy[key]
+        if place is None or place.get("in_timetable"):
+            prev, nxt = context[key]
+            free = [p for p in pools.get(key, []) if not p.get("in_timetable")]
+            place = max(free, key=lambda p: _edge_score(params, p, prev, nxt, dist_cache), default=None)
+        if place is not None:
+            _assign(slot, place)
+    return pools
+
+
+def _type_pool(ctx, ptype, date_str, slot, fixed_names):
+    """slot에서 영업 중인 ptype 장소 (사용 여부 무관, 고정 슬롯 장소 제외) — 교환 가능 여부 판단용"""
+    return [
+        p for p in ctx.all_places
+        if p.get("type") == ptype and p.get("name") not in fixed_names
+        and "호텔" not in (p.get("name") or "")
+        and is_place_open_during_slot(p, date_str, slot.start_min, slot.end_min)
+    ]
+
+
+def _day_score(ctx, schedule):
+    return schedule_score(schedule, ctx.by_name, ctx.params, ctx.dist_cache)
+
+
+def _try_swap(ctx, tables, a, b, pool_names):
+    """두 슬롯의 장소를 맞바꿔 점수가 오르면 유지 (서로의 슬롯에서 영업 중일 때만)"""
+    (d1, i1), (d2, i2) = a, b
+    s1, s2 = tables[d1]["schedule"][i1], tables[d2]["schedule"][i2]
+    p1, p2 = ctx.by_name.get(s1.title), ctx.by_name.get(s2.title)
+    if p1 is None or p2 is None or p1 is p2:
+        return 0.0
+    if p2["name"] not in pool_names[a] or p1["name"] not in pool_names[b]:
+        return 0.0
+
+    if d1 != d2:
+        sch1, sch2 = tables[d1]["schedule"], tables[d2]["schedule"]
+        before = _local_gain_terms(ctx, sch1, i1, p1) + _local_gain_terms(ctx, sch2, i2, p2)
+        after = _local_gain_terms(ctx, sch1, i1, p2) + _local_gain_terms(ctx, sch2, i2, p1)
+        gain = after - before
+        if gain <= 1e-9:
+            return 0.0
+        _assign(s1, p2)
+        _assign(s2, p1)
+        return gain
+
+    # 같은 날은 두 슬롯이 서로의 이웃일 수 있어 하루 점수를 다시 계산
+    schedule = tables[d1]["schedule"]
+    before = _day_score(ctx, schedule)
+    _assign(s1, p2)
+    _assign(s2, p1)
+    gain = _day_score(ctx, schedule) - before
+    if gain <= 1e-9:
+        _assign(s1, p1)
+        _assign(s2, p2)
+        return 0.0
+    return gain
+
+
+def dqn_fill_schedule_global(user_id, title, tables, base_mode="명소 중심", ctx=None, time_budget_ms=500):
+    """
+    전 일정 동시 배정 planner (greedy → 타입별 최적 배정 → 교체/교환 국소 탐색).
+    국소 탐색은 time_budget_ms 안에서 수렴할 때까지. 결과가 greedy보다 나쁘면 greedy 결과로 되돌린다.
+    반환: (tables, report)
+    """
+    t0 = time.perf_counter()
+    deadline = t0 + max(0, time_budget_ms) / 1000.0
+    report = {
+        "budget_ms": time_budget_ms,
+        "elapsed_ms": 0.0,
+        "greedy_score": 0.0,
+        "assign_score": 0.0,
+        "final_score": 0.0,
+        "passes": 0,
+        "replacements": 0,
+        "swaps": 0,
+        "converged": False,
+        "fallback": False,
+    }
+
+    if ctx is None:
+        ctx = load_planner_context(user_id, title, tables, base_mode)
+    if ctx is None:
+        print("[DQN] 장소 데이터 없음")
+        return tables, report
+
+    def _total():
+        return sum(_day_score(ctx, info["schedule"]) for info in tables.values())
+
+    # 1) 타입 패턴 (greedy)
+    movable = {}
+    for date_str, info in tables.items():
+        schedule = info["schedule"]
+        movable[date_str] = [i for i, s in enumerate(schedule) if s.title is None]
+        _fill_day(ctx, date_str, schedule, depth=0)
+    keys = [(d, i) for d, idxs in movable.items() for i in idxs if tables[d]["schedule"][i].title is not None]
+    greedy = {key: ctx.by_name.get(tables[key[0]]["schedule"][key[1]].title) for key in keys}
+    report["greedy_score"] = _total()
+
+    # 2) 타입별 전역 배정
+    pools = _assign_by_type(ctx, tables, keys)
+    pool_names = {key: {p["name"] for p in pools.get(key, [])} for key in keys}
+    report["assign_score"] = _total()
+
+    # 3) 교체 / 교환 국소 탐색
+    movable_sets = {d: set(idxs) for d, idxs in movable.items()}
+    key_set = set(keys)
+    fixed_names = {s.title for d, info in tables.items() for i, s in enumerate(info["schedule"])
+                   if s.title and (d, i) not in key_set}
+    timed_out = False
+    while not timed_out:
+        report["passes"] += 1
+        changed = False
+        for d, i in keys:
+            if time.perf_counter() >= deadline:
+                timed_out = True
+                break
+            slot = tables[d]["schedule"][i]
+            old_type = slot.place_type
+            if _improve_slot(ctx, d, tables[d]["schedule"], i, movable_sets[d]) is not None:
+                report["replacements"] += 1
+                changed = True
+                if slot.place_type != old_type:
+                    pool_names[(d, i)] = {p["name"] for p in _type_pool(ctx, slot.place_type, d, slot, fixed_names)}
+
+        by_type = {}
+        for key in keys:
+            by_type.setdefault(tables[key[0]]["schedule"][key[1]].place_type, []).append(key)
+        for type_keys in by_type.values():
+            for ai in range(len(type_keys)):
+                if timed_out or time.perf_counter() >= deadline:
+                    timed_out = True
+                    break
+                for bi in range(ai + 1, len(type_keys)):
+                    if _try_swap(ctx, tables, type_keys[ai], type_keys[bi], pool_names) > 0:
+                        report["swaps"] += 1
+                        changed = True
+        if not changed and not timed_out:
+            report["converged"] = True
+            break
+
+    final = _total()
+    if final < report["greedy_score"]:
+        for (d, i), place in greedy.items():
+            if place is not None:
+                _assign(tables[d]["schedule"][i], place)
+        final = report["greedy_score"]
+        report["fallback"] = True
+    _reseed_in_timetable(ctx, tables)
+
+    report["final_score"] = final
+    report["elapsed_ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+    print(f"[DQN global] greedy {report['greedy_score']:.3f} → assign {report['assign_score']:.3f} "
+          f"→ final {final:.3f} (passes={report['passes']} swaps={report['swaps']} "
+          f"replacements={report['replacements']}, {report['elapsed_ms']}ms)")
+    return tables, report
@@ -0,0 +1,363 @@
+# services/lightgcn_artifacts.py
+"""
+LightGCN 아티팩트(인덱스 + 임베딩)의 로컬 버전 번들 캐시.
+
+- 번들: LIGHTGCN_ARTIFACT_DIR/v{version}/ — index.json, users_emb.npy, items_emb.npy, meta.json
+        임베딩은 LIGHTGCN_EMB_DTYPE(float32|float16)로 저장하고 np.load(mmap_mode="r") 로 연다
+        → 같은 호스트의 워커들이 페이지 캐시를 공유 (프로세스마다 복사본을 들지 않음)
+- 포인터: LIGHTGCN_ARTIFACT_DIR/CURRENT — 현재 번들 디렉터리 이름 (os.replace 로 원자적 교체)
+- 갱신: Storage lightgcn/meta.json 의 (version, generation)이 바뀌면 새 디렉터리에 내려받아 rename 후 교체.
+        확인은 LIGHTGCN_ARTIFACT_CHECK_S 초에 한 번 (메타데이터 조회 1회)
+- Storage 배치: 빌드마다 lightgcn/builds/{build_id}/ 아래에 새로 올리고(덮어쓰지 않음), 마지막에 쓰는
+        meta.json 의 prefix 가 그 디렉터리를 가리킨다 → 업로드와 다운로드가 겹쳐도 한 빌드의 파일만 받는다.
+        이전 빌드는 REMOTE_KEEP_BUILDS 개만 남김 (다른 레플리카가 아직 받고 있을 수 있음)
+- 조회 쪽은 Artifacts 객체 하나를 받아 쓰므로 교체 중에도 인덱스/행렬 버전이 섞이지 않는다
+- 이름 정규화 인덱스(item2idx_norm)는 번들을 열 때 한 번만 만든다
+- 선택 배열(EXTRA_ARRAYS): item_coords (I, 2) lat/lng(NaN=모름), rated_indptr/rated_items (유저별 평가 아이템 CSR),
+  item_degree (I,) 학습 그래프의 가중 차수 (신규 유저 fold-in 정규화용)
+  → 없는 번들(이전 버전)도 열리고, 추천에서 해당 기능만 빠진다
+"""
+import os
+import io
+import json
+import time
+import shutil
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+ARTIFACT_DIR = os.getenv(
+    "LIGHTGCN_ARTIFACT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models", "lightgcn", "bundles"),
+)
+EMB_DTYPE = os.getenv("LIGHTGCN_EMB_DTYPE", "float32")          # "float32" | "float16"
+CHECK_S = float(os.getenv("LIGHTGCN_ARTIFACT_CHECK_S", "60"))
+KEEP_BUNDLES = 2                                                 # 교체 직후 이전 버전을 읽는 요청 대비
+PREFIX = "lightgcn"
+BUILDS_PREFIX = f"{PREFIX}/builds"
+REMOTE_KEEP_BUILDS = 3
+EXTRA_ARRAYS = ("item_coords", "rated_indptr", "rated_items", "item_degree")
+
+
+@dataclass(frozen=True)
+class Artifacts:
+    version: str
+    uid2idx: Dict[str, int]
+    item2idx: Dict[str, int]
+    users_emb: np.ndarray      # (U, d) mmap, 읽기 전용
+    items_emb: np.ndarray      # (I, d) mmap, 읽기 전용
+    meta: dict
+    item2idx_norm: Dict[str, int]
+    extras: Dict[str, np.ndarray]
+
+    def rated_items(self, u: int) -> np.ndarray:
+        """학습 데이터에서 유저 u 가 평가한 아이템 행 번호 (모르면 빈 배열)"""
+        indptr, rated = self.extras.get("rated_indptr"), self.extras.get("rated_items")
+        if indptr is None or rated is None or u + 1 >= len(indptr):
+            return np.empty(0, dtype=np.int64)
+        return np.asarray(rated[indptr[u]:indptr[u + 1]], dtype=np.int64)
+
+    def item_indices(self, names: Sequence[str]) -> np.ndarray:
+        """이름 → 아이템 행 번호 (정확히 → 정규화 순으로 매칭, 없으면 -1)"""
+        get, get_norm = self.item2idx.get, self.item2idx_norm.get
+        out = np.empty(len(names), dtype=np.int64)
+        for k, name in enumerate(names):
+            idx = get(name)
+            if idx is None:
+                idx = get_norm(norm_name(name))
+            out[k] = -1 if idx is None else idx
+        return out
+
+
+def norm_name(s) -> str:
+    """이름 정규화 키 – 공백 trim/소문자"""
+    return (s or "").strip().lower()
+
+
+# ---------- 번들 쓰기/열기 ----------
+def _bundle_name(version) -> str:
+    return f"v{version}"
+
+
+def write_bundle(root, version, users_emb, items_emb, uid2idx, item2idx, meta=None, dtype=EMB_DTYPE,
+                 extras=None) -> str:
+    """임시 디렉터리에 다 쓴 뒤 rename → 반쯤 쓰인 번들은 보이지 않음. 이미 있으면 그대로 둔다"""
+    os.makedirs(root, exist_ok=True)
+    final = os.path.join(root, _bundle_name(version))
+    if os.path.isdir(final):
+        return final
+    tmp = os.path.join(root, f".tmp-{_bundle_name(version)}-{os.getpid()}-{threading.get_ident()}")
+    os.makedirs(tmp, exist_ok=True)
+    np.save(os.path.join(tmp, "users_emb.npy"), np.ascontiguousarray(users_emb, dtype=dtype))
+    np.save(os.path.join(tmp, "items_emb.npy"), np.ascontiguousarray(items_emb, dtype=dtype))
+    for name, arr in (extras or {}).items():
+        np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(arr))
+    with open(os.path.join(tmp, "index.json"), "w", encoding="utf-8") as f:
+        json.dump({"uid2idx": uid2idx, "item2idx": item2idx}, f, ensure_ascii=False)
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({**(meta or {}), "version": str(version), "dtype": dtype}, f)
+    try:
+        os.rename(tmp, final)
+    except OSError:
+        # 다른 워커가 먼저 같은 버전을 만들었음
+        shutil.rmtree(tmp, ignore_errors=True)
+    return final
+
+
+def open_bundle(path) -> Artifacts:
+    with open(os.path.join(path, "index.json"), "r", encoding="utf-8") as f:
+        index = json.load(f)
+    with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    item2idx = index["item2idx"]
+    extras = {}
+    for name in EXTRA_ARRAYS:
+        fp = os.path.join(path, f"{name}.npy")
+        if os.path.exists(fp):
+            extras[name] = np.load(fp, mmap_mode="r")
+    return Artifacts(
+        version=meta["version"],
+        uid2idx=index["uid2idx"],
+        item2idx=item2idx,
+        users_emb=np.load(os.path.join(path, "users_emb.npy"), mmap_mode="r"),
+        items_emb=np.load(os.path.join(path, "items_emb.npy"), mmap_mode="r"),
+        meta=meta,
+        item2idx_norm={norm_name(k): v for k, v in item2idx.items()},
+        extras=extras,
+    )
+
+
+def _set_current(root, name):
+    tmp = os.path.join(root, f".CURRENT.{os.getpid()}")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(tmp, os.path.join(root, "CURRENT"))
+
+
+def _read_current(root):
+    try:
+        with open(os.path.join(root, "CURRENT"), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _prune(root, keep):
+    """최근 keep 개 번들만 남김 (열려 있는 mmap은 unlink 후에도 유효)"""
+    try:
+        names = [n for n in os.listdir(root) if n.startswith("v") and os.path.isdir(os.path.join(root, n))]
+    except OSError:
+        return
+    names.sort(key=lambda n: os.path.getmtime(os.path.join(root, n)), reverse=True)
+    for n in names[keep:]:
+        shutil.rmtree(os.path.join(root, n), ignore_errors=True)
+
+
+def build_extras(edges, uid2idx, item2idx, coords=None) -> Dict[str, np.ndarray]:
+    """엣지/좌표 → EXTRA_ARRAYS (유저별 평가 아이템 CSR, 아이템 가중 차수, 아이템 좌표)"""
+    from services.lightgcn_model import edge_arrays, edge_weights
+
+    u, i, r = edge_arrays(edges, uid2idx, item2idx)
+    key = np.unique(u * len(item2idx) + i)           # (유저, 아이템) 중복 제거 + 유저순 정렬
+    ku, ki = np.divmod(key, max(1, len(item2idx)))
+    extras = {
+        "rated_indptr": np.concatenate([[0], np.cumsum(np.bincount(ku, minlength=len(uid2idx)))]).astype(np.int64),
+        "rated_items": ki.astype(np.int32),
+        # norm_adj_from_arrays 와 같은 가중치/차수
+        "item_degree": np.bincount(i, weights=edge_weights(r), minlength=len(item2idx)).astype(np.float32),
+    }
+    if coords:
+        xy = np.full((len(item2idx), 2), np.nan, dtype=np.float32)
+        for name, (lat, lng) in coords.items():
+            j = item2idx.get(name)
+            if j is not None:
+                xy[j] = (lat, lng)
+        extras["item_coords"] = xy
+    return extras
+
+
+# ---------- 점수 ----------
+def score_pairs(art: Artifacts, requests: Sequence[tuple], user_vecs: Dict[str, np.ndarray] = None) -> List[list]:
+    """
+    [(uid, [name, ...]), ...] → 요청별 [score|None, ...], 모델에 없는 uid 는 리스트 대신 None.
+    모든 (유저 행, 아이템 행) 쌍을 모아 gather 두 번 + 행별 내적 한 번으로 계산.
+    user_vecs: 모델에 없는 유저의 fold-in 벡터 (있으면 그 벡터로 채점)
+    """
+    u_rows, i_rows, spans = [], [], []
+    offset = 0
+    for uid, names in requests:
+        u = art.uid2idx.get(uid)
+        vec = (user_vecs or {}).get(uid) if u is None else None
+        if u is None and vec is None:
+            spans.append(None)
+            continue
+        idx = art.item_indices(names)
+        hit = np.flatnonzero(idx >= 0)
+        if vec is not None:
+            # fold-in 유저는 요청마다 행렬-벡터 곱 한 번
+            spans.append((hit, len(names), np.asarray(art.items_emb[idx[hit]], dtype=np.float32) @ vec))
+            continue
+        spans.append((hit, len(names), offset))
+        u_rows.append(np.full(len(hit), u, dtype=np.int64))
+        i_rows.append(idx[hit])
+        offset += len(hit)
+
+    if i_rows:
+        u_all = np.concatenate(u_rows)
+        i_all = np.concatenate(i_rows)
+        # mmap 에서 필요한 행만 복사, float16 번들이어도 float32로 누적
+        U = np.asarray(art.users_emb[u_all], dtype=np.float32)
+        V = np.asarray(art.items_emb[i_all], dtype=np.float32)
+        flat = np.einsum("ij,ij->i", U, V)
+    else:
+        flat = np.empty(0, dtype=np.float32)
+
+    results = []
+    for span in spans:
+        if span is None:
+            results.append(None)
+            continue
+        hit, n, src = span
+        vals = src if isinstance(src, np.ndarray) else flat[src:src + len(hit)]
+        scores = [None] * n
+        for j, v in zip(hit.tolist(), vals.tolist()):
+            scores[j] = v
+        results.append(scores)
+    return results
+
+
+# ---------- Storage ----------
+def remote_version(bucket):
+    """Storage meta.json → (version, meta). 없으면 (None, None)"""
+    blob = bucket.blob(f"{PREFIX}/meta.json")
+    if not blob.exists():
+        return None, None
+    blob.reload()
+    meta = json.loads(blob.download_as_text())
+    # 같은 version 문자열로 다시 올려도 generation 이 바뀌면 새 번들
+    return f"{meta.get('version') or meta.get('updated_at')}-{blob.generation}", meta
+
+
+def upload_build(bucket, build_id, users_emb, items_emb, uid2idx, item2idx, extras=None) -> str:
+    """한 빌드의 인덱스/임베딩/extras 를 lightgcn/builds/{build_id}/ 에 올리고 그 prefix 를 돌려준다 (meta 는 호출자가 마지막에)"""
+    prefix = f"{BUILDS_PREFIX}/{build_id}"
+    for name, obj in [("user_index.json", {"uid2idx": uid2idx}), ("item_index.json", {"item2idx": item2idx})]:
+        bucket.blob(f"{prefix}/{name}").upload_from_string(json.dumps(obj, ensure_ascii=False),
+                                                           content_type="application/json")
+    arrays = [("users_emb.npy", users_emb), ("items_emb.npy", items_emb)]
+    arrays += [(f"{k}.npy", v) for k, v in (extras or {}).items()]
+    for name, arr in arrays:
+        buf = io.BytesIO()
+        np.save(buf, arr)
+        buf.seek(0)
+        bucket.blob(f"{prefix}/{name}").upload_from_file(buf, content_type="application/octet-stream")
+    return prefix
+
+
+def prune_remote_builds(bucket, current_prefix, keep=REMOTE_KEEP_BUILDS):
+    """오래된 빌드 디렉터리 삭제 (build_id 는 시각으로 시작하므로 이름순 = 시간순). 현재 것은 항상 남김"""
+    by_build = {}
+    for blob in bucket.list_blobs(prefix=f"{BUILDS_PREFIX}/"):
+        build = blob.name[len(BUILDS_PREFIX) + 1:].split("/", 1)[0]
+        by_build.setdefault(build, []).append(blob)
+    current = current_prefix.rsplit("/", 1)[-1]
+    for build in sorted(by_build, reverse=True)[keep:]:
+        if build == current:
+            continue
+        for blob in by_build[build]:
+            try:
+                blob.delete()
+            except Exception as e:
+                print(f"[LGN] remote prune failed for {blob.name}: {e}", flush=True)
+
+
+def download_bundle(bucket, root, version, meta) -> str:
+    final = os.path.join(root, _bundle_name(version))
+    if os.path.isdir(final):
+        return final
+    # meta.prefix: 그 빌드만의 디렉터리 (이후 빌드가 덮어쓰지 않음)
+    # 없으면 이전 배치(lightgcn/ 바로 아래 고정 이름) — 크기 확인만 가능
+    prefix = meta.get("prefix") or PREFIX
+    uid2idx = json.loads(bucket.blob(f"{prefix}/user_index.json").download_as_text())["uid2idx"]
+    item2idx = json.loads(bucket.blob(f"{prefix}/item_index.json").download_as_text())["item2idx"]
+    users_emb = np.load(io.BytesIO(bucket.blob(f"{prefix}/users_emb.npy").download_as_bytes()))
+    items_emb = np.load(io.BytesIO(bucket.blob(f"{prefix}/items_emb.npy").download_as_bytes()))
+    if users_emb.shape[0] != meta.get("num_users", users_emb.shape[0]) or \
+            items_emb.shape[0] != meta.get("num_items", items_emb.shape[0]) or \
+            users_emb.shape[0] != len(uid2idx) or items_emb.shape[0] != len(item2idx):
+        raise RuntimeError(f"artifact shape/meta mismatch under {prefix}")
+    extras = {}
+    names = meta.get("extras") if "prefix" in meta else EXTRA_ARRAYS
+    for name in names:
+        blob = bucket.blob(f"{prefix}/{name}.npy")
+        if "prefix" in meta or blob.exists():
+            extras[name] = np.load(io.BytesIO(blob.download_as_bytes()))
+    return write_bundle(root, version, users_emb, items_emb, uid2idx, item2idx, meta, extras=extras)
+
+
+# ---------- 프로세스 캐시 ----------
+class ArtifactCache:
+    def __init__(self, bucket_fn, root=ARTIFACT_DIR, check_s=CHECK_S):
+        self.bucket_fn = bucket_fn
+        self.root = root
+        self.check_s = check_s
+        self._current = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> Artifacts:
+        """현재 번들. check_s 마다 Storage 버전을 확인해 바뀌었으면 교체. 준비된 게 없으면 RuntimeError"""
+        cur = self._current
+        if cur is not None and time.time() - self._checked_at < self.check_s:
+            return cur
+        with self._lock:
+            if self._current is None or time.time() - self._checked_at >= self.check_s:
+                self._refresh()
+            if self._current is None:
+                raise RuntimeError("artifacts not found")
+            return self._current
+
+    def _refresh(self):
+        self._checked_at = time.time()
+        try:
+            version, meta = remote_version(self.bucket_fn())
+        except Exception as e:
+            print(f"[LGN] artifact version check failed: {e}", flush=True)
+            version, meta = None, None
+
+        if version is None:
+            # Storage를 못 보면 디스크에 있는 마지막 번들로
+            if self._current is None:
+                name = _read_current(self.root)
+                if name and os.path.isdir(os.path.join(self.root, name)):
+                    self._current = open_bundle(os.path.join(self.root, name))
+            return
+        if self._current is not None and self._current.version == version:
+            return
+        try:
+            path = download_bundle(self.bucket_fn(), self.root, version, meta)
+        except Exception as e:
+            print(f"[LGN] artifact download failed: {e}", flush=True)
+            return
+        self._activate(path)
+
+    def _activate(self, path):
+        self._current = open_bundle(path)
+        _set_current(self.root, os.path.basename(path))
+        _prune(self.root, KEEP_BUNDLES)
+        print(f"[LGN] artifacts v{self._current.version} "
+              f"users={self._current.users_emb.shape} items={self._current.items_emb.shape} "
+              f"dtype={self._current.users_emb.dtype}", flush=True)
+
+    def publish(self, version, users_emb, items_emb, uid2idx, item2idx, meta=None, extras=None):
+        """학습한 프로세스: 방금 만든 임베딩으로 바로 로컬 번들 교체 (다시 내려받지 않음)"""
+        with self._lock:
+            path = write_bundle(self.root, version, users_emb, items_emb, uid2idx, item2idx, meta, extras=extras)
+            self._activate(path)
+            self._checked_at = time.time()
+
+    def invalidate(self):
+        with self._lock:
+            self._checked_at = 0.0
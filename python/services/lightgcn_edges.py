@@ -0,0 +1,417 @@
+# services/lightgcn_edges.py
+"""
+LightGCN 학습용 (uid, item, rating) 엣지의 로컬 증분 저장소.
+
+- 로그: LIGHTGCN_EDGE_DIR/edges.jsonl — days 문서 하나당 한 줄 {"path", "uid", "items": [[name, rating, lat, lng], ...]}
+        (좌표는 일정의 location_info, 없으면 null. 예전 [name, rating] 줄도 읽음)
+        append-only, 같은 path는 마지막 줄이 유효 (평점이 모두 지워진 문서는 items=[] 로 남김)
+- 상태: LIGHTGCN_EDGE_DIR/state.json — high-water mark(마지막 동기화 시작 시각), 마지막 전체 스캔 시각
+- 동기화: high-water mark 이후 updatedAt(LIGHTGCN_UPDATED_FIELD)이 바뀐 days 문서만 collection_group 쿼리로 읽어 로그에 추가
+  → days 문서를 쓰는 모든 곳이 updatedAt: serverTimestamp() 를 같이 써야 한다
+    (src/pages/Journey.js 일정 저장, src/pages/Save_Travel.js 평점 반영. 백엔드에는 days 쓰기 없음)
+  → 이 필드가 생기기 전 문서는 `backfill` 로 한 번 찍어 둔다 (아래 CLI). 안 찍힌 문서의 변경은 증분에 안 잡힌다
+- 전체 스캔(fallback): 저장소가 비었거나, 강제 요청, LIGHTGCN_FULL_SCAN_EVERY 초 경과, 증분 쿼리 실패 시
+  → 문서 삭제와 updatedAt 없는 문서는 전체 스캔에서만 반영된다
+  (증분 쿼리에는 days 컬렉션 그룹의 updatedAt 단일 필드 색인이 필요)
+- 전체 스캔은 collection_group 쿼리를 get_partitions 로 나눠 스레드 풀에서 동시에 읽고 파싱한다
+  (LIGHTGCN_SCAN_PARTITIONS / LIGHTGCN_SCAN_WORKERS, 파티션 쿼리를 못 쓰면 한 스트림으로)
+
+에뮬레이터로 확인:
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python -m services.lightgcn_edges seed --users 500
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python -m services.lightgcn_edges scan --workers 1,4,16
+
+updatedAt 백필 (운영 DB, 필드 없는 days 문서만):
+    python -m services.lightgcn_edges backfill --dry-run
+    python -m services.lightgcn_edges backfill
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+EDGE_DIR = os.getenv(
+    "LIGHTGCN_EDGE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models", "lightgcn", "edges"),
+)
+UPDATED_FIELD = os.getenv("LIGHTGCN_UPDATED_FIELD", "updatedAt")
+FULL_SCAN_EVERY = int(os.getenv("LIGHTGCN_FULL_SCAN_EVERY", str(24 * 3600)))
+HW_SKEW_S = int(os.getenv("LIGHTGCN_HW_SKEW_S", "300"))   # 서버/로컬 시계 차이 여유
+COMPACT_RATIO = 2.0                                      # 로그 줄 수가 유효 문서 수의 이 배수를 넘으면 다시 씀
+# I/O 대기가 대부분이라 코어 수보다 넉넉하게
+SCAN_WORKERS = int(os.getenv("LIGHTGCN_SCAN_WORKERS", str(min(32, (os.cpu_count() or 1) * 4))))
+SCAN_PARTITIONS = int(os.getenv("LIGHTGCN_SCAN_PARTITIONS", str(SCAN_WORKERS * 2)))
+
+
+# ---------- days 문서 → 엣지 ----------
+def day_doc_record(day_doc, stats=None):
+    """
+    user_trips/{uid}/trips_log/{title}/days/{date} 문서 → (path, uid, [(name, rating, lat, lng), ...]).
+    경로 구조가 다르면 None.
+    """
+    try:
+        # day_doc.reference.parent == Collection('days')
+        # parent.parent == Document('trips_log/{title}')
+        # parent.parent.parent.parent == Document('user_trips/{uid}')
+        uid = day_doc.reference.parent.parent.parent.parent.id
+    except Exception:
+        return None
+    data = day_doc.to_dict() or {}
+    sched = data.get("schedule", [])
+    if not isinstance(sched, list):
+        sched = []
+    if stats is not None:
+        stats["days"] += 1
+        stats["sched_total"] += len(sched)
+
+    items = []
+    for s in sched:
+        if stats is not None and "user_rating" in s:
+            stats["sched_with_rating"] += 1
+        r = s.get("user_rating")
+        name = (s.get("title") or "").strip()
+        if r is None or not name:
+            continue
+        try:
+            rr = float(r)
+        except Exception:
+            print(f"[LGN-DEBUG] non-float user_rating: uid={uid} title={name} raw={r}", flush=True)
+            continue
+        items.append((name, rr, *_coords(s)))
+    return day_doc.reference.path, uid, items
+
+
+def _coords(s):
+    loc = s.get("location_info") or {}
+    lat, lng = s.get("lat", loc.get("lat")), s.get("lng", loc.get("lng"))
+    try:
+        return float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None, None
+
+
+def _item_row(x):
+    """로그의 items 원소 → (name, rating, lat, lng)"""
+    return (tuple(x) + (None, None))[:4]
+
+
+def _new_stats():
+    return {"days": 0, "sched_total": 0, "sched_with_rating": 0}
+
+
+def _scan_query(query):
+    """쿼리 하나를 끝까지 읽어 파싱 → (records, stats)"""
+    records, stats = {}, _new_stats()
+    for day_doc in query.stream():
+        rec = day_doc_record(day_doc, stats)
+        if rec is not None:
+            records[rec[0]] = (rec[1], rec[2])
+    return records, stats
+
+
+def sequential_scan(db):
+    """모든 days 문서를 한 스트림으로 순회 → ({path: (uid, items)}, stats)"""
+    t0 = time.perf_counter()
+    records, stats = _scan_query(db.collection_group("days"))
+    stats.update({"partitions": 1, "workers": 1, "scan_seconds": round(time.perf_counter() - t0, 3)})
+    stats["docs_per_sec"] = round(stats["days"] / max(stats["scan_seconds"], 1e-9), 1)
+    return records, stats
+
+
+def full_scan(db, partitions=None, workers=None, progress=True):
+    """
+    모든 days 문서를 파티션별로 동시에 읽고 파싱 → ({path: (uid, items)}, stats)
+    stats: days/sched 집계 + partitions, workers, scan_seconds, docs_per_sec
+    """
+    partitions = partitions or SCAN_PARTITIONS
+    workers = workers or SCAN_WORKERS
+    if partitions <= 1 or workers <= 1:
+        return sequential_scan(db)
+    try:
+        parts = [p.query() for p in db.collection_group("days").get_partitions(partitions)]
+    except Exception as e:
+        print(f"[LGN] partition query unavailable ({e}); sequential scan", flush=True)
+        return sequential_scan(db)
+    if len(parts) <= 1:
+        return sequential_scan(db)
+
+    t0 = time.perf_counter()
+    records, stats = {}, _new_stats()
+    done = 0
+    with ThreadPoolExecutor(max_workers=min(workers, len(parts)) or 1, thread_name_prefix="lgn-scan") as pool:
+        futures = [pool.submit(_scan_query, q) for q in parts]
+        for fut in as_completed(futures):
+            part_records, part_stats = fut.result()
+            records.update(part_records)
+            for k in part_stats:
+                stats[k] += part_stats[k]
+            done += 1
+            if progress:
+                el = time.perf_counter() - t0
+                print(f"[LGN] scan {done}/{len(parts)} partitions, docs={stats['days']} "
+                      f"({stats['days'] / max(el, 1e-9):.0f} docs/s)", flush=True)
+
+    stats.update({"partitions": len(parts), "workers": min(workers, len(parts)),
+                  "scan_seconds": round(time.perf_counter() - t0, 3)})
+    stats["docs_per_sec"] = round(stats["days"] / max(stats["scan_seconds"], 1e-9), 1)
+    return records, stats
+
+
+def delta_scan(db, since_ts: float):
+    """updatedAt >= since_ts 인 days 문서만 → ({path: (uid, items)}, stats)"""
+    since = datetime.fromtimestamp(since_ts, tz=timezone.utc)
+    coll = db.collection_group("days")
+    try:
+        from google.cloud.firestore_v1.base_query import FieldFilter
+        query = coll.where(filter=FieldFilter(UPDATED_FIELD, ">=", since))
+    except ImportError:
+        query = coll.where(UPDATED_FIELD, ">=", since)
+
+    return _scan_query(query)
+
+
+def user_scan(db, uid):
+    """한 유저의 days 문서만 → ({path: (uid, items)}, stats). 학습 후 새로 들어온 유저 fold-in 용"""
+    records, stats = {}, _new_stats()
+    for trip in db.collection("user_trips").document(uid).collection("trips_log").stream():
+        part, part_stats = _scan_query(trip.reference.collection("days"))
+        records.update(part)
+        for k in part_stats:
+            stats[k] += part_stats[k]
+    return records, stats
+
+
+def latest_update_ts(db):
+    """days 문서 중 가장 최근 updatedAt (epoch 초). 문서가 없으면 0.0, 쿼리 실패 시 예외 그대로"""
+    query = db.collection_group("days").order_by(UPDATED_FIELD, direction="DESCENDING").limit(1)
+    for doc in query.stream():
+        v = (doc.to_dict() or {}).get(UPDATED_FIELD)
+        if hasattr(v, "timestamp"):
+            return float(v.timestamp())
+    return 0.0
+
+
+# ---------- 로컬 저장소 ----------
+class EdgeStore:
+    def __init__(self, root=EDGE_DIR):
+        self.root = root
+        self.log_path = os.path.join(root, "edges.jsonl")
+        self.state_path = os.path.join(root, "state.json")
+        self._lock = threading.Lock()
+        self._records = {}
+
+    def state(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_json_atomic(self, path, obj):
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def load(self):
+        """로그 재생 → ({path: (uid, items)}, 로그 줄 수). 마지막 줄이 잘린 경우(쓰기 중 종료)는 무시"""
+        records, lines = {}, 0
+        try:
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue
+                    lines += 1
+                    records[row["path"]] = (row["uid"], [_item_row(x) for x in row["items"]])
+        except OSError:
+            pass
+        return records, lines
+
+    @staticmethod
+    def _line(path, uid, items):
+        return json.dumps({"path": path, "uid": uid, "items": [list(x) for x in items]}, ensure_ascii=False) + "\n"
+
+    def append(self, records):
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            for path, (uid, items) in records.items():
+                f.write(self._line(path, uid, items))
+
+    def rewrite(self, records):
+        """스냅샷으로 다시 씀 (전체 스캔 / 압축). 평점 없는 문서는 생략"""
+        os.makedirs(self.root, exist_ok=True)
+        tmp = f"{self.log_path}.tmp{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for path, (uid, items) in records.items():
+                if items:
+                    f.write(self._line(path, uid, items))
+        os.replace(tmp, self.log_path)
+
+    def save_state(self, **kw):
+        os.makedirs(self.root, exist_ok=True)
+        st = self.state()
+        st.update(kw)
+        self._write_json_atomic(self.state_path, st)
+        return st
+
+    # ----- 동기화 -----
+    def sync(self, db, force_full=False, full_scan_fn=None):
+        """
+        Firestore와 맞춘 뒤 전체 엣지 반환 → (edges, report)
+        full_scan_fn: 전체 스캔 구현 교체용 (기본 full_scan)
+        """
+        full_scan_fn = full_scan_fn or full_scan
+        with self._lock:
+            t0 = time.time()
+            st = self.state()
+            hw = st.get("high_water")
+            last_full = st.get("last_full_scan") or 0
+            records, lines = self.load()
+
+            mode = "delta"
+            if force_full or hw is None or not records or t0 - last_full >= FULL_SCAN_EVERY:
+                mode = "full"
+            report = {"mode": mode, "changed_docs": 0, "log_lines": lines}
+
+            if mode == "delta":
+                try:
+                    changed, stats = delta_scan(db, hw)
+                except Exception as e:
+                    print(f"[LGN] delta scan failed ({e}); falling back to full scan", flush=True)
+                    mode = report["mode"] = "full"
+                else:
+                    if changed:
+                        self.append(changed)
+                        records.update(changed)
+                        lines += len(changed)
+                    live = sum(1 for _, items in records.values() if items)
+                    if lines > COMPACT_RATIO * max(1, live):
+                        self.rewrite(records)
+                        report["compacted"] = True
+                    report["changed_docs"] = len(changed)
+                    self.save_state(high_water=t0 - HW_SKEW_S)
+
+            if mode == "full":
+                records, stats = full_scan_fn(db)
+                self.rewrite(records)
+                report["changed_docs"] = len(records)
+                self.save_state(high_water=t0 - HW_SKEW_S, last_full_scan=t0)
+
+            report.update(stats)
+            report["seconds"] = round(time.time() - t0, 3)
+
+            self._records = records
+
+        edges = [(uid, name, r) for uid, items in records.values() for name, r, *_ in items]
+        report["edges"] = len(edges)
+        return edges, report
+
+
+    def item_coords(self):
+        """마지막 sync 기준 아이템 이름 → (lat, lng). 좌표가 여러 개면 마지막으로 본 것"""
+        coords = {}
+        for _, items in self._records.values():
+            for name, _, lat, lng in items:
+                if lat is not None and lng is not None:
+                    coords[name] = (lat, lng)
+        return coords
+
+
+def edges_to_index(edges):
+    uid2idx = {u: i for i, u in enumerate(sorted({e[0] for e in edges}))}
+    item2idx = {it: i for i, it in enumerate(sorted({e[1] for e in edges}))}
+    return uid2idx, item2idx
+
+
+# ---------- CLI (에뮬레이터 시드 / 스캔 처리량) ----------
+def seed_emulator(db, users=200, trips=3, days=3, items=500, per_day=6, seed=0):
+    """user_trips/{uid}/trips_log/{title}/days/{date} 합성 문서 작성 (에뮬레이터 전용)"""
+    from firebase_admin import firestore as admin_fs
+
+    if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+        raise RuntimeError("FIRESTORE_EMULATOR_HOST 가 없으면 seed 하지 않습니다.")
+    rng = random.Random(seed)
+    coords = [(37.45 + rng.random() * 0.2, 126.9 + rng.random() * 0.2) for _ in range(items)]
+    batch, n = db.batch(), 0
+    for u in range(users):
+        for t in range(trips):
+            for d in range(days):
+                ref = (db.collection("user_trips").document(f"user{u:05d}").collection("trips_log")
+                       .document(f"trip{t}").collection("days").document(f"2025-08-{d + 1:02d}"))
+                picks = [rng.randrange(items) for _ in range(per_day)]
+                sched = [{"title": f"place{i:05d}", "user_rating": rng.choice([1, 2, 3, 4, 5]),
+                          "location_info": {"lat": coords[i][0], "lng": coords[i][1]}} for i in picks]
+                batch.set(ref, {"schedule": sched, UPDATED_FIELD: admin_fs.SERVER_TIMESTAMP})
+                n += 1
+                if n % 400 == 0:
+                    batch.commit()
+                    batch = db.batch()
+    batch.commit()
+    return n
+
+
+def backfill_updated_at(db, dry_run=False):
+    """updatedAt 이 없는 days 문서에 SERVER_TIMESTAMP 기록 → (전체 문서 수, 찍은 문서 수)"""
+    from firebase_admin import firestore as admin_fs
+
+    batch, total, n = db.batch(), 0, 0
+    for day_doc in db.collection_group("days").stream():
+        total += 1
+        if UPDATED_FIELD in (day_doc.to_dict() or {}):
+            continue
+        n += 1
+        if dry_run:
+            continue
+        batch.update(day_doc.reference, {UPDATED_FIELD: admin_fs.SERVER_TIMESTAMP})
+        if n % 400 == 0:
+            batch.commit()
+            batch = db.batch()
+    if not dry_run:
+        batch.commit()
+    return total, n
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="LightGCN edge store tools")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("seed")
+    s.add_argument("--users", type=int, default=200)
+    s.add_argument("--trips", type=int, default=3)
+    s.add_argument("--days", type=int, default=3)
+    s.add_argument("--items", type=int, default=500)
+    c = sub.add_parser("scan")
+    c.add_argument("--workers", default="1,4,16", help="비교할 워커 수 (콤마)")
+    c.add_argument("--partitions", type=int, default=0, help="0이면 워커 수 x 2")
+    y = sub.add_parser("sync")
+    y.add_argument("--full", action="store_true")
+    b = sub.add_parser("backfill")
+    b.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args(argv)
+
+    from core.firebase import db
+
+    if args.cmd == "seed":
+        n = seed_emulator(db, args.users, args.trips, args.days, args.items)
+        print(f"seeded {n} day documents")
+    elif args.cmd == "scan":
+        for w in (int(x) for x in args.workers.split(",") if x.strip()):
+            records, stats = full_scan(db, partitions=args.partitions or w * 2, workers=w, progress=False)
+            print(json.dumps({"workers": w, **stats}, ensure_ascii=False))
+    elif args.cmd == "backfill":
+        total, n = backfill_updated_at(db, dry_run=args.dry_run)
+        print(f"days={total} missing_{UPDATED_FIELD}={n}" + (" (dry run)" if args.dry_run else " stamped"))
+    else:
+        _, report = EdgeStore().sync(db, force_full=args.full)
+        print(json.dumps(report, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
@@ -0,0 +1,408 @@
+# services/lightgcn_model.py
+"""
+LightGCN 모델 / 그래프 / 학습 (Firestore·Storage 없이 텐서만 다룸).
+routes/lightgcn.py 가 엣지 수집·아티팩트 저장을, 이 모듈이 계산을 맡는다.
+"""
+import math
+import time
+import contextlib
+
+import numpy as np
+import scipy.sparse as sp
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+
+# ====== 스파스 전파 ======
+class _SpMM(torch.autograd.Function):
+    """A @ x. backward는 미리 만든 A^T로 A^T @ grad (torch 기본 sparse backward보다 훨씬 빠름)"""
+
+    @staticmethod
+    def forward(ctx, A, AT, x):
+        ctx.AT = AT
+        return torch.sparse.mm(A, x)
+
+    @staticmethod
+    def backward(ctx, grad):
+        return None, None, torch.sparse.mm(ctx.AT, grad)
+
+
+def sparse_mm(A, x, AT=None):
+    """AT를 주면 그걸로 역전파. 정규화 인접행렬 A_hat은 대칭이라 AT=A"""
+    if AT is None or not x.requires_grad:
+        return torch.sparse.mm(A, x)
+    return _SpMM.apply(A, AT, x)
+
+
+# ====== 간단한 LightGCN 구현 (미니버전) ======
+class LightGCN(nn.Module):
+    def __init__(self, num_users:int, num_items:int, embedding_dim:int=32, n_layers:int=2):
+        super().__init__()
+        self.num_users = num_users
+        self.num_items = num_items
+        self.embedding_dim = embedding_dim
+        self.n_layers = n_layers
+
+        self.user_emb = nn.Embedding(num_users, embedding_dim)
+        self.item_emb = nn.Embedding(num_items, embedding_dim)
+        nn.init.xavier_uniform_(self.user_emb.weight)
+        nn.init.xavier_uniform_(self.item_emb.weight)
+
+    def forward(self, A_hat: torch.sparse.FloatTensor):
+        # concat user/item 임베딩
+        x0 = torch.cat([self.user_emb.weight, self.item_emb.weight], dim=0)  # (U+I, D)
+        all_layers = [x0]
+        x = x0
+        for _ in range(self.n_layers):
+            x = sparse_mm(A_hat, x, A_hat)  # message passing (A_hat 대칭)
+            all_layers.append(x)
+        x = torch.stack(all_layers, dim=0).mean(dim=0)  # layer-mean
+        users, items = torch.split(x, [self.num_users, self.num_items], dim=0)
+        return users, items
+
+
+# ====== 엣지 → 배열/텐서 ======
+def rating_range(edges):
+    if edges:
+        all_r = [r for _,_,r in edges]
+        return min(all_r), max(all_r)
+    return 0.5, 5.0
+
+
+def edge_arrays(edges, uid2idx, item2idx):
+    """(uid, item, rating) 엣지 → (user 인덱스, item 인덱스, rating) NumPy 배열"""
+    n = len(edges)
+    u = np.fromiter((uid2idx[e[0]] for e in edges), dtype=np.int64, count=n)
+    i = np.fromiter((item2idx[e[1]] for e in edges), dtype=np.int64, count=n)
+    r = np.fromiter((e[2] for e in edges), dtype=np.float64, count=n)
+    return u, i, r
+
+
+def edge_tensors(edges, uid2idx, item2idx):
+    """(uid, item, rating) 엣지 → (user 인덱스, item 인덱스, rating) 텐서 (학습 내내 재사용)"""
+    u, i, r = edge_arrays(edges, uid2idx, item2idx)
+    return torch.from_numpy(u), torch.from_numpy(i), torch.from_numpy(r.astype(np.float32))
+
+
+def scale_ratings(ratings: torch.Tensor, rmin: float, rmax: float) -> torch.Tensor:
+    """rating을 0~1로 스케일 (모두 같으면 0.5)"""
+    if rmax > rmin:
+        return (ratings - rmin) / (rmax - rmin)
+    return torch.full_like(ratings, 0.5)
+
+
+# ====== (2) 그래프 정규화 인접행렬 ======
+def edge_weights(r: np.ndarray) -> np.ndarray:
+    """rating → 엣지 가중치: min-max 0~1 후 0.5~1.0 (너무 과한 가중치 방지), 모두 같으면 1.0"""
+    if r.size and r.max() > r.min():
+        rmin, rmax = float(r.min()), float(r.max())
+        return 0.5 + 0.5 * (r - rmin) / (rmax - rmin)
+    return np.ones_like(r, dtype=np.float64)
+
+
+def norm_adj_from_arrays(u: np.ndarray, i: np.ndarray, w: np.ndarray, num_u: int, num_i: int,
+                         layout: str = "csr"):
+    """
+    인덱스/가중치 배열로 A_hat = D^{-1/2} A D^{-1/2} 구성 (파이썬 루프 없음).
+    같은 (user, item) 엣지가 여러 번이면 가중치를 더한다. layout: "csr" | "coo"
+    """
+    N = num_u + num_i
+    it = i + num_u  # item index offset
+    rows = np.concatenate([u, it])
+    cols = np.concatenate([it, u])
+    vals = np.concatenate([w, w])
+
+    deg = np.bincount(rows, weights=vals, minlength=N)
+    deg[deg == 0] = 1.0
+    d_inv_sqrt = 1.0 / np.sqrt(deg)
+    vals = (vals * d_inv_sqrt[rows] * d_inv_sqrt[cols]).astype(np.float32)
+
+    if layout == "coo":
+        A_hat = torch.sparse_coo_tensor(torch.from_numpy(np.stack([rows, cols])), torch.from_numpy(vals), size=(N, N))
+        return A_hat.coalesce()
+
+    # CSR: 행 정렬 + 중복 합산을 scipy로 한 번에
+    A = sp.csr_matrix((vals, (rows, cols)), shape=(N, N), dtype=np.float32)
+    A.sum_duplicates()
+    return torch.sparse_csr_tensor(
+        torch.from_numpy(A.indptr.astype(np.int64)),
+        torch.from_numpy(A.indices.astype(np.int64)),
+        torch.from_numpy(A.data),
+        size=(N, N),
+    )
+
+
+def build_norm_adj(edges, uid2idx, item2idx, layout: str = "csr"):
+    """
+    U-I 이분그래프 A 구성 후 A_hat = D^{-1/2} A D^{-1/2} 스파스 텐서 반환
+    rating은 가중치로 쓰되, 0.5~5.0 범위 → 간단히 min-max 정규화(0~1) 후 (기본 1.0) 섞음.
+    """
+    num_u = len(uid2idx)
+    num_i = len(item2idx)
+    u, i, r = edge_arrays(edges, uid2idx, item2idx)
+    A_hat = norm_adj_from_arrays(u, i, edge_weights(r), num_u, num_i, layout=layout)
+    return A_hat, num_u, num_i
+
+
+# ====== (3) 학습 ======
+def _pointwise_loss(users, items, u_idx, i_idx, target):
+    score = (users[u_idx] * items[i_idx]).sum(dim=1)  # 엣지별 내적 (gather)
+    return F.mse_loss(score, target)
+
+
+def train_pointwise(model: LightGCN, A_hat, u_idx, i_idx, target, epochs:int=50, lr:float=1e-2,
+                    batch_size:int=0, val_frac:float=0.0, patience:int=5, seed:int=0):
+    """
+    pointwise 회귀(예측 점수 ~ 0~1 스케일 rating). 엣지별 loss를 gather + mse_loss 한 번으로 계산.
+    - batch_size > 0: 에폭마다 엣지를 섞어 미니배치마다 전파 + step (0이면 에폭당 full-batch 1 step)
+    - val_frac > 0 : 엣지 일부를 loss에서 빼 두고 검증 MSE가 patience 에폭 동안 안 좋아지면 중단,
+                     가장 좋았던 파라미터로 되돌림
+    반환: (model, history)
+    """
+    history = {"epochs": 0, "steps": 0, "train_loss": None, "val_loss": None,
+               "best_epoch": None, "stopped_early": False, "seconds": 0.0}
+    gen = torch.Generator().manual_seed(seed)
+    n = int(u_idx.numel())
+    if n == 0:
+        return model, history
+    val = None
+    if val_frac > 0 and n >= 10:
+        perm = torch.randperm(n, generator=gen)
+        n_val = max(1, int(n * val_frac))
+        v, t = perm[:n_val], perm[n_val:]
+        val = (u_idx[v], i_idx[v], target[v])
+        u_idx, i_idx, target = u_idx[t], i_idx[t], target[t]
+        n = int(u_idx.numel())
+
+    opt = torch.optim.Adam(model.parameters(), lr=lr)
+    best, best_state, bad = math.inf, None, 0
+    t0 = time.perf_counter()
+
+    for ep in range(epochs):
+        model.train()
+        if batch_size and batch_size < n:
+            order = torch.randperm(n, generator=gen)
+            batches = [order[s:s + batch_size] for s in range(0, n, batch_size)]
+        else:
+            batches = [None]
+
+        total = 0.0
+        for b in batches:
+            users, items = model(A_hat)
+            if b is None:
+                loss = _pointwise_loss(users, items, u_idx, i_idx, target)
+            else:
+                loss = _pointwise_loss(users, items, u_idx[b], i_idx[b], target[b])
+            opt.zero_grad()
+            loss.backward()
+            opt.step()
+            total += float(loss.detach()) * (n if b is None else int(b.numel()))
+            history["steps"] += 1
+        history["epochs"] = ep + 1
+        history["train_loss"] = total / max(1, n)
+
+        if val is not None:
+            model.eval()
+            with torch.no_grad():
+                users, items = model(A_hat)
+                vloss = float(_pointwise_loss(users, items, *val))
+            history["val_loss"] = vloss
+            if vloss < best - 1e-6:
+                best, bad = vloss, 0
+                best_state = {k: v.detach().clone() for k, v in model.state_dict().items()}
+                history["best_epoch"] = ep + 1
+            else:
+                bad += 1
+                if bad >= patience:
+                    history["stopped_early"] = True
+                    break
+
+    if best_state is not None:
+        model.load_state_dict(best_state)
+        history["val_loss"] = best
+    history["seconds"] = round(time.perf_counter() - t0, 3)
+    return model, history
+
+
+# ====== (3-b) BPR 학습 (negative sampling + 미니배치 부분 그래프 전파) ======
+@contextlib.contextmanager
+def thread_budget(n_threads: int = 0):
+    """학습 구간에서만 torch intra-op 스레드 수 제한 (0이면 그대로)"""
+    prev = torch.get_num_threads()
+    if n_threads and n_threads > 0:
+        torch.set_num_threads(n_threads)
+    try:
+        yield
+    finally:
+        torch.set_num_threads(prev)
+
+
+def to_scipy_csr(A_hat) -> sp.csr_matrix:
+    """torch CSR/COO 정규화 인접행렬 → scipy CSR (행 슬라이싱용)"""
+    if A_hat.layout == torch.sparse_csr:
+        return sp.csr_matrix((A_hat.values().numpy(), A_hat.col_indices().numpy(), A_hat.crow_indices().numpy()),
+                             shape=tuple(A_hat.shape))
+    A = A_hat.coalesce()
+    idx = A.indices().numpy()
+    return sp.csr_matrix((A.values().numpy(), (idx[0], idx[1])), shape=tuple(A.shape))
+
+
+def _torch_csr(A: sp.csr_matrix):
+    return torch.sparse_csr_tensor(torch.from_numpy(A.indptr.astype(np.int64)),
+                                   torch.from_numpy(A.indices.astype(np.int64)),
+                                   torch.from_numpy(A.data), size=A.shape)
+
+
+def _node_union(N, *parts):
+    mark = np.zeros(N, dtype=bool)
+    for p in parts:
+        mark[p] = True
+    return np.flatnonzero(mark)
+
+
+def propagate_subgraph(model: LightGCN, A: sp.csr_matrix, seeds: np.ndarray, A_full=None, full_frac: float = 0.5):
+    """
+    seeds(정렬된 노드 번호, item은 num_users 오프셋) 의 layer-mean 임베딩만 계산.
+    S_L = seeds, S_{k-1} = S_k ∪ 이웃(S_k) 로 필요한 노드만 모아 A[S_k, S_{k-1}] 로 전파 → 전체 전파와 같은 값.
+    부분 그래프가 전체의 full_frac 이상이면 슬라이싱이 오히려 비싸므로 A_full(torch) 전체 전파 후 seeds만 뽑는다.
+    """
+    N = A.shape[0]
+    sets = [seeds]
+    for _ in range(model.n_layers):
+        sets.append(_node_union(N, sets[-1], A[sets[-1]].indices))
+        if A_full is not None and sets[-1].size >= full_frac * N:
+            users, items = model(A_full)
+            return torch.cat([users, items], dim=0)[torch.from_numpy(seeds)]
+    sets.reverse()  # S_0 ⊇ S_1 ⊇ ... ⊇ S_L
+
+    s0 = sets[0]
+    k = int(np.searchsorted(s0, model.num_users))
+    x = torch.cat([model.user_emb(torch.from_numpy(s0[:k])),
+                   model.item_emb(torch.from_numpy(s0[k:] - model.num_users))], dim=0)
+    out = x[torch.from_numpy(np.searchsorted(s0, seeds))]
+    for prev, cur in zip(sets, sets[1:]):
+        sub = A[cur][:, prev]
+        x = sparse_mm(_torch_csr(sub), x, _torch_csr(sub.T.tocsr()))
+        out = out + x[torch.from_numpy(np.searchsorted(cur, seeds))]
+    return out / (model.n_layers + 1)
+
+
+def sample_negatives(u: np.ndarray, num_items: int, pos_keys: np.ndarray, rng, max_rounds: int = 5):
+    """
+    user별로 평가하지 않은 item을 균등 샘플 (벡터화). pos_keys: 정렬된 u*num_items+i.
+    max_rounds 번 다시 뽑아도 양성이면 그대로 둔다 (밀집 유저에서 무한 루프 방지).
+    """
+    neg = rng.integers(0, num_items, u.size)
+    for _ in range(max_rounds):
+        keys = u * num_items + neg
+        pos = np.searchsorted(pos_keys, keys)
+        hit = (pos < pos_keys.size) & (pos_keys[np.minimum(pos, pos_keys.size - 1)] == keys)
+        if not hit.any():
+            break
+        neg[hit] = rng.integers(0, num_items, int(hit.sum()))
+    return neg
+
+
+def train_bpr(model: LightGCN, A_hat, u_idx, i_idx, epochs:int=20, lr:float=1e-2, batch_size:int=2048,
+              reg:float=1e-4, seed:int=0, full_frac:float=0.5):
+    """
+    BPR: 관측 (user, item) 쌍마다 미관측 item 하나를 뽑아 -log σ(s_pos - s_neg) 최소화.
+    미니배치마다 배치 노드의 k-hop 부분 그래프만 전파한다 (부분 그래프가 full_frac 이상이면 전체 전파).
+    u_idx/i_idx: 학습 엣지 (torch 또는 NumPy). 반환: (model, history)
+    """
+    u_all = np.asarray(u_idx, dtype=np.int64)
+    i_all = np.asarray(i_idx, dtype=np.int64)
+    n = u_all.size
+    history = {"epochs": 0, "steps": 0, "train_loss": None, "seconds": 0.0, "sec_per_epoch": None}
+    if n == 0:
+        return model, history
+
+    A = A_hat if isinstance(A_hat, sp.csr_matrix) else to_scipy_csr(A_hat)
+    A_full = _torch_csr(A) if isinstance(A_hat, sp.csr_matrix) else A_hat
+    num_u, num_i = model.num_users, model.num_items
+    N = num_u + num_i
+    pos_keys = np.unique(u_all * num_i + i_all)
+    rng = np.random.default_rng(seed)
+    opt = torch.optim.Adam(model.parameters(), lr=lr)
+    t0 = time.perf_counter()
+
+    for ep in range(epochs):
+        model.train()
+        order = rng.permutation(n)
+        total = 0.0
+        for s in range(0, n, batch_size):
+            b = order[s:s + batch_size]
+            bu, bp = u_all[b], i_all[b]
+            bn = sample_negatives(bu, num_i, pos_keys, rng)
+
+            seeds = _node_union(N, bu, bp + num_u, bn + num_u)
+            emb = propagate_subgraph(model, A, seeds, A_full, full_frac)
+            eu = emb[torch.from_numpy(np.searchsorted(seeds, bu))]
+            ep_ = emb[torch.from_numpy(np.searchsorted(seeds, bp + num_u))]
+            en = emb[torch.from_numpy(np.searchsorted(seeds, bn + num_u))]
+            pos_s = (eu * ep_).sum(dim=1)
+            neg_s = (eu * en).sum(dim=1)
+            loss = -F.logsigmoid(pos_s - neg_s).mean()
+
+            if reg > 0:
+                # 정규화는 0층(ego) 임베딩 기준
+                ego = (model.user_emb.weight[torch.from_numpy(bu)].pow(2).sum()
+                       + model.item_emb.weight[torch.from_numpy(bp)].pow(2).sum()
+                       + model.item_emb.weight[torch.from_numpy(bn)].pow(2).sum())
+                loss = loss + reg * ego / (2 * b.size)
+
+            opt.zero_grad()
+            loss.backward()
+            opt.step()
+            total += float(loss.detach()) * b.size
+            history["steps"] += 1
+        history["epochs"] = ep + 1
+        history["train_loss"] = total / n
+
+    history["seconds"] = round(time.perf_counter() - t0, 3)
+    history["sec_per_epoch"] = round(history["seconds"] / max(1, history["epochs"]), 4)
+    return model, history
+
+
+# ====== (5) 오프라인 평가 ======
+def split_edges(n: int, test_frac: float = 0.2, seed: int = 0):
+    """엣지 인덱스를 학습/평가로 랜덤 분할"""
+    perm = np.random.default_rng(seed).permutation(n)
+    n_test = int(n * test_frac)
+    return np.sort(perm[n_test:]), np.sort(perm[:n_test])
+
+
+def recall_at_k(users_emb: np.ndarray, items_emb: np.ndarray, train_u, train_i, test_u, test_i,
+                ks=(10, 20), chunk: int = 1024) -> dict:
+    """
+    평가 엣지가 있는 user마다 학습 item을 제외한 전체 item 점수로 top-K → recall@K 평균.
+    """
+    num_u, num_i = users_emb.shape[0], items_emb.shape[0]
+    train_u, train_i = np.asarray(train_u), np.asarray(train_i)
+    test_u, test_i = np.asarray(test_u), np.asarray(test_i)
+    # 학습에도 있는 (user, item)은 맞힐 수 없으므로 정답에서 뺀다
+    fresh = ~np.isin(test_u * num_i + test_i, train_u * num_i + train_i)
+    test_u, test_i = test_u[fresh], test_i[fresh]
+    train = sp.csr_matrix((np.ones(len(train_u), dtype=bool), (train_u, train_i)), shape=(num_u, num_i))
+    test = sp.csr_matrix((np.ones(len(test_u), dtype=bool), (test_u, test_i)), shape=(num_u, num_i))
+    eval_users = np.flatnonzero(np.diff(test.indptr))
+    kmax = min(max(ks), num_i)
+    sums = dict.fromkeys(ks, 0.0)
+
+    for s in range(0, eval_users.size, chunk):
+        us = eval_users[s:s + chunk]
+        scores = users_emb[us] @ items_emb.T
+        seen = train[us]
+        scores[seen.nonzero()] = -np.inf
+        top = np.argpartition(-scores, kmax - 1, axis=1)[:, :kmax]
+        top = np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+        truth = test[us]
+        n_true = np.diff(truth.indptr)
+        for k in ks:
+            kk = min(k, kmax)
+            rows = np.repeat(np.arange(us.size), kk)
+            hits = np.asarray(truth[rows, top[:, :kk].ravel()]).reshape(us.size, kk).sum(axis=1)
+            sums[k] += float((hits / n_true).sum())
+    return {f"recall@{k}": round(sums[k] / max(1, eval_users.size), 4) for k in ks}
+
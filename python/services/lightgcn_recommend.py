@@ -0,0 +1,252 @@
+# services/lightgcn_recommend.py
+"""
+LightGCN 아이템 임베딩 위 top-K 추천.
+
+- exact: 모든 아이템 점수(블록 단위 행렬-벡터 곱) → np.argpartition 으로 K개만 고른 뒤 그 K개만 정렬
+- approx(IVF): 아이템을 k-means 로 nlist 개 리스트에 나눠 두고, 유저 벡터와 내적이 큰 중심 nprobe 개의
+  리스트만 채점. 아이템 수가 LIGHTGCN_ANN_MIN_ITEMS 이상일 때 auto 모드에서 사용 (버전별로 한 번 빌드)
+- 이미 평가한 아이템 제외, lat/lng + radius_km 지역 필터 (좌표 모르는 아이템은 필터 시 제외)
+- K별 최근 지연시간(p50/p95/max)을 RecommendStats 에 모음
+- fold-in: 학습 이후 들어온 유저는 평가한 아이템 임베딩을 LightGCN 전파 가중치
+  w_ui / sqrt(d_u * d_i) 로 합쳐 임베딩을 만들고 (uid, 아티팩트 버전) 단위로 TTL 캐시
+  (한 홉 전파 근사라 점수 크기는 학습된 유저와 다르지만, 유저 안에서의 순위는 그대로 쓸 수 있다)
+"""
+import os
+import math
+import time
+import threading
+from collections import deque
+
+import numpy as np
+
+ANN_MIN_ITEMS = int(os.getenv("LIGHTGCN_ANN_MIN_ITEMS", "50000"))
+ANN_NLIST = int(os.getenv("LIGHTGCN_ANN_NLIST", "0"))          # 0: sqrt(아이템 수)
+ANN_NPROBE = int(os.getenv("LIGHTGCN_ANN_NPROBE", "8"))
+MATVEC_BLOCK = 65536                                             # float16 번들을 float32로 올릴 때 임시 메모리 상한
+EARTH_KM = 6371.0088
+FOLDIN_TTL_S = float(os.getenv("LIGHTGCN_FOLDIN_TTL_S", "600"))
+FOLDIN_MAX_USERS = int(os.getenv("LIGHTGCN_FOLDIN_MAX_USERS", "10000"))
+# 평가 기록이 없던 유저(벡터 None)는 짧게만 기억: 첫 평가 직후 바로 점수를 받도록 (0: 저장 안 함)
+FOLDIN_EMPTY_TTL_S = float(os.getenv("LIGHTGCN_FOLDIN_EMPTY_TTL_S", "30"))
+
+
+# ---------- 기본 연산 ----------
+def matvec(M, u, rows=None, block=MATVEC_BLOCK):
+    """M[rows] @ u (float32). mmap/float16 행렬도 block 행씩만 올려서 계산"""
+    u = np.asarray(u, dtype=np.float32)
+    n = len(rows) if rows is not None else M.shape[0]
+    if M.dtype == np.float32 and rows is None:
+        return np.asarray(M) @ u
+    out = np.empty(n, dtype=np.float32)
+    for s in range(0, n, block):
+        part = M[rows[s:s + block]] if rows is not None else M[s:s + block]
+        out[s:s + block] = np.asarray(part, dtype=np.float32) @ u
+    return out
+
+
+def topk(scores, k):
+    """점수 상위 k개 위치 (내림차순). argpartition 으로 O(n) 선택 후 k개만 정렬"""
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n:
+        part = np.argpartition(-scores, k - 1)[:k]
+    else:
+        part = np.arange(n)
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+def within_radius(coords, lat, lng, radius_km):
+    """coords (I, 2) lat/lng → 반경 안 아이템 bool 마스크 (NaN 은 False)"""
+    pts = np.radians(np.asarray(coords, dtype=np.float64))
+    la0, ln0 = math.radians(lat), math.radians(lng)
+    a = (np.sin((pts[:, 0] - la0) / 2) ** 2
+         + math.cos(la0) * np.cos(pts[:, 0]) * np.sin((pts[:, 1] - ln0) / 2) ** 2)
+    with np.errstate(invalid="ignore"):
+        d = 2 * EARTH_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+        return d <= radius_km
+
+
+# ---------- IVF ----------
+class IVFIndex:
+    def __init__(self, items, nlist=0, iters=8, sample=100000, seed=0):
+        n = items.shape[0]
+        nlist = nlist or max(1, int(math.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        pick = rng.choice(n, size=min(n, max(sample, nlist * 40)), replace=False)
+        X = np.asarray(items[np.sort(pick)], dtype=np.float32)
+        C = X[rng.choice(len(X), size=nlist, replace=False)].copy()
+        for _ in range(iters):
+            assign = self._assign(X, C)
+            sums = np.zeros_like(C)
+            np.add.at(sums, assign, X)
+            cnt = np.bincount(assign, minlength=nlist)
+            nz = cnt > 0
+            C[nz] = sums[nz] / cnt[nz, None]
+        self.centroids = C
+
+        # 전체 아이템을 리스트별로 정렬해 두고 offsets 로 자름
+        assign = np.concatenate([self._assign(np.asarray(items[s:s + MATVEC_BLOCK], dtype=np.float32), C)
+                                 for s in range(0, n, MATVEC_BLOCK)])
+        self.order = np.argsort(assign, kind="stable")
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))])
+
+    @staticmethod
+    def _assign(X, C):
+        # argmin ||x - c||^2 = argmax (x·c - ||c||^2 / 2)
+        return np.argmax(X @ C.T - 0.5 * (C * C).sum(1), axis=1)
+
+    def candidates(self, u, nprobe):
+        lists = topk(self.centroids @ np.asarray(u, dtype=np.float32), nprobe)
+        return np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in lists])
+
+
+# ---------- 추천기 (아티팩트 버전당 하나) ----------
+class Recommender:
+    def __init__(self, art):
+        self.art = art
+        self.idx2item = [None] * art.items_emb.shape[0]
+        for name, i in art.item2idx.items():
+            self.idx2item[i] = name
+        self._ivf = None
+        self._ivf_lock = threading.Lock()
+
+    def ivf(self):
+        if self._ivf is None:
+            with self._ivf_lock:
+                if self._ivf is None:
+                    t0 = time.perf_counter()
+                    self._ivf = IVFIndex(self.art.items_emb, nlist=ANN_NLIST)
+                    print(f"[LGN] IVF built: items={self.art.items_emb.shape[0]} "
+                          f"nlist={len(self._ivf.centroids)} ({time.perf_counter() - t0:.2f}s)", flush=True)
+        return self._ivf
+
+    def recommend(self, uvec, k=20, exclude=None, region=None, mode="auto", nprobe=ANN_NPROBE):
+        """
+        uvec: 유저 임베딩, exclude: 제외할 아이템 행 번호, region: (lat, lng, radius_km)
+        → ([(name, score, lat, lng), ...], 실제 사용한 mode)
+        """
+        items = self.art.items_emb
+        coords = self.art.extras.get("item_coords")
+        n = items.shape[0]
+
+        rows = None                     # None: 전체 아이템
+        if region is not None:
+            if coords is None:
+                raise ValueError("item coordinates are not in this artifact version")
+            rows = np.flatnonzero(within_radius(coords, *region))
+            mode = "exact"              # 후보가 이미 좁혀졌으므로 그대로 채점
+        elif mode == "auto":
+            mode = "approx" if n >= ANN_MIN_ITEMS else "exact"
+        if mode == "approx":
+            rows = self.ivf().candidates(uvec, nprobe)
+
+        scores = matvec(items, uvec, rows)
+        if exclude is not None and len(exclude):
+            if rows is None:
+                scores[exclude] = -np.inf
+            else:
+                scores[np.isin(rows, exclude)] = -np.inf
+        pos = topk(scores, k)
+        pos = pos[np.isfinite(scores[pos])]
+        picked = pos if rows is None else rows[pos]
+
+        out = []
+        for i, s in zip(picked.tolist(), scores[pos].tolist()):
+            lat = lng = None
+            if coords is not None and not np.isnan(coords[i, 0]):
+                lat, lng = float(coords[i, 0]), float(coords[i, 1])
+            out.append((self.idx2item[i], s, lat, lng))
+        return out, mode
+
+
+class RecommendStats:
+    """K별 최근 지연시간 (ms)"""
+
+    def __init__(self, window=512):
+        self.window = window
+        self._lat = {}
+        self._lock = threading.Lock()
+
+    def record(self, k, mode, ms):
+        with self._lock:
+            self._lat.setdefault((k, mode), deque(maxlen=self.window)).append(ms)
+
+    def summary(self):
+        with self._lock:
+            items = [(key, np.asarray(v)) for key, v in self._lat.items()]
+        return [{"k": k, "mode": mode, "n": len(v),
+                 "p50_ms": round(float(np.percentile(v, 50)), 3),
+                 "p95_ms": round(float(np.percentile(v, 95)), 3),
+                 "max_ms": round(float(v.max()), 3)} for (k, mode), v in sorted(items)]
+
+
+# ---------- 신규 유저 fold-in ----------
+def fold_in(art, rated):
+    """
+    rated: [(item 행 번호, rating), ...] → (유저 벡터 float32, 사용한 아이템 행 번호).
+    가중치/차수는 학습 그래프(norm_adj_from_arrays)와 같은 규칙: w = 0.5~1.0, A_ui = w / sqrt(d_u * d_i)
+    """
+    if not rated:
+        return None, np.empty(0, dtype=np.int64)
+    # 같은 아이템을 여러 번 평가했으면 가중치를 더한다 (학습 그래프와 같음)
+    idx = np.fromiter((i for i, _ in rated), dtype=np.int64, count=len(rated))
+    r = np.fromiter((x for _, x in rated), dtype=np.float64, count=len(rated))
+    rmin, rmax = art.meta.get("rating_min"), art.meta.get("rating_max")
+    if rmin is not None and rmax is not None and rmax > rmin:
+        w = 0.5 + 0.5 * np.clip((r - rmin) / (rmax - rmin), 0.0, 1.0)
+    else:
+        w = np.ones_like(r)
+    items, inv = np.unique(idx, return_inverse=True)
+    w = np.bincount(inv, weights=w)
+
+    deg = art.extras.get("item_degree")
+    d_i = np.asarray(deg[items], dtype=np.float64) + w if deg is not None else w
+    d_u = w.sum()
+    a = w / np.sqrt(d_u * d_i)
+    vec = (np.asarray(art.items_emb[items], dtype=np.float32) * a[:, None].astype(np.float32)).sum(0)
+    return vec, items
+
+
+class FoldInCache:
+    """
+    uid → (아티팩트 버전, 만료 시각, 벡터, 평가 아이템). 버전이 바뀌면 자연히 다시 계산.
+    벡터가 None(평가 없음)인 결과는 empty_ttl 동안만 유지
+    """
+
+    def __init__(self, ttl=FOLDIN_TTL_S, max_users=FOLDIN_MAX_USERS, empty_ttl=FOLDIN_EMPTY_TTL_S):
+        self.ttl = ttl
+        self.empty_ttl = empty_ttl
+        self.max_users = max_users
+        self._d = {}
+        self._lock = threading.Lock()
+
+    def get(self, uid, version):
+        with self._lock:
+            hit = self._d.get(uid)
+            if hit is None or hit[0] != version or hit[1] < time.time():
+                return None
+            return hit[2], hit[3]
+
+    def put(self, uid, version, vec, items):
+        ttl = self.ttl if vec is not None else self.empty_ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            if len(self._d) >= self.max_users and uid not in self._d:
+                # 만료된 것부터, 그래도 많으면 가장 먼저 만료될 것 정리
+                now = time.time()
+                for k in [k for k, v in self._d.items() if v[1] < now]:
+                    del self._d[k]
+                if len(self._d) >= self.max_users:
+                    del self._d[min(self._d, key=lambda k: self._d[k][1])]
+            self._d[uid] = (version, time.time() + ttl, vec, items)
+
+    def invalidate(self, uid=None):
+        with self._lock:
+            if uid is None:
+                self._d.clear()
+            else:
+                self._d.pop(uid, None)
+
@@ -1,7 +1,8 @@
 import json
 from datetime import time, datetime, timedelta
 import requests
-from core.firebase import db
+
+from services.timeline import ScheduleItem, split_range, to_minutes, hhmm
 
 # ===== DEBUG 도우미 =====
 DEBUG = True
@@ -10,84 +11,50 @@ def _dbg(*args):
         print("[making_table]", *args, flush=True)
 
 def _fmt_time(t):
+    if isinstance(t, int):
+        return hhmm(t)
     try:
         return t.strftime("%H:%M")
     except Exception:
         return str(t)
 
-class ScheduleItem:
-    def __init__(self, title, start, end, place_type, location_info=None):
-        self.title = title
-        self.start = start
-        self.end = end
-        self.place_type = place_type
-        self.location_info = location_info
-    def __repr__(self):
-        return f"ScheduleItem(title={self.title!r}, { _fmt_time(self.start)}-{ _fmt_time(self.end)}, type={self.place_type})"
-
 def generate_empty_slots(time_table, day_start=time(9, 0), day_end=time(23, 59)):
     _dbg("generate_empty_slots: in_count=", len(time_table), "day_start=", _fmt_time(day_start), "day_end=", _fmt_time(day_end))
+    day_start, day_end = to_minutes(day_start), to_minutes(day_end)
 
-    def to_datetime(t):
-        return datetime.combine(datetime.today(), t)
-
-    sorted_table = sorted(time_table, key=lambda x: x.start)
+    sorted_table = sorted(time_table, key=lambda x: x.start_min)
     if sorted_table:
-        _dbg("generate_empty_slots: first=", _fmt_time(sorted_table[0].start), "last=", _fmt_time(sorted_table[-1].end))
+        _dbg("generate_empty_slots: first=", _fmt_time(sorted_table[0].start_min), "last=", _fmt_time(sorted_table[-1].end_min))
 
     empty_slots = []
 
     # Step 1
-    if not sorted_table or sorted_table[0].start > day_start:
-        _dbg("empty before first: ", _fmt_time(day_start), "→", _fmt_time(sorted_table[0].start if sorted_table else day_end))
-        empty_slots += split_empty_range(day_start, sorted_table[0].start if sorted_table else day_end)
+    if not sorted_table or sorted_table[0].start_min > day_start:
+        first = sorted_table[0].start_min if sorted_table else day_end
+        _dbg("empty before first: ", _fmt_time(day_start), "→", _fmt_time(first))
+        empty_slots += split_empty_range(day_start, first)
 
     # Step 2
     for i in range(len(sorted_table) - 1):
-        current_end = sorted_table[i].end
-        next_start = sorted_table[i + 1].start
+        current_end = sorted_table[i].end_min
+        next_start = sorted_table[i + 1].start_min
         if current_end < next_start:
             _dbg(f"gap between idx {i} and {i+1}:", _fmt_time(current_end), "→", _fmt_time(next_start))
             empty_slots += split_empty_range(current_end, next_start)
 
     # Step 3
-    if sorted_table and sorted_table[-1].end < day_end:
-        _dbg("empty after last: ", _fmt_time(sorted_table[-1].end), "→", _fmt_time(day_end))
-        empty_slots += split_empty_range(sorted_table[-1].end, day_end)
+    if sorted_table and sorted_table[-1].end_min < day_end:
+        _dbg("empty after last: ", _fmt_time(sorted_table[-1].end_min), "→", _fmt_time(day_end))
+        empty_slots += split_empty_range(sorted_table[-1].end_min, day_end)
 
     _dbg("generate_empty_slots: out_count=", len(empty_slots))
     return empty_slots
 
 def split_empty_range(start_time, end_time):
-    dt_start = datetime.combine(datetime.today(), start_time)
-    dt_end   = datetime.combine(datetime.today(), end_time)
-    gap_minutes = int((dt_end - dt_start).total_seconds() // 60)
-    _dbg("split_empty_range:", _fmt_time(start_time), "→", _fmt_time(end_time), "gap(min)=", gap_minutes)
-
-    # 디버그 가드: 음수/이상 gap
-    if gap_minutes < 0:
-        raise ValueError(f"[split_empty_range] end < start ({_fmt_time(start_time)} → {_fmt_time(end_time)})")
-
-    slots = []
-    if gap_minutes < 90:
-        return []  # 너무 짧으면 무시
-
-    elif gap_minutes < 120:
-        slots.append(ScheduleItem(None, start_time, end_time, None))
-    else:
-        dt_cursor = dt_start
-        while (dt_end - dt_cursor).total_seconds() >= 120 * 60:
-            dt_next = dt_cursor + timedelta(minutes=120)
-            slots.append(ScheduleItem(None, dt_cursor.time(), dt_next.time(), None))
-            dt_cursor = dt_next
-
-        remaining_minutes = int((dt_end - dt_cursor).total_seconds() // 60)
-        _dbg("split_empty_range: remaining=", remaining_minutes)
-        if 120 <= remaining_minutes <= 210:
-            slots.append(ScheduleItem(None, dt_cursor.time(), dt_end.time(), None))
-        elif remaining_minutes >= 90:
-            slots.append(ScheduleItem(None, dt_cursor.time(), dt_end.time(), None))
-
+    """start/end: datetime.time 또는 분(int). 실제 분할은 timeline.split_range"""
+    start_min, end_min = to_minutes(start_time), to_minutes(end_time)
+    _dbg("split_empty_range:", _fmt_time(start_min), "→", _fmt_time(end_min), "gap(min)=", end_min - start_min)
+    slots = split_range(start_min, end_min)
     _dbg("split_empty_range: made", len(slots), "slots")
     return slots
 
@@ -284,8 +251,8 @@ def insert_initial_schedule_items_dynamic(daily_tables, table_place_info):
         schedule = info["schedule"]
 
         # 빈 스케줄일 수 있으니 기본값 로그 출력
-        start_time = schedule[0].start if schedule else time(9, 0)
-        end_time   = schedule[-1].end if schedule else time(21, 0)
+        start_time = schedule[0].start_min if schedule else 9 * 60
+        end_time   = schedule[-1].end_min if schedule else 21 * 60
         _dbg(f"[{date}] before insert: schedule_len={len(schedule)} start={_fmt_time(start_time)} end={_fmt_time(end_time)} idx={idx}")
 
         items_to_insert = []
@@ -301,7 +268,7 @@ def insert_initial_schedule_items_dynamic(daily_tables, table_place_info):
                 raise ValueError("[insert_initial_schedule_items_dynamic] 숙소 name 접근 실패 (None)")
             title   = table_place_info["숙소"]["name"]
             loc_info= table_place_info["숙소"]
-        new_start = (datetime.combine(datetime.today(), start_time) - timedelta(hours=1)).time()
+        new_start = (start_time - 60) % (24 * 60)
         items_to_insert.append(ScheduleItem(title, new_start, start_time, "start" if idx==0 else "accommodation", loc_info))
 
         # 종료 후
@@ -321,7 +288,7 @@ def insert_initial_schedule_items_dynamic(daily_tables, table_place_info):
             title   = table_place_info["숙소"]["name"]
             loc_info= table_place_info["숙소"]
 
-        new_end = (datetime.combine(datetime.today(), end_time) + timedelta(hours=1)).time()
+        new_end = (end_time + 60) % (24 * 60)
         items_to_insert.append(ScheduleItem(title, end_time, new_end, "end" if idx == len(daily_tables) - 1 else "accommodation", loc_info))
 
         # 삽입
@@ -0,0 +1,228 @@
+# services/parallel_planner.py
+"""
+여러 날짜를 프로세스 풀에서 동시에 planning.
+날짜 사이의 유일한 결합은 '이미 쓴 장소'(in_timetable)이므로,
+먼저 장소를 날짜별로 겹치지 않게 나눠 준 뒤(숙소 근접 + 타입별 할당량) 각 날짜를 독립적으로 채운다.
+같은 풀에서 focus(base_mode)/trip 변형 여러 개를 동시에 planning 하는 plan_variants도 제공.
+
+풀 분할은 근사라 총점이 순차 planner와 같지 않다 (합성 벤치에서 ±10% 안팎, 날짜/장소가 적을수록 손해가 잦음).
+그래서 계획할 날짜가 하나뿐이거나 남은 장소가 PLANNER_PARALLEL_MIN_PLACES 미만이면 순차 planner로 넘긴다.
+"""
+import os
+import math
+import atexit
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from services.planner_stats import PlannerStats
+from services.dqn_table_making import (
+    PlannerContext,
+    ALL_TYPES,
+    _fill_day,
+    _has_coords,
+    _distance_cached,
+    dqn_fill_schedule,
+    _reseed_in_timetable,
+    load_planner_context,
+)
+
+PLANNER_WORKERS = int(os.getenv("PLANNER_WORKERS", "0")) or (os.cpu_count() or 1)
+# 이보다 장소가 적으면 분할 이득(속도)보다 점수 손해가 커서 순차 planner 사용
+PLANNER_PARALLEL_MIN_PLACES = int(os.getenv("PLANNER_PARALLEL_MIN_PLACES", "100"))
+ANCHOR_TYPES = ("start", "end", "accommodation")
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """
+    forkserver 로 워커를 띄운다. uvicorn 프로세스는 스레드풀/gRPC(Firestore)/스냅샷 리스너 스레드가 있어서
+    그대로 fork 하면 fork 시점에 잡혀 있던 락 때문에 자식이 멈출 수 있다.
+    서버 프로세스에는 __main__ 대신 이 모듈만 미리 올린다 (Firebase 초기화 없이 planner 코드만)
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            mp = multiprocessing.get_context("forkserver")
+            mp.set_forkserver_preload(["services.parallel_planner"])
+            _executor = ProcessPoolExecutor(max_workers=PLANNER_WORKERS, mp_context=mp)
+            atexit.register(_executor.shutdown, wait=False)
+        return _executor
+
+
+def _day_anchor(schedule, fallback):
+    """그날 숙소/시작/종료 슬롯 좌표의 평균 (없으면 fallback)"""
+    pts = [s.location_info for s in schedule if s.place_type in ANCHOR_TYPES and _has_coords(s.location_info)]
+    if not pts:
+        return fallback
+    return {
+        "lat": sum(p["lat"] for p in pts) / len(pts),
+        "lng": sum(p["lng"] for p in pts) / len(pts),
+    }
+
+
+def _sq_dist(a, b):
+    return (a["lat"] - b["lat"]) ** 2 + (a["lng"] - b["lng"]) ** 2
+
+
+def allocate_day_pools(all_places, tables):
+    """
+    아직 쓰이지 않은 장소를 날짜별로 겹치지 않게 분배.
+    타입마다 날짜를 돌아가며(round-robin) 각 날짜 앵커에 가장 가까운 장소를 하나씩 가져가되,
+    한 날짜가 한 타입에서 가져갈 수 있는 수는 min(그날 빈 슬롯 수, ceil(타입 장소 수 / 날짜 수)).
+    """
+    dates = list(tables.keys())
+    pools = {d: [] for d in dates}
+    free = [p for p in all_places if not p.get("in_timetable") and _has_coords(p)]
+    if not dates or not free:
+        return pools
+
+    center = {
+        "lat": sum(p["lat"] for p in free) / len(free),
+        "lng": sum(p["lng"] for p in free) / len(free),
+    }
+    anchors = {d: _day_anchor(tables[d]["schedule"], center) for d in dates}
+    empties = {d: sum(1 for s in tables[d]["schedule"] if s.title is None) for d in dates}
+
+    by_type = {}
+    for p in free:
+        by_type.setdefault(p.get("type"), []).append(p)
+
+    for ptype in list(ALL_TYPES) + [t for t in by_type if t not in ALL_TYPES]:
+        remaining = by_type.get(ptype)
+        if not remaining:
+            continue
+        quota = math.ceil(len(remaining) / len(dates))
+        taken = dict.fromkeys(dates, 0)          # 이 타입에서 날짜별로 가져간 수
+        for _ in range(quota):
+            for d in dates:
+                if not remaining:
+                    break
+                if taken[d] >= empties[d]:
+                    continue
+                anchor = anchors[d]
+                j = min(range(len(remaining)), key=lambda k: _sq_dist(remaining[k], anchor))
+                pools[d].append(remaining.pop(j))
+                taken[d] += 1
+    return pools
+
+
+def _plan_day_worker(user_id, title, base_mode, ranges, params, date_str, schedule, pool, depth,
+                     future_mode="lookahead", collect_stats=False):
+    """
+    프로세스 풀에서 하루치를 채우고 ([(index, title, type, location_info)], 계측 export 또는 None)을 돌려준다.
+    collect_stats: 부모 ctx.stats 가 있을 때만 (워커 ctx 는 새로 만들어지므로 여기서 따로 집계)
+    """
+    ctx = PlannerContext(user_id, title, base_mode, pool, ranges, params)
+    stats = PlannerStats().attach(ctx) if collect_stats else None
+    before = [s.title is None for s in schedule]
+    _fill_day(ctx, date_str, schedule, depth=depth, future_mode=future_mode)
+    filled = [
+        (i, s.title, s.place_type, s.location_info)
+        for i, s in enumerate(schedule)
+        if before[i] and s.title is not None
+    ]
+    return filled, (stats.export() if stats is not None else None)
+
+
+def dqn_fill_schedule_parallel(user_id, title, tables, base_mode="명소 중심", ctx=None, depth=3, max_workers=None,
+                               future_mode="lookahead"):
+    """
+    날짜별 장소 풀을 나눈 뒤 날짜마다 별도 프로세스에서 _fill_day 실행, 결과를 원래 슬롯에 병합.
+    작은 입력(날짜 1개 / 장소 PLANNER_PARALLEL_MIN_PLACES 미만)은 dqn_fill_schedule 그대로
+    """
+    if ctx is None:
+        ctx = load_planner_context(user_id, title, tables, base_mode)
+    if ctx is None:
+        print("[DQN] 장소 데이터 없음")
+        return tables
+
+    dates = [d for d in tables if any(s.title is None for s in tables[d]["schedule"])]
+    n_free = sum(1 for p in ctx.all_places if not p.get("in_timetable"))
+    if len(dates) <= 1 or n_free < PLANNER_PARALLEL_MIN_PLACES:
+        print(f"[DQN parallel] days={len(dates)} places={n_free} → sequential")
+        return dqn_fill_schedule(user_id, title, tables, base_mode, ctx=ctx, future_mode=future_mode)
+
+    pools = allocate_day_pools(ctx.all_places, tables)
+    workers = min(len(dates), max_workers or PLANNER_WORKERS)
+    collect = ctx.stats is not None
+
+    if workers <= 1:
+        # 병렬 이득이 없으면 같은 풀 분할로 순차 실행
+        results = {
+            d: _plan_day_worker(user_id, title, base_mode, ctx.ranges, ctx.params, d,
+                                tables[d]["schedule"], pools[d], depth, future_mode, collect)
+            for d in dates
+        }
+    else:
+        ex = _get_executor()
+        futures = {
+            d: ex.submit(_plan_day_worker, user_id, title, base_mode, ctx.ranges, ctx.params, d,
+                         tables[d]["schedule"], pools[d], depth, future_mode, collect)
+            for d in dates
+        }
+        results = {d: f.result() for d, f in futures.items()}
+
+    for tid, (d, (filled, worker_stats)) in enumerate(results.items(), start=2):
+        if worker_stats is not None:
+            ctx.stats.merge(worker_stats, tid=tid)
+        schedule = tables[d]["schedule"]
+        for i, name, ptype, loc in filled:
+            slot = schedule[i]
+            slot.title = name
+            slot.place_type = ptype
+            slot.location_info = loc
+
+    _reseed_in_timetable(ctx, tables)
+    print(f"[DQN parallel] days={len(dates)} workers={max(workers, 1)} "
+          f"pool_sizes={[len(pools[d]) for d in dates]}")
+    return tables
+
+
+# ---------- 변형(focus / trip) 동시 planning ----------
+def warm_distance_cache(ctx, tables):
+    """각 날짜 앵커(시작/숙소/종료) → 장소 거리를 미리 채운다 (같은 trip 변형들이 이 캐시를 공유)"""
+    anchors = {}
+    for info in tables.values():
+        for s in info["schedule"]:
+            if s.place_type in ANCHOR_TYPES and _has_coords(s.location_info):
+                loc = s.location_info
+                anchors[(loc["lat"], loc["lng"])] = loc
+    for loc in anchors.values():
+        for p in ctx.all_places:
+            if _has_coords(p):
+                _distance_cached(loc, p, ctx.dist_cache)
+    return ctx.dist_cache
+
+
+def _plan_variant_worker(user_id, title, base_mode, places, ranges, params, tables, dist_seed, future_mode):
+    """프로세스 풀에서 변형 하나를 dqn_fill_schedule로 채워 tables를 돌려준다"""
+    ctx = PlannerContext(user_id, title, base_mode, places, ranges, params)
+    ctx.dist_cache = dist_seed
+    return dqn_fill_schedule(user_id, title, tables, base_mode, ctx=ctx, future_mode=future_mode)
+
+
+def plan_variants(jobs, max_workers=None):
+    """
+    jobs: [(ctx, tables, future_mode)] → 같은 순서의 채워진 tables 목록.
+    변형끼리는 장소 사용 상태를 공유하지 않으므로 그대로 병렬 실행 가능.
+    프로세스 풀에서는 각 ctx의 장소/거리 캐시 사본으로 돌고, 결과 tables는 새 객체다.
+    """
+    workers = min(len(jobs), max_workers or PLANNER_WORKERS)
+    if workers <= 1:
+        return [dqn_fill_schedule(ctx.user_id, ctx.title, tables, ctx.base_mode, ctx=ctx, future_mode=fm)
+                for ctx, tables, fm in jobs]
+
+    ex = _get_executor()
+    futures = [
+        ex.submit(_plan_variant_worker, ctx.user_id, ctx.title, ctx.base_mode, ctx.all_places, ctx.ranges,
+                  ctx.params, tables, dict(ctx.dist_cache), fm)
+        for ctx, tables, fm in jobs
+    ]
+    results = [f.result() for f in futures]
+    for (ctx, _, _), tables in zip(jobs, results):
+        _reseed_in_timetable(ctx, tables)
+    print(f"[DQN variants] jobs={len(jobs)} workers={workers}")
+    return results
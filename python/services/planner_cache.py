@@ -0,0 +1,142 @@
+# services/planner_cache.py
+"""
+planner 입력(정규화된 장소, 점수 범위, user_params)을 (uid, title) 별로 메모리에 캐시.
+- 장소 저장(save_places_to_firestore) / 가중치 갱신(update_from_log 등) 시 명시적으로 무효화
+- PLANNER_CACHE_LISTEN=1 이면 Firestore 리스너로 다른 프로세스의 쓰기도 감지해 무효화
+- 무효화할 때마다 trip/유저 버전을 올려서 결과 캐시(planner_results) 키가 자연히 바뀌게 한다
+- LRU/TTL 로 항목을 버릴 때도 trip 버전을 올린다: 리스너가 닫힌 뒤의 쓰기는 버전에 반영되지 않으므로
+  그 전에 만든 결과를 다시 쓰지 않도록 (다시 로드하면 리스너도 다시 붙는다)
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+
+PLANNER_CACHE_MAX = int(os.getenv("PLANNER_CACHE_MAX", "128"))
+PLANNER_CACHE_TTL = int(os.getenv("PLANNER_CACHE_TTL", "3600"))
+PLANNER_CACHE_LISTEN = os.getenv("PLANNER_CACHE_LISTEN", "0") == "1"
+
+
+class _Entry:
+    __slots__ = ("places", "ranges", "params", "loaded_at", "watches")
+
+    def __init__(self, places, ranges, params):
+        self.places = places
+        self.ranges = ranges
+        self.params = params
+        self.loaded_at = time.time()
+        self.watches = []
+
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+_trip_versions = {}   # (uid, title) -> 장소 버전
+_user_versions = {}   # uid -> user_params 버전
+
+
+def _close_watches(entry):
+    for w in entry.watches:
+        try:
+            w.unsubscribe()
+        except Exception:
+            pass
+    entry.watches = []
+
+
+def _drop_locked(key, entry):
+    """항목 제거 공통: 리스너를 닫고 trip 버전을 올려 그 trip 의 결과 캐시 키를 무효화"""
+    _close_watches(entry)
+    _trip_versions[key] = _trip_versions.get(key, 0) + 1
+
+
+def _pop_locked(key):
+    entry = _cache.pop(key, None)
+    if entry is not None:
+        _drop_locked(key, entry)
+
+
+def _watch(key, uid, title):
+    """장소 컬렉션 / user_params 문서에 리스너를 걸어 변경 시 무효화 (첫 스냅샷은 무시)"""
+    watches = []
+
+    def _make_cb():
+        first = {"seen": False}
+
+        def _cb(*_args):
+            if not first["seen"]:
+                first["seen"] = True
+                return
+            invalidate_trip(uid, title)
+        return _cb
+
+    try:
+        from core.firebase import db
+        places_col = (
+            db.collection("user_trips").document(uid)
+              .collection("trips").document(title)
+              .collection("places")
+        )
+        watches.append(places_col.on_snapshot(_make_cb()))
+        watches.append(db.collection("user_params").document(uid).on_snapshot(_make_cb()))
+    except Exception as e:
+        print(f"[planner_cache] listener attach failed for {key}: {e}")
+    return watches
+
+
+def get_or_load(uid, title, loader):
+    """
+    캐시된 (places, ranges, params)를 돌려준다. 없거나 만료면 loader(uid, title)로 채움.
+    places는 요청마다 in_timetable 등을 바꾸므로 얕은 복사본을 준다. loader가 places=[]면 캐시하지 않음.
+    """
+    key = (uid, title)
+    now = time.time()
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None and now - entry.loaded_at > PLANNER_CACHE_TTL:
+            _pop_locked(key)
+            entry = None
+        if entry is not None:
+            _cache.move_to_end(key)
+
+    if entry is None:
+        places, ranges, params = loader(uid, title)
+        if not places:
+            return places, ranges, params
+        entry = _Entry(places, ranges, params)
+        if PLANNER_CACHE_LISTEN:
+            entry.watches = _watch(key, uid, title)
+        with _lock:
+            _pop_locked(key)
+            _cache[key] = entry
+            while len(_cache) > PLANNER_CACHE_MAX:
+                _drop_locked(*_cache.popitem(last=False))
+
+    return [dict(p) for p in entry.places], entry.ranges, dict(entry.params)
+
+
+def versions(uid, title):
+    """(장소 버전, user_params 버전) — 이 프로세스에서 무효화된 횟수"""
+    with _lock:
+        return _trip_versions.get((uid, title), 0), _user_versions.get(uid, 0)
+
+
+def invalidate_trip(uid, title):
+    with _lock:
+        if (uid, title) in _cache:
+            _pop_locked((uid, title))
+        else:
+            _trip_versions[(uid, title)] = _trip_versions.get((uid, title), 0) + 1
+
+
+def invalidate_user(uid):
+    """user_params가 바뀌면 그 유저의 모든 trip 캐시를 버린다"""
+    with _lock:
+        for key in [k for k in _cache if k[0] == uid]:
+            _pop_locked(key)
+        _user_versions[uid] = _user_versions.get(uid, 0) + 1
+
+
+def clear():
+    with _lock:
+        for key in list(_cache):
+            _pop_locked(key)
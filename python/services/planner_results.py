@@ -0,0 +1,93 @@
+# services/planner_results.py
+"""
+/routes/prepare_dqn 결과 캐시.
+같은 입력(요청 본문 + 장소/가중치 버전)이면 planner를 다시 돌리지 않고 저장된 응답을 돌려준다.
+재계획용 세션은 만료됐을 수 있으므로 내부 테이블 사본도 함께 두고 hit 때 새 세션을 만든다.
+
+버전은 planner_cache 의 프로세스 내 무효화 횟수라서, 다른 워커/레플리카의 쓰기는 리스너
+(PLANNER_CACHE_LISTEN=1)가 있어야 반영된다. 그래서 PLANNER_RESULT_CACHE:
+  auto(기본) — 리스너가 켜져 있을 때만 사용 / 1 — 항상 (단일 프로세스 배포) / 0 — 끔
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+RESULT_CACHE_MAX = int(os.getenv("PLANNER_RESULT_CACHE_MAX", "256"))
+RESULT_CACHE_TTL = int(os.getenv("PLANNER_RESULT_CACHE_TTL", "600"))
+RESULT_CACHE_MB = float(os.getenv("PLANNER_RESULT_CACHE_MB", "64"))
+RESULT_CACHE_MODE = os.getenv("PLANNER_RESULT_CACHE", "auto")   # "auto" | "1" | "0"
+
+
+def enabled() -> bool:
+    if RESULT_CACHE_MODE == "auto":
+        from services.planner_cache import PLANNER_CACHE_LISTEN
+        return PLANNER_CACHE_LISTEN
+    return RESULT_CACHE_MODE == "1"
+
+
+class _Entry:
+    __slots__ = ("resp", "plans", "size", "stored_at")
+
+    def __init__(self, resp, plans, size):
+        self.resp = resp          # 직렬화된 응답 (tables/timeline 등, plan_id 제외)
+        self.plans = plans        # [(base_mode, 내부 tables 사본, planner 소유 슬롯 (date, index) 목록)]
+        self.size = size          # 응답 JSON 바이트 수 (메모리 상한 계산용 근사치)
+        self.stored_at = time.time()
+
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+_bytes = 0
+
+
+def fingerprint(payload: dict, places_version, params_version) -> str:
+    """요청 본문(정렬된 JSON)과 장소/가중치 버전의 sha256"""
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    h = hashlib.sha256(raw.encode("utf-8"))
+    h.update(f"|places={places_version}|params={params_version}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _pop_locked(key):
+    global _bytes
+    entry = _cache.pop(key, None)
+    if entry is not None:
+        _bytes -= entry.size
+    return entry
+
+
+def get(key):
+    now = time.time()
+    with _lock:
+        entry = _cache.get(key)
+        if entry is None:
+            return None
+        if now - entry.stored_at > RESULT_CACHE_TTL:
+            _pop_locked(key)
+            return None
+        _cache.move_to_end(key)
+        return entry
+
+
+def put(key, resp, plans):
+    global _bytes
+    size = len(json.dumps(resp, ensure_ascii=False, default=str).encode("utf-8"))
+    limit = int(RESULT_CACHE_MB * 1024 * 1024)
+    if size > limit:
+        return
+    with _lock:
+        _pop_locked(key)
+        _cache[key] = _Entry(resp, plans, size)
+        _bytes += size
+        while _cache and (len(_cache) > RESULT_CACHE_MAX or _bytes > limit):
+            _pop_locked(next(iter(_cache)))
+
+
+def clear():
+    global _bytes
+    with _lock:
+        _cache.clear()
+        _bytes = 0
@@ -0,0 +1,63 @@
+# services/planner_session.py
+"""
+/routes/prepare_dqn 결과를 프로세스 메모리에 잠시 보관해서
+/routes/replan_dqn 이 장소 재로딩/테이블 재생성 없이 바뀐 슬롯만 다시 채우게 한다.
+"""
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+SESSION_TTL_SEC = int(os.getenv("PLANNER_SESSION_TTL", "1800"))
+MAX_SESSIONS = int(os.getenv("PLANNER_SESSION_MAX", "64"))
+
+
+class PlannerSession:
+    __slots__ = ("plan_id", "ctx", "tables", "owned", "touched_at", "lock")
+
+    def __init__(self, plan_id, ctx, tables, owned):
+        self.plan_id = plan_id
+        self.ctx = ctx            # PlannerContext (장소/가중치/후보·거리 캐시)
+        self.tables = tables      # 마지막으로 응답한 내부 테이블
+        self.owned = owned        # planner가 채운 슬롯 객체 집합
+        self.touched_at = time.time()
+        self.lock = threading.Lock()
+
+
+_sessions = OrderedDict()
+_lock = threading.Lock()
+
+
+def _evict_locked(now):
+    expired = [pid for pid, s in _sessions.items() if now - s.touched_at > SESSION_TTL_SEC]
+    for pid in expired:
+        del _sessions[pid]
+    while len(_sessions) > MAX_SESSIONS:
+        _sessions.popitem(last=False)
+
+
+def save_session(ctx, tables, owned) -> str:
+    plan_id = uuid.uuid4().hex
+    session = PlannerSession(plan_id, ctx, tables, owned)
+    with _lock:
+        _sessions[plan_id] = session
+        _evict_locked(session.touched_at)
+    return plan_id
+
+
+def get_session(plan_id: str):
+    now = time.time()
+    with _lock:
+        _evict_locked(now)
+        session = _sessions.get(plan_id)
+        if session is None:
+            return None
+        session.touched_at = now
+        _sessions.move_to_end(plan_id)
+        return session
+
+
+def drop_session(plan_id: str):
+    with _lock:
+        _sessions.pop(plan_id, None)
@@ -0,0 +1,132 @@
+# services/planner_stats.py
+"""
+planner 탐색 계측: 슬롯별 후보 수, lookahead 노드 수, 후보/거리 캐시 hit, 소요 시간.
+ctx.stats 에 PlannerStats를 달았을 때만 집계한다 (None이면 hot loop 비용 없음).
+"""
+import json
+import time
+
+from services.timeline import hhmm
+
+
+class CountingCache(dict):
+    """dict.get 호출마다 hit/miss를 stats의 현재 슬롯에 기록하는 캐시"""
+
+    def __init__(self, stats, kind, data=None):
+        super().__init__(data or {})
+        self._stats = stats
+        self._kind = kind
+
+    def get(self, key, default=None):
+        v = super().get(key, default)
+        self._stats.count(f"{self._kind}_hits" if v is not None else f"{self._kind}_misses")
+        return v
+
+
+SLOT_COUNTERS = ("candidates", "evaluated", "nodes", "cand_hits", "cand_misses", "dist_hits", "dist_misses")
+
+
+class PlannerStats:
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.slots = []
+        self._cur = None
+        self._global = dict.fromkeys(SLOT_COUNTERS, 0)
+
+    # ----- 수집 -----
+    def attach(self, ctx):
+        """ctx의 캐시를 계측용 캐시로 바꿔 끼우고 ctx.stats 연결"""
+        if not isinstance(ctx.dist_cache, CountingCache):
+            ctx.dist_cache = CountingCache(self, "dist", ctx.dist_cache)
+        if not isinstance(ctx.cand_cache, CountingCache):
+            ctx.cand_cache = CountingCache(self, "cand", ctx.cand_cache)
+        ctx.dist_cache._stats = self
+        ctx.cand_cache._stats = self
+        ctx.stats = self
+        return self
+
+    @staticmethod
+    def detach(ctx):
+        """계측 종료: 캐시 내용은 유지한 채 일반 dict로 되돌림 (세션에 남는 ctx용)"""
+        if isinstance(ctx.dist_cache, CountingCache):
+            ctx.dist_cache = dict(ctx.dist_cache)
+        if isinstance(ctx.cand_cache, CountingCache):
+            ctx.cand_cache = dict(ctx.cand_cache)
+        ctx.stats = None
+
+    def begin_slot(self, date_str, idx, slot, phase="fill"):
+        self._cur = {
+            "date": date_str,
+            "idx": idx,
+            "start": hhmm(slot.start_min),
+            "end": hhmm(slot.end_min),
+            "phase": phase,
+            **dict.fromkeys(SLOT_COUNTERS, 0),
+            "chosen": None,
+            "_t": time.perf_counter(),
+        }
+
+    def end_slot(self, chosen=None):
+        cur = self._cur
+        if cur is None:
+            return
+        t = cur.pop("_t")
+        cur["ts_ms"] = round((t - self.t0) * 1000.0, 3)
+        cur["ms"] = round((time.perf_counter() - t) * 1000.0, 3)
+        cur["chosen"] = chosen
+        self.slots.append(cur)
+        self._cur = None
+
+    def count(self, key, n=1):
+        if self._cur is not None:
+            self._cur[key] += n
+        else:
+            self._global[key] += n
+
+    # ----- 프로세스 간 합치기 (parallel_days 워커) -----
+    def export(self):
+        """피클 가능한 원본 (워커 → 부모)"""
+        return {"slots": self.slots, "global": self._global, "t0": self.t0}
+
+    def merge(self, data, tid=1):
+        """다른 PlannerStats.export() 결과를 합침. tid: chrome trace 에서 워커별 줄"""
+        # perf_counter 는 같은 머신의 프로세스끼리 기준이 같으므로 워커 시작 시각만큼 밀어 준다
+        shift = round((data["t0"] - self.t0) * 1000.0, 3)
+        for s in data["slots"]:
+            self.slots.append(dict(s, tid=tid, ts_ms=s["ts_ms"] + shift))
+        for k, v in data["global"].items():
+            self._global[k] += v
+
+    # ----- 출력 -----
+    def totals(self):
+        out = dict(self._global)
+        for s in self.slots:
+            for k in SLOT_COUNTERS:
+                out[k] += s[k]
+        out["slots"] = len(self.slots)
+        out["ms"] = round((time.perf_counter() - self.t0) * 1000.0, 3)
+        return out
+
+    def to_dict(self):
+        return {"totals": self.totals(), "slots": self.slots}
+
+    def to_chrome_trace(self, name="planner"):
+        """chrome://tracing / Perfetto 용 Trace Event Format (X 이벤트, µs 단위)"""
+        totals = self.totals()
+        events = [{
+            "name": name, "cat": "planner", "ph": "X", "pid": 1, "tid": 1,
+            "ts": 0, "dur": int(totals["ms"] * 1000), "args": totals,
+        }]
+        for s in self.slots:
+            events.append({
+                "name": f"{s['date']} {s['start']}-{s['end']}",
+                "cat": s["phase"], "ph": "X", "pid": 1, "tid": s.get("tid", 1),
+                "ts": int(s["ts_ms"] * 1000), "dur": max(1, int(s["ms"] * 1000)),
+                "args": {k: s[k] for k in SLOT_COUNTERS + ("chosen",)},
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path, name="planner"):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome_trace(name), f, ensure_ascii=False)
+        return path
@@ -0,0 +1,173 @@
+# services/route_optimizer.py
+"""
+채워진 일정의 하루 방문 순서 후처리 (2-opt / Or-opt).
+planner가 채운 슬롯끼리만 장소를 맞바꾸고(시간표/고정 슬롯은 그대로),
+영업시간과 타입 제약(식사/카페 간격)을 지키는 이동만 받아들인다.
+거리는 하루 좌표로 한 번 만든 haversine 행렬(km)을 쓰고, 2-opt 이득은 행렬 연산으로 한 번에 계산한다.
+"""
+import time
+
+import numpy as np
+
+from services.dqn_table_making import _day_respects_rules, _has_coords, is_place_open_during_slot
+
+EARTH_KM = 6371.0088
+
+
+def distance_matrix_km(coords):
+    """coords: [(lat, lng), ...] → (n, n) haversine 거리 행렬 (좌표가 없으면 (0, 0))"""
+    pts = np.radians(np.asarray(coords, dtype=float).reshape(-1, 2))
+    lat, lng = pts[:, 0], pts[:, 1]
+    dlat = lat[:, None] - lat[None, :]
+    dlng = lng[:, None] - lng[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _route_km(D, order):
+    return float(D[order[:-1], order[1:]].sum()) if len(order) > 1 else 0.0
+
+
+class _DayRoute:
+    """하루의 좌표 있는 슬롯 순서(route)와 planner 소유 구간(run) 정보"""
+
+    def __init__(self, ctx, date_str, schedule, owned):
+        self.ctx = ctx
+        self.date_str = date_str
+        self.schedule = schedule
+        self.route = [i for i, s in enumerate(schedule) if _has_coords(s.location_info)]
+        self.items = [(schedule[i].title, schedule[i].place_type, schedule[i].location_info) for i in self.route]
+        self.D = distance_matrix_km([(loc["lat"], loc["lng"]) for _, _, loc in self.items])
+        self.movable_idx = {i for i in self.route if schedule[i] in owned}
+
+        # run id: 연속된 planner 소유 위치끼리 같은 값, 고정 위치는 -1
+        self.run = np.full(len(self.route), -1)
+        rid = 0
+        for k, i in enumerate(self.route):
+            if i in self.movable_idx:
+                self.run[k] = rid
+            else:
+                rid += 1
+        self._open = {}
+
+    def _is_open(self, m, k):
+        key = (m, k)
+        ok = self._open.get(key)
+        if ok is None:
+            title = self.items[m][0]
+            place = self.ctx.by_name.get(title)
+            slot = self.schedule[self.route[k]]
+            ok = place is None or is_place_open_during_slot(place, self.date_str, slot.start_min, slot.end_min)
+            self._open[key] = ok
+        return ok
+
+    def write(self, order):
+        for k, m in enumerate(order):
+            slot = self.schedule[self.route[k]]
+            slot.title, slot.place_type, slot.location_info = self.items[m]
+
+    def feasible(self, order):
+        """영업시간 확인 후 실제로 써 보고 타입 제약 확인 (실패하면 호출자가 되돌림)"""
+        for k, m in enumerate(order):
+            if m != k and not self._is_open(m, k):
+                return False
+        self.write(order)
+        return _day_respects_rules(self.schedule, self.ctx.base_mode, self.movable_idx, -1)
+
+
+def _two_opt_deltas(D, order, run):
+    """모든 (i, j) 구간 뒤집기의 거리 변화량. 같은 run 안의 1 ≤ i < j ≤ n-2 만 유효, 나머지는 inf"""
+    a = np.asarray(order)
+    prev, cur, nxt = a[:-2], a[1:-1], a[2:]
+    delta = (D[prev[:, None], cur[None, :]] + D[cur[:, None], nxt[None, :]]
+             - D[prev, cur][:, None] - D[cur, nxt][None, :])
+    r = run[1:-1]
+    valid = (r[:, None] == r[None, :]) & (r[:, None] >= 0) & np.triu(np.ones_like(delta, dtype=bool), 1)
+    return np.where(valid, delta, np.inf)
+
+
+def _or_opt_moves(D, order, run, max_block=3):
+    """같은 run 안에서 길이 1~max_block 블록을 다른 위치로 옮기는 이동 (이득 순)"""
+    n = len(order)
+    base = _route_km(D, order)
+    moves = []
+    for size in range(1, max_block + 1):
+        for i in range(0, n - size + 1):
+            if run[i] < 0 or any(run[i + t] != run[i] for t in range(size)):
+                continue
+            block = order[i:i + size]
+            rest = order[:i] + order[i + size:]
+            for k in range(len(rest) + 1):
+                # 밀려나는 위치가 모두 같은 run이어야 고정 슬롯이 제자리에 남는다
+                lo, hi = min(i, k), max(i, k) + size - 1
+                if k == i or hi >= n or any(run[t] != run[i] for t in range(lo, hi + 1)):
+                    continue
+                cand = rest[:k] + block + rest[k:]
+                d = _route_km(D, cand) - base
+                if d < -1e-9:
+                    moves.append((d, cand))
+    moves.sort(key=lambda x: x[0])
+    return moves
+
+
+def optimize_day_routes(ctx, tables, owned, time_budget_ms=50):
+    """
+    tables의 각 날짜에서 owned(planner가 채운 슬롯)끼리 방문 순서를 바꿔 이동 거리를 줄인다.
+    time_budget_ms: 요청 전체 상한. 반환: 리포트 (km 단위 전/후 거리, 적용한 이동 수)
+    """
+    t0 = time.perf_counter()
+    deadline = t0 + max(0, time_budget_ms) / 1000.0
+    report = {"budget_ms": time_budget_ms, "elapsed_ms": 0.0, "before_km": 0.0, "after_km": 0.0,
+              "reduction_km": 0.0, "reduction_pct": 0.0, "moves": 0, "timed_out": False, "days": []}
+
+    for date_str, info in tables.items():
+        day = _DayRoute(ctx, date_str, info["schedule"], owned)
+        n = len(day.route)
+        order = list(range(n))
+        before = _route_km(day.D, order)
+        report["before_km"] += before
+
+        while n >= 4 and len(day.movable_idx) >= 2:
+            if time.perf_counter() >= deadline:
+                report["timed_out"] = True
+                break
+            improved = False
+
+            # 2-opt: 이득이 큰 순서로 제약을 만족하는 첫 이동 적용
+            deltas = _two_opt_deltas(day.D, order, day.run)
+            for flat in np.argsort(deltas, axis=None):
+                ii, jj = np.unravel_index(flat, deltas.shape)
+                if not deltas[ii, jj] < -1e-9:
+                    break
+                i, j = ii + 1, jj + 1
+                cand = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                if day.feasible(cand):
+                    order, improved = cand, True
+                    break
+                day.write(order)
+
+            # Or-opt: 2-opt로 더 줄지 않을 때 블록 이동
+            if not improved:
+                for _, cand in _or_opt_moves(day.D, order, day.run):
+                    if day.feasible(cand):
+                        order, improved = cand, True
+                        break
+                    day.write(order)
+
+            if not improved:
+                break
+            report["moves"] += 1
+
+        after = _route_km(day.D, order)
+        report["after_km"] += after
+        report["days"].append({"date": date_str, "before_km": round(before, 3), "after_km": round(after, 3)})
+
+    report["reduction_km"] = round(report["before_km"] - report["after_km"], 3)
+    if report["before_km"] > 0:
+        report["reduction_pct"] = round(100.0 * report["reduction_km"] / report["before_km"], 2)
+    report["before_km"] = round(report["before_km"], 3)
+    report["after_km"] = round(report["after_km"], 3)
+    report["elapsed_ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+    print(f"[route] {report['before_km']}km → {report['after_km']}km "
+          f"(-{report['reduction_pct']}%, moves={report['moves']}, {report['elapsed_ms']}ms)")
+    return report
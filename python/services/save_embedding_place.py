@@ -3,6 +3,7 @@ import re
 from typing import Dict, Any, List
 from firebase_admin import firestore as admin_fs
 from core.firebase import db
+from services import planner_cache
 import numpy as np
 
 def convert_place_for_json(place: dict) -> dict:
@@ -101,4 +102,7 @@ def save_places_to_firestore(all_places: List[Dict[str, Any]],
     if ops > 0:
         batch.commit()
 
+    # planner가 예전 장소 목록을 쓰지 않도록 캐시 무효화
+    planner_cache.invalidate_trip(user_id, final_title)
+
     return final_title
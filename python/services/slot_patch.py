@@ -0,0 +1,214 @@
+# services/slot_patch.py
+"""
+프런트 diff(삭제/분할/병합/타임라인 오버레이/고정 슬롯)를 하루 일정에 반영하는 패치 엔진.
+하루마다 (시작 분, 종료 분) → 슬롯 색인을 한 번 만들고, 모든 연산을 색인 조회로 적용한 뒤
+마지막에 일정 리스트를 한 번만 다시 만든다 (중간에 list pop/insert 없음).
+연산 순서와 결과는 기존 순차 적용(삭제 → 분할 → 병합 → 오버레이 → 고정)과 같다.
+"""
+from services.timeline import parse_hhmm
+
+PROTECTED_TYPES = frozenset(("start", "end", "accommodation"))
+MIN_SLOT_MINUTES = 30
+ROUND_TO_MINUTES = 15
+
+
+def minute_of(s):
+    """"HH:MM" → 분. 형식이 틀리면 None"""
+    try:
+        return parse_hhmm(s)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def span_key(start, end):
+    """("HH:MM", "HH:MM") → (시작 분, 종료 분). 형식이 틀리면 None (해당 연산은 건너뜀)"""
+    st, en = minute_of(start), minute_of(end)
+    return None if st is None or en is None else (st, en)
+
+
+def _round_to(mins: int, base: int) -> int:
+    return round(mins / base) * base
+
+
+def _clamp_minutes(mins: int) -> int:
+    return max(0, min(24 * 60 - 1, mins))
+
+
+def _is_protected(slot):
+    return getattr(slot, "place_type", None) in PROTECTED_TYPES
+
+
+class DayTimeline:
+    """
+    하루 일정의 가변 뷰.
+    슬롯마다 위치 키(원래 인덱스, 분할 자식 번호...)를 두어 분할/병합 후에도 원래 리스트 순서를 유지하고,
+    (start_min, end_min) 색인은 같은 시간대 슬롯이 여럿이면 리스트 앞쪽 것을 먼저 돌려준다.
+    """
+
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self.pos = {}
+        self.index = {}
+        self.dirty = False
+        for i, slot in enumerate(schedule):
+            self._add(slot, (i,))
+
+    # ----- 색인 -----
+    def _add(self, slot, pos):
+        self.pos[slot] = pos
+        bucket = self.index.setdefault((slot.start_min, slot.end_min), [])
+        bucket.append(slot)
+        if len(bucket) > 1:
+            bucket.sort(key=self.pos.__getitem__)
+
+    def _remove(self, slot):
+        key = (slot.start_min, slot.end_min)
+        bucket = self.index[key]
+        bucket.remove(slot)
+        if not bucket:
+            del self.index[key]
+        return self.pos.pop(slot)
+
+    def find(self, key):
+        bucket = self.index.get(key)
+        return bucket[0] if bucket else None
+
+    def find_all(self, key):
+        return self.index.get(key, ())
+
+    # ----- 내용 변경 -----
+    @staticmethod
+    def clear(slot):
+        slot.title = None
+        slot.place_type = None
+        slot.location_info = None
+
+    # ----- 구조 변경 -----
+    def split(self, slot, mid_m):
+        """slot을 [start, mid) / [mid, end) 빈 슬롯 둘로 교체"""
+        pos = self._remove(slot)
+        cls = type(slot)
+        left = cls(title=None, start=_clamp_minutes(slot.start_min), end=_clamp_minutes(mid_m),
+                   place_type=None, location_info=None)
+        right = cls(title=None, start=_clamp_minutes(mid_m), end=_clamp_minutes(slot.end_min),
+                    place_type=None, location_info=None)
+        self._add(left, pos + (0,))
+        self._add(right, pos + (1,))
+        self.dirty = True
+        return left, right
+
+    def merge(self, winner, loser):
+        """두 슬롯을 min(start)~max(end) 한 칸으로. 내용은 winner, 자리는 앞쪽 슬롯"""
+        a, b = sorted((winner, loser), key=self.pos.__getitem__)
+        merged = type(a)(
+            title=getattr(winner, "title", None),
+            start=min(a.start_min, b.start_min),
+            end=max(a.end_min, b.end_min),
+            place_type=getattr(winner, "place_type", None),
+            location_info=getattr(winner, "location_info", None),
+        )
+        pos = self._remove(a)
+        self._remove(b)
+        self._add(merged, pos)
+        self.dirty = True
+        return merged
+
+    def commit(self):
+        """구조가 바뀐 경우에만 일정 리스트를 위치 키 순으로 한 번 다시 만든다 (같은 리스트 객체 유지)"""
+        if self.dirty:
+            self.schedule[:] = sorted(self.pos, key=self.pos.__getitem__)
+            self.dirty = False
+        return self.schedule
+
+
+class DayPatch:
+    """하루치 diff 연산 (시간은 모두 분 단위 키로 미리 변환)"""
+    __slots__ = ("deletions", "splits", "merges", "overlay", "fixed")
+
+    def __init__(self):
+        self.deletions = set()   # {(start, end)}
+        self.splits = []         # [((start, end), mid 또는 None)]
+        self.merges = []         # [((winner start, end), (loser start, end))]
+        self.overlay = None      # {(start, end): event} — 같은 키는 마지막 이벤트
+        self.fixed = []          # [((start, end), place)]
+
+
+def apply_day_patch(timeline: DayTimeline, patch: DayPatch, counts: dict):
+    """한 날짜에 diff를 기존 순서대로 적용. counts에 연산별 적용 수를 더한다"""
+    for key in patch.deletions:
+        for slot in timeline.find_all(key):
+            if _is_protected(slot):
+                continue
+            timeline.clear(slot)
+            counts["cleared"] += 1
+
+    for key, mid in patch.splits:
+        slot = timeline.find(key)
+        if slot is None or _is_protected(slot):
+            continue
+        if slot.title not in (None, ""):
+            # 이미 채워진 슬롯은 프런트에서 삭제 후 분할하도록 유도
+            continue
+        st_m, en_m = key
+        if en_m - st_m < MIN_SLOT_MINUTES * 2:
+            continue
+        mid_m = mid if mid is not None else (st_m + en_m) // 2
+        mid_m = _round_to(mid_m, ROUND_TO_MINUTES)
+        mid_m = max(st_m + MIN_SLOT_MINUTES, min(en_m - MIN_SLOT_MINUTES, mid_m))
+        if not (st_m < mid_m < en_m):
+            continue
+        timeline.split(slot, mid_m)
+        counts["splits"] += 1
+
+    for wkey, lkey in patch.merges:
+        winner, loser = timeline.find(wkey), timeline.find(lkey)
+        if winner is None or loser is None or winner is loser:
+            continue
+        if _is_protected(winner) or _is_protected(loser):
+            continue
+        timeline.merge(winner, loser)
+        counts["merges"] += 1
+
+    if patch.overlay:
+        for key, ev in patch.overlay.items():
+            for slot in timeline.find_all(key):
+                if _is_protected(slot):
+                    continue
+                if ev.title:
+                    slot.title = ev.title
+                    slot.place_type = ev.type or slot.place_type
+                    if ev.lat is not None and ev.lng is not None:
+                        slot.location_info = {"name": ev.title, "lat": ev.lat, "lng": ev.lng}
+                    counts["filled"] += 1
+                else:
+                    # 프런트가 빈칸으로 표시한 슬롯은 명시적으로 비움
+                    timeline.clear(slot)
+                    counts["overlay_cleared"] += 1
+
+    for key, p in patch.fixed:
+        slot = timeline.find(key)
+        if slot is None or _is_protected(slot):
+            continue
+        slot.title = p.name
+        slot.place_type = p.type or "etc"
+        if p.lat is not None and p.lng is not None:
+            slot.location_info = {"name": p.name, "lat": p.lat, "lng": p.lng}
+        else:
+            slot.location_info = {"name": p.name}
+        counts["fixed"] += 1
+
+    timeline.commit()
+
+
+PATCH_COUNTERS = ("cleared", "splits", "merges", "filled", "overlay_cleared", "fixed")
+
+
+def apply_patches(tables: dict, patches: dict) -> dict:
+    """patches: {date: DayPatch}. 패치가 있는 날짜만 색인을 만들어 적용. 반환: 연산별 적용 수"""
+    counts = dict.fromkeys(PATCH_COUNTERS, 0)
+    for date_str, patch in patches.items():
+        info = tables.get(date_str)
+        if not info:
+            continue
+        apply_day_patch(DayTimeline(info.get("schedule", [])), patch, counts)
+    return counts
@@ -0,0 +1,106 @@
+# services/timeline.py
+"""
+분 단위(0~1439 정수) 타임라인 코어.
+슬롯 시간은 정수 분으로 저장/계산하고, datetime.time / "HH:MM" 문자열 변환은 API 경계에서만 한다.
+to_time / hhmm 은 미리 만든 표를 돌려주므로 변환해도 새 객체를 만들지 않는다.
+하루 일정은 ScheduleItem 리스트 그대로 둔다 (슬롯 분할/병합과 planner 가 슬롯 객체를 직접 다루므로
+별도 분 배열은 두지 않음).
+"""
+from datetime import time as dtime
+
+MINUTES_PER_DAY = 24 * 60
+_TIMES = tuple(dtime(m // 60, m % 60) for m in range(MINUTES_PER_DAY))
+_HHMM = tuple(f"{m // 60:02d}:{m % 60:02d}" for m in range(MINUTES_PER_DAY))
+
+
+# ---------- 변환 ----------
+def parse_hhmm(s: str) -> int:
+    h, m = map(int, s.strip().split(":"))
+    if not (0 <= h < 24 and 0 <= m < 60):
+        raise ValueError(f"invalid time: {s!r}")
+    return h * 60 + m
+
+
+def to_minutes(t) -> int:
+    """int(분) / datetime.time / "HH:MM" → 분"""
+    if isinstance(t, int):
+        return t
+    if isinstance(t, str):
+        return parse_hhmm(t)
+    return t.hour * 60 + t.minute
+
+
+def _slot_minute(t) -> int:
+    """슬롯 시각 검증: 0~1439 밖이면 ValueError (표 인덱스가 넘치거나 음수로 뒤에서 읽히지 않도록)"""
+    m = to_minutes(t)
+    if not 0 <= m < MINUTES_PER_DAY:
+        raise ValueError(f"slot minute out of range: {m}")
+    return m
+
+
+def to_time(m: int) -> dtime:
+    return _TIMES[m % MINUTES_PER_DAY]
+
+
+def hhmm(m: int) -> str:
+    return _HHMM[m % MINUTES_PER_DAY]
+
+
+# ---------- 슬롯 ----------
+class ScheduleItem:
+    """
+    일정 한 칸. 시간은 start_min / end_min(정수 분)으로 저장하고,
+    기존 코드 호환용으로 start / end 는 datetime.time 으로 읽고 쓸 수 있다.
+    생성/대입 시 0~1439 분 범위를 검사한다.
+    """
+    __slots__ = ("title", "start_min", "end_min", "place_type", "location_info")
+
+    def __init__(self, title, start, end, place_type, location_info=None):
+        self.title = title
+        self.start_min = _slot_minute(start)
+        self.end_min = _slot_minute(end)
+        self.place_type = place_type
+        self.location_info = location_info
+
+    @property
+    def start(self):
+        return _TIMES[self.start_min]
+
+    @start.setter
+    def start(self, t):
+        self.start_min = _slot_minute(t)
+
+    @property
+    def end(self):
+        return _TIMES[self.end_min]
+
+    @end.setter
+    def end(self, t):
+        self.end_min = _slot_minute(t)
+
+    def __repr__(self):
+        return f"ScheduleItem(title={self.title!r}, {hhmm(self.start_min)}-{hhmm(self.end_min)}, type={self.place_type})"
+
+
+def split_range(start_min: int, end_min: int) -> list:
+    """
+    빈 구간을 planner 슬롯으로 나눈다 (90분 미만 무시, 120분 단위, 남는 90분 이상은 마지막 슬롯).
+    making_table.split_empty_range 의 분 단위 구현.
+    """
+    gap = end_min - start_min
+    if gap < 0:
+        raise ValueError(f"[split_empty_range] end < start ({hhmm(start_min)} → {hhmm(end_min)})")
+    if gap < 90:
+        return []
+    if gap < 120:
+        return [ScheduleItem(None, start_min, end_min, None)]
+
+    slots = []
+    cursor = start_min
+    while end_min - cursor >= 120:
+        slots.append(ScheduleItem(None, cursor, cursor + 120, None))
+        cursor += 120
+    if end_min - cursor >= 90:
+        slots.append(ScheduleItem(None, cursor, end_min, None))
+    return slots
+
@@ -0,0 +1,339 @@
+# services/value_model.py
+"""
+planner용 학습된 가치 함수 (depth-3 lookahead 대체).
+
+- 학습: trips_log 기록(또는 로컬 AI/*.json)의 하루 일정을 재생하면서,
+        각 슬롯에 후보를 둔 상태의 특징 → compute_future_reward(depth=3) 값을 NumPy MLP로 회귀(증류)
+- 추론: _fill_day가 슬롯 후보 5개의 특징을 한 번에 predict → O(1) 미래 보상 추정
+
+사용:
+    python -m services.value_model train --source local --out models/value_model.npz
+    python -m services.value_model train --source firestore
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import threading
+
+import numpy as np
+
+VALUE_MODEL_PATH = os.getenv(
+    "PLANNER_VALUE_MODEL",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models", "value_model.npz"),
+)
+FEATURE_VERSION = 1
+
+MODES = ("명소 중심", "식사 중심", "카페, 빵집 중심", "쇼핑 중심")
+FEATURE_TYPES = ('tourist_attraction', 'cafe', 'restaurant', 'bakery', 'bar', 'shopping_mall')
+PROTECTED_TYPES = ("start", "end", "accommodation")
+ELAPSED_CAP = 600.0
+
+
+# ---------- 특징 ----------
+def state_features(state, next_start_min, remaining, place, params, base_mode, depth=3):
+    """
+    후보 place를 현재 슬롯에 push 한 뒤의 ConstraintState 기준 특징 벡터.
+    remaining: 다음 depth 칸 중 planner가 채울 빈 슬롯 수
+    """
+    f = [
+        1.0,
+        remaining / float(depth),
+        min(state.elapsed('tourist_attraction', next_start_min), ELAPSED_CAP) / ELAPSED_CAP,
+        min(state.elapsed('restaurant', next_start_min), ELAPSED_CAP) / ELAPSED_CAP,
+        min(state.elapsed('shopping_mall', next_start_min), ELAPSED_CAP) / ELAPSED_CAP,
+        1.0 if state.prev_type in ("cafe", "bakery") else 0.0,
+        next_start_min / 1440.0,
+        float(place.get("_cluster_n", 0.0)),
+        float(place.get("_nonhope_n", 0.0)),
+        float(place.get("trust_score", 0.0)) / 5.0,
+        float(params.get("w_dist", 0.0)),
+        float(params.get("w_cluster", 0.0)),
+        float(params.get("w_trust", 0.0)),
+        float(params.get("w_nonhope", 0.0)),
+    ]
+    f += [1.0 if base_mode == m else 0.0 for m in MODES]
+    f += [1.0 if place.get("type") == t else 0.0 for t in FEATURE_TYPES]
+    return f
+
+
+# ---------- 모델 ----------
+class ValueModel:
+    """1 hidden layer(tanh) MLP. 타깃은 표준화해서 학습하고 predict에서 되돌린다."""
+
+    def __init__(self, W1, b1, W2, b2, y_mean=0.0, y_std=1.0):
+        self.W1 = np.asarray(W1, dtype=np.float32)
+        self.b1 = np.asarray(b1, dtype=np.float32)
+        self.W2 = np.asarray(W2, dtype=np.float32)
+        self.b2 = np.asarray(b2, dtype=np.float32)
+        self.y_mean = float(y_mean)
+        self.y_std = float(y_std)
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        h = np.tanh(X @ self.W1 + self.b1)
+        return (h @ self.W2 + self.b2).ravel() * self.y_std + self.y_mean
+
+    @classmethod
+    def fit(cls, X, y, hidden=32, epochs=400, lr=1e-2, l2=1e-4, seed=0):
+        """full-batch Adam. CPU에서 수천~수만 샘플 기준 수 초 이내"""
+        rng = np.random.default_rng(seed)
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        y_mean, y_std = float(y.mean()), float(y.std() or 1.0)
+        t = ((y - y_mean) / y_std)[:, None]
+
+        d = X.shape[1]
+        params = [
+            rng.normal(0, 1 / np.sqrt(d), (d, hidden)),
+            np.zeros(hidden),
+            rng.normal(0, 1 / np.sqrt(hidden), (hidden, 1)),
+            np.zeros(1),
+        ]
+        m = [np.zeros_like(p) for p in params]
+        v = [np.zeros_like(p) for p in params]
+        b1_, b2_, eps = 0.9, 0.999, 1e-8
+        n = X.shape[0]
+
+        for ep in range(1, epochs + 1):
+            W1, b1, W2, b2 = params
+            h = np.tanh(X @ W1 + b1)
+            out = h @ W2 + b2
+            g_out = 2.0 * (out - t) / n
+            g_W2 = h.T @ g_out + l2 * W2
+            g_b2 = g_out.sum(axis=0)
+            g_h = (g_out @ W2.T) * (1 - h ** 2)
+            g_W1 = X.T @ g_h + l2 * W1
+            g_b1 = g_h.sum(axis=0)
+            for k, g in enumerate((g_W1, g_b1, g_W2, g_b2)):
+                m[k] = b1_ * m[k] + (1 - b1_) * g
+                v[k] = b2_ * v[k] + (1 - b2_) * g * g
+                mh = m[k] / (1 - b1_ ** ep)
+                vh = v[k] / (1 - b2_ ** ep)
+                params[k] = params[k] - lr * mh / (np.sqrt(vh) + eps)
+
+        return cls(*params, y_mean=y_mean, y_std=y_std)
+
+    def save(self, path=VALUE_MODEL_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path, W1=self.W1, b1=self.b1, W2=self.W2, b2=self.b2,
+                 y_mean=self.y_mean, y_std=self.y_std, feature_version=FEATURE_VERSION)
+
+    @classmethod
+    def load(cls, path=VALUE_MODEL_PATH):
+        z = np.load(path)
+        if int(z["feature_version"]) != FEATURE_VERSION:
+            raise ValueError(f"value model feature_version mismatch: {int(z['feature_version'])} != {FEATURE_VERSION}")
+        return cls(z["W1"], z["b1"], z["W2"], z["b2"], float(z["y_mean"]), float(z["y_std"]))
+
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_value_model():
+    """VALUE_MODEL_PATH의 모델을 한 번만 로드 (없으면 None → planner가 lookahead로 대체)"""
+    global _model
+    with _model_lock:
+        if _model is None and os.path.exists(VALUE_MODEL_PATH):
+            try:
+                _model = ValueModel.load(VALUE_MODEL_PATH)
+            except Exception as e:
+                print(f"[value_model] load failed: {e}")
+        return _model
+
+
+# ---------- 학습 데이터 ----------
+def _hhmm_to_time(s):
+    from datetime import time as dtime
+    h, m = str(s).split(":")
+    return dtime(int(h), int(m))
+
+
+def log_day_to_schedule(schedule_rows):
+    from services.making_table import ScheduleItem
+    items = []
+    for row in schedule_rows:
+        if not row.get("start") or not row.get("end"):
+            continue
+        title = row.get("title")
+        loc = row.get("location_info") or {}
+        lat, lng = row.get("lat", loc.get("lat")), row.get("lng", loc.get("lng"))
+        loc = {"name": title, "lat": lat, "lng": lng} if lat is not None and lng is not None else None
+        ptype = row.get("type") or row.get("place_type")
+        items.append(ScheduleItem(title, _hhmm_to_time(row["start"]), _hhmm_to_time(row["end"]), ptype, loc))
+    items.sort(key=lambda s: s.start_min)
+    return items
+
+
+def load_local_histories(logs_path="AI/travel_logs.json", places_path="AI/all_places_embedding.json"):
+    """로컬 export(JSON) → [(uid, title, places, {date: schedule_rows})]"""
+    with open(logs_path, encoding="utf-8") as f:
+        logs = json.load(f)
+    with open(places_path, encoding="utf-8") as f:
+        places_by_user = json.load(f)
+
+    out = []
+    for uid, trips in logs.items():
+        place_sets = {t["title"]: list(t.get("place", {}).values()) for t in places_by_user.get(uid, [])}
+        for trip in trips:
+            places = place_sets.get(trip["title"]) or next(iter(place_sets.values()), [])
+            days = {d: info.get("schedule", []) for d, info in trip.get("table", {}).items()}
+            out.append((uid, trip["title"], places, days))
+    return out
+
+
+def load_firestore_histories():
+    """user_trips/{uid}/trips_log/{title}/days/* 와 같은 제목의 trips/{title}/places"""
+    from core.firebase import db
+    from services.dqn_table_making import get_places_from_json
+
+    grouped = {}
+    for day_doc in db.collection_group("days").stream():
+        try:
+            title_doc = day_doc.reference.parent.parent
+            if title_doc.parent.id != "trips_log":
+                continue
+            uid = title_doc.parent.parent.id
+        except Exception:
+            continue
+        data = day_doc.to_dict() or {}
+        sched = data.get("schedule", [])
+        if isinstance(sched, list):
+            grouped.setdefault((uid, title_doc.id), {})[data.get("date") or day_doc.id] = sched
+
+    out = []
+    for (uid, title), days in grouped.items():
+        places = get_places_from_json(uid, title)
+        if places:
+            out.append((uid, title, places, days))
+    return out
+
+
+def _sample_params(rng, base):
+    keys = ("w_dist", "w_cluster", "w_trust", "w_nonhope")
+    return {k: rng.uniform(-0.5, 1.5) if rng.random() < 0.75 else float(base.get(k, 0.0)) for k in keys}
+
+
+def build_training_set(histories, depth=3, modes=MODES, param_samples=4, extra_candidates=5, seed=0):
+    """
+    기록된 하루마다 슬롯 idx 까지는 기록대로 두고 뒤쪽 planner 슬롯은 비운 뒤,
+    idx에 (기록된 장소 + 상위 후보들)을 두었을 때의 depth-3 lookahead 값을 라벨로 쓴다.
+    """
+    import copy
+    from services.dqn_table_making import (
+        PlannerContext, ConstraintState, compute_future_reward, get_score_ranges,
+        _precompute_norm_scores, _open_candidates, _rank_candidates,
+    )
+
+    rng = random.Random(seed)
+    default_params = {"w_dist": 0.5, "w_cluster": 0.4, "w_trust": 0.4, "w_nonhope": 0.3}
+    X, y = [], []
+
+    for uid, title, places, days in histories:
+        places = [dict(p) for p in places if p.get("name") and p.get("lat") is not None]
+        if not places:
+            continue
+        ranges = get_score_ranges(places)
+        _precompute_norm_scores(places, ranges)
+
+        for date_str, rows in days.items():
+            logged = log_day_to_schedule(rows)
+            if len(logged) < 3:
+                continue
+            for mode in modes:
+                for _ in range(param_samples):
+                    params = _sample_params(rng, default_params)
+                    ctx = PlannerContext(uid, title, mode, places, ranges, params)
+                    for idx in range(1, len(logged) - 1):
+                        if logged[idx].place_type in PROTECTED_TYPES:
+                            continue
+                        schedule = copy.deepcopy(logged)
+                        for s in schedule[idx:]:
+                            if s.place_type not in PROTECTED_TYPES:
+                                s.title = s.place_type = s.location_info = None
+                        for p in places:
+                            p["in_timetable"] = False
+                        prefix_names = {s.title for s in schedule[:idx] if s.title}
+                        for p in places:
+                            if p["name"] in prefix_names:
+                                p["in_timetable"] = True
+
+                        state = ConstraintState.for_schedule(schedule, mode)
+                        for s in schedule[:idx]:
+                            state.push(s)
+                        slot = schedule[idx]
+                        allowed = state.allowed_types(slot.start_min)
+                        cands = _rank_candidates(
+                            _open_candidates(places, allowed, date_str, slot, ctx.cand_cache),
+                            state.last_loc, ctx.dist_cache, limit=extra_candidates,
+                        )
+                        logged_place = ctx.by_name.get(logged[idx].title)
+                        if logged_place is not None and logged_place not in cands:
+                            cands.append(logged_place)
+
+                        nxt = idx + 1
+                        remaining = sum(1 for s in schedule[nxt:nxt + depth] if s.title is None)
+                        next_start = schedule[nxt].start_min if nxt < len(schedule) else 1440
+                        for place in cands:
+                            slot.title, slot.place_type = place["name"], place["type"]
+                            slot.location_info = {"name": place["name"], "lat": place["lat"], "lng": place["lng"]}
+                            was_used = place.get("in_timetable", False)
+                            place["in_timetable"] = True
+                            state.push(slot)
+                            X.append(state_features(state, next_start, remaining, place, params, mode, depth))
+                            y.append(compute_future_reward(
+                                uid, schedule, nxt, places, date_str, ranges, depth, mode,
+                                params, ctx.dist_cache, ctx.cand_cache, state,
+                            ))
+                            state.pop()
+                            place["in_timetable"] = was_used
+                            slot.title = slot.place_type = slot.location_info = None
+
+    return np.asarray(X, dtype=np.float32), np.asarray(y, dtype=np.float32)
+
+
+def train(histories, out=VALUE_MODEL_PATH, holdout=0.2, seed=0, **fit_kwargs):
+    X, y = build_training_set(histories, seed=seed)
+    if len(y) == 0:
+        raise ValueError("학습 샘플이 없습니다. (trips_log 기록/장소 확인)")
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(y))
+    n_val = int(len(y) * holdout)
+    val, tr = order[:n_val], order[n_val:]
+
+    model = ValueModel.fit(X[tr], y[tr], seed=seed, **fit_kwargs)
+    report = {"samples": int(len(y)), "train": int(len(tr)), "val": int(len(val))}
+    for name, idx in (("train", tr), ("val", val)):
+        if len(idx):
+            err = model.predict(X[idx]) - y[idx]
+            report[f"{name}_mae"] = round(float(np.abs(err).mean()), 4)
+    report["target_mean"] = round(float(y.mean()), 4)
+    model.save(out)
+    report["path"] = out
+    return model, report
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="planner value model trainer")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    t = sub.add_parser("train")
+    t.add_argument("--source", choices=("local", "firestore"), default="local")
+    t.add_argument("--logs", default="AI/travel_logs.json")
+    t.add_argument("--places", default="AI/all_places_embedding.json")
+    t.add_argument("--out", default=VALUE_MODEL_PATH)
+    t.add_argument("--epochs", type=int, default=400)
+    t.add_argument("--hidden", type=int, default=32)
+    args = ap.parse_args(argv)
+
+    if args.source == "local":
+        histories = load_local_histories(args.logs, args.places)
+    else:
+        histories = load_firestore_histories()
+    _, report = train(histories, out=args.out, epochs=args.epochs, hidden=args.hidden)
+    print(json.dumps(report, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -788,6 +788,7 @@ useEffect(() => {
           weekday: day.weekday ?? "",
           schedule,
           saved_at: serverTimestamp(),
+          updatedAt: serverTimestamp(), // LightGCN 엣지 증분 동기화 기준
         });
       });
 
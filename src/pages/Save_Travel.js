@@ -9,6 +9,7 @@ import {
   getDoc,
   setDoc,
   updateDoc,
+  serverTimestamp,
   arrayUnion,
 } from "firebase/firestore";
 import { ref as sRef, uploadBytes, getDownloadURL } from "firebase/storage";
@@ -65,7 +66,8 @@ async function applyRatingsToTripsLog({ uid, loadTitle, days, reviews }) {
     }
 
     if (changed) {
-      await setDoc(dayRef, updated, { merge: true });
+      // updatedAt: 백엔드 LightGCN 엣지 증분 동기화 기준 (python/services/lightgcn_edges.py)
+      await setDoc(dayRef, { ...updated, updatedAt: serverTimestamp() }, { merge: true });
     }
 
     // 1-b) schedule이 "배열 필드"인 경우 매칭/갱신
@@ -117,7 +119,7 @@ async function applyRatingsToTripsLog({ uid, loadTitle, days, reviews }) {
       }
 
       if (arrChanged) {
-        await setDoc(dayRef, { schedule: arr }, { merge: true });
+        await setDoc(dayRef, { schedule: arr, updatedAt: serverTimestamp() }, { merge: true });
       }
     }
 
@@ -154,7 +156,10 @@ async function applyRatingsToTripsLog({ uid, loadTitle, days, reviews }) {
             updates.push(updateDoc(docSnap.ref, { user_rating: titleToRating.get(t) }));
           }
         });
-        if (updates.length) await Promise.all(updates);
+        if (updates.length) {
+          await Promise.all(updates);
+          await setDoc(dayRef, { updatedAt: serverTimestamp() }, { merge: true });
+        }
       }
     } catch (e) {
       console.warn("[applyRatingsToTripsLog] schedule subcollection not found or failed:", e);